@@ -12,5 +12,10 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'cajones.settings')
+# Con ASGI las lecturas y las recomendaciones usan las vistas asíncronas
+os.environ.setdefault('API_ASYNC', '1')
+# Las vistas asíncronas abren conexiones desde varios hilos: sin conexiones
+# persistentes para no dejarlas abiertas (con PostgreSQL, usar el pool)
+os.environ.setdefault('DB_CONN_MAX_AGE', '0')
 
 application = get_asgi_application()
@@ -13,6 +13,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 from pathlib import Path
 import os
 from dotenv import load_dotenv
+from django.core.exceptions import ImproperlyConfigured
 
 # Cargar variables de entorno
 load_dotenv()
@@ -48,6 +49,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'cajones_app.instrumentacion.InstrumentacionMiddleware',  # Primero: mide todo el request
+    'cajones_app.replica.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',  # CORS middleware
@@ -81,11 +84,82 @@ WSGI_APPLICATION = 'cajones.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# DB_ENGINE elige el perfil: 'sqlite' (por defecto) o 'postgresql'.
+# DB_CONN_MAX_AGE mantiene abiertas las conexiones entre requests (segundos;
+# asgi.py lo pone en 0, como recomienda Django para servidores asíncronos).
+DB_ENGINE = os.getenv('DB_ENGINE', 'sqlite')
+DB_CONN_MAX_AGE = int(os.getenv('DB_CONN_MAX_AGE', '60'))
+
+if DB_ENGINE == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.getenv('SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
+            'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                # IMMEDIATE: las transacciones toman el lock de escritura al
+                # empezar y esperan busy_timeout, en lugar de fallar al pasar
+                # de lectura a escritura
+                'transaction_mode': os.getenv('SQLITE_TRANSACTION_MODE', 'IMMEDIATE'),
+            },
+        }
+    }
+elif DB_ENGINE == 'postgresql':
+    # Con DB_POOL las conexiones salen del pool de psycopg
+    # (pip install "psycopg[binary,pool]"); Django exige CONN_MAX_AGE = 0
+    DB_POOL = os.getenv('DB_POOL', '1') == '1'
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.getenv('DB_NAME', 'cajones'),
+            'USER': os.getenv('DB_USER', 'postgres'),
+            'PASSWORD': os.getenv('DB_PASSWORD', ''),
+            'HOST': os.getenv('DB_HOST', 'localhost'),
+            'PORT': os.getenv('DB_PORT', '5432'),
+            'CONN_MAX_AGE': 0 if DB_POOL else DB_CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': not DB_POOL,
+            'OPTIONS': {
+                'pool': {
+                    'min_size': int(os.getenv('DB_POOL_MIN', '2')),
+                    'max_size': int(os.getenv('DB_POOL_MAX', '10')),
+                    'timeout': int(os.getenv('DB_POOL_TIMEOUT', '10')),
+                },
+            } if DB_POOL else {},
+        }
+    }
+else:
+    raise ImproperlyConfigured(f"DB_ENGINE debe ser 'sqlite' o 'postgresql', no {DB_ENGINE!r}")
+
+# Réplica de lectura (cajones_app/replica.py): con SQLITE_REPLICA_PATH o
+# DB_REPLICA_HOST las lecturas de los GET van al alias 'replica'. Después de
+# escribir, un cliente lee de la primaria durante DB_REPLICA_PEGAJOSO_SEGUNDOS.
+if DB_ENGINE == 'sqlite' and os.getenv('SQLITE_REPLICA_PATH'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': os.getenv('SQLITE_REPLICA_PATH'),
+        'TEST': {'MIRROR': 'default'},
     }
+elif DB_ENGINE == 'postgresql' and os.getenv('DB_REPLICA_HOST'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'HOST': os.getenv('DB_REPLICA_HOST'),
+        'PORT': os.getenv('DB_REPLICA_PORT', DATABASES['default']['PORT']),
+        'TEST': {'MIRROR': 'default'},
+    }
+DB_REPLICA = 'replica' if 'replica' in DATABASES else None
+DB_REPLICA_PEGAJOSO_SEGUNDOS = int(os.getenv('DB_REPLICA_PEGAJOSO_SEGUNDOS', '5'))
+DATABASE_ROUTERS = ['cajones_app.replica.EnrutadorReplica']
+
+# PRAGMA que se aplican a cada conexión nueva a SQLite (cajones_app/basedatos.py)
+SQLITE_PRAGMAS = {
+    'journal_mode': os.getenv('SQLITE_JOURNAL_MODE', 'WAL'),
+    'synchronous': os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL'),
+    'busy_timeout': int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', '5000')),
+    # Negativo: tamaño en KiB
+    'cache_size': -int(os.getenv('SQLITE_CACHE_KB', '20000')),
+    'mmap_size': int(os.getenv('SQLITE_MMAP_MB', '128')) * 1024 * 1024,
+    'temp_store': 'MEMORY',
 }
 
 
@@ -107,6 +181,78 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Cache
+# Las recomendaciones se guardan por criterio y versión del inventario; la
+# entrada expira tras RECOMENDACIONES_CACHE_TTL segundos y, al superar
+# MAX_ENTRIES, se descartan las menos usadas recientemente.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'recomendaciones': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'recomendaciones',
+        'TIMEOUT': int(os.getenv('RECOMENDACIONES_CACHE_TTL', '3600')),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('RECOMENDACIONES_CACHE_MAX', '256')),
+        },
+    },
+}
+
+# Contexto enviado a Gemini: presupuesto aproximado en tokens y cantidad
+# máxima de objetos que se listan uno por uno en cada cajón (los cajones más
+# grandes se resumen por tipo)
+RECOMENDACIONES_CONTEXTO_MAX_TOKENS = int(os.getenv('RECOMENDACIONES_CONTEXTO_MAX_TOKENS', '6000'))
+RECOMENDACIONES_CONTEXTO_MAX_OBJETOS_CAJON = int(os.getenv('RECOMENDACIONES_CONTEXTO_MAX_OBJETOS_CAJON', '15'))
+
+# Modelo usado para las recomendaciones: 'gemini' o 'local' (sin red, para
+# desarrollo y pruebas)
+RECOMENDACIONES_MODELO = os.getenv('RECOMENDACIONES_MODELO', 'gemini')
+
+# Trabajos de recomendación en segundo plano: hilos del pool, trabajos
+# aceptados a la vez y segundos sin avance tras los que se dan por perdidos
+RECOMENDACIONES_TRABAJOS_WORKERS = int(os.getenv('RECOMENDACIONES_TRABAJOS_WORKERS', '2'))
+RECOMENDACIONES_TRABAJOS_MAX_EN_COLA = int(os.getenv('RECOMENDACIONES_TRABAJOS_MAX_EN_COLA', '20'))
+RECOMENDACIONES_TRABAJOS_TIMEOUT = int(os.getenv('RECOMENDACIONES_TRABAJOS_TIMEOUT', '300'))
+RECOMENDACIONES_TRABAJOS_SINCRONOS = False
+
+# Historial diferido: las entradas se guardan en lotes desde un hilo del
+# proceso (cada HISTORIAL_LOTE entradas o HISTORIAL_INTERVALO segundos) en
+# lugar de insertarse en cada request. Desactivado, se escriben en el momento,
+# como esperan las pruebas.
+HISTORIAL_DIFERIDO = os.getenv('HISTORIAL_DIFERIDO', '0') == '1'
+HISTORIAL_LOTE = int(os.getenv('HISTORIAL_LOTE', '200'))
+HISTORIAL_INTERVALO = float(os.getenv('HISTORIAL_INTERVALO', '1.0'))
+HISTORIAL_MAX_PENDIENTES = int(os.getenv('HISTORIAL_MAX_PENDIENTES', '5000'))
+
+# Retención del historial (manage.py archivar_historial): días que se
+# conservan en la base y directorio de los archivos comprimidos
+HISTORIAL_RETENCION_DIAS = int(os.getenv('HISTORIAL_RETENCION_DIAS', '180'))
+HISTORIAL_ARCHIVO_DIR = os.getenv('HISTORIAL_ARCHIVO_DIR', str(BASE_DIR / 'archivo_historial'))
+
+# Flujo de eventos del historial (GET /api/historial/eventos/): cada cuántos
+# segundos se revisa si hay entradas nuevas y cada cuántos se envía un
+# comentario para que los proxies no cierren la conexión
+HISTORIAL_EVENTOS_INTERVALO = float(os.getenv('HISTORIAL_EVENTOS_INTERVALO', '0.5'))
+HISTORIAL_EVENTOS_KEEPALIVE = float(os.getenv('HISTORIAL_EVENTOS_KEEPALIVE', '15'))
+# Ids anteriores al último enviado que se vuelven a revisar: con PostgreSQL una
+# entrada puede confirmarse después de otra con id mayor
+HISTORIAL_EVENTOS_VENTANA = int(os.getenv('HISTORIAL_EVENTOS_VENTANA', '100'))
+
+# Instrumentación por request (cajones_app/instrumentacion.py): encabezado
+# Server-Timing y advertencias cuando una consulta se repite (posible N+1) o
+# un request supera su presupuesto de consultas. INSTRUMENTACION_PRESUPUESTOS
+# fija el máximo por nombre de ruta; INSTRUMENTACION_MAX_CONSULTAS, para las
+# demás. Con INSTRUMENTACION_ESTRICTA se lanza un error en lugar de advertir.
+INSTRUMENTACION_CONSULTAS_REPETIDAS = int(os.getenv('INSTRUMENTACION_CONSULTAS_REPETIDAS', '5'))
+INSTRUMENTACION_MAX_CONSULTAS = int(os.getenv('INSTRUMENTACION_MAX_CONSULTAS', '20'))
+INSTRUMENTACION_PRESUPUESTOS = {}
+INSTRUMENTACION_ESTRICTA = os.getenv('INSTRUMENTACION_ESTRICTA', '0') == '1'
+
+# Vistas asíncronas para las lecturas y las recomendaciones (views_async.py).
+# asgi.py lo activa por defecto; con WSGI se usan las vistas síncronas.
+API_ASYNC = os.getenv('API_ASYNC', '0') == '1'
+
 # CORS Configuration
 CORS_ALLOW_ALL_ORIGINS = True  # Solo para desarrollo
 CORS_ALLOW_CREDENTIALS = True
@@ -122,6 +268,10 @@ REST_FRAMEWORK = {
     'DEFAULT_PARSER_CLASSES': [
         'rest_framework.parsers.JSONParser',
     ],
+    # Paginación por cursor de los listados grandes; el tamaño de página
+    # se puede ajustar por request con ?page_size=
+    'DEFAULT_PAGINATION_CLASS': 'cajones_app.pagination.KeysetPagination',
+    'PAGE_SIZE': int(os.getenv('API_PAGE_SIZE', '50')),
 }
 
 # Deshabilitar APPEND_SLASH para evitar problemas con POST
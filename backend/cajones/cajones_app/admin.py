@@ -1,15 +1,18 @@
 from django.contrib import admin
-from .models import Cajon, CajonHistorial, TipoObjeto, CajonObjeto
+from .models import Cajon, CajonHistorial, HistorialResumen, TipoObjeto, CajonObjeto
+from . import versiones
+from .services import CajonService
 
 # Register your models here.
 
 
 @admin.register(Cajon)
 class CajonAdmin(admin.ModelAdmin):
-    list_display = ('nombre', 'capacidad_maxima')
+    list_display = ('nombre', 'capacidad_maxima', 'objetos_count')
     search_fields = ('nombre',)
     list_filter = ('capacidad_maxima',)
     ordering = ('nombre',)
+    readonly_fields = ('objetos_count',)
 
 @admin.register(CajonHistorial)
 class CajonHistorialAdmin(admin.ModelAdmin):
@@ -18,12 +21,40 @@ class CajonHistorialAdmin(admin.ModelAdmin):
     list_filter = ('accion', 'fecha')
     ordering = ('-fecha',)
 
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        versiones.incrementar(CajonHistorial)
+
+    def delete_queryset(self, request, queryset):
+        super().delete_queryset(request, queryset)
+        versiones.incrementar(CajonHistorial)
+
+@admin.register(HistorialResumen)
+class HistorialResumenAdmin(admin.ModelAdmin):
+    list_display = ('cajon', 'dia', 'accion', 'cantidad')
+    list_filter = ('accion', 'dia')
+    ordering = ('-dia',)
+    readonly_fields = ('cajon', 'dia', 'accion', 'cantidad')
+
 @admin.register(TipoObjeto)
 class TipoObjetoAdmin(admin.ModelAdmin):
     list_display = ('nombre',)
     search_fields = ('nombre',)
     ordering = ('nombre',)
 
+    def delete_model(self, request, obj):
+        cajon_ids = list(obj.objetos.values_list('cajon_id', flat=True).distinct())
+        super().delete_model(request, obj)
+        CajonService.recalcular_ocupacion(cajon_ids)
+
+    def delete_queryset(self, request, queryset):
+        cajon_ids = list(
+            CajonObjeto.objects.filter(tipo_objeto__in=queryset)
+            .values_list('cajon_id', flat=True).distinct()
+        )
+        super().delete_queryset(request, queryset)
+        CajonService.recalcular_ocupacion(cajon_ids)
+
 @admin.register(CajonObjeto)
 class CajonObjetoAdmin(admin.ModelAdmin):
     list_display = ('nombre_objeto', 'cajon', 'tipo_objeto', 'tamanio')
@@ -31,3 +62,23 @@ class CajonObjetoAdmin(admin.ModelAdmin):
     list_filter = ('tamanio', 'tipo_objeto')
     ordering = ('cajon__nombre', 'nombre_objeto')
     raw_id_fields = ('cajon', 'tipo_objeto')
+
+    # Las ediciones desde el admin no pasan por CajonService, así que se
+    # recalcula la ocupación de los cajones afectados
+    def save_model(self, request, obj, form, change):
+        cajon_ids = {obj.cajon_id}
+        if change and 'cajon' in form.changed_data:
+            cajon_ids.add(form.initial.get('cajon'))
+        super().save_model(request, obj, form, change)
+        CajonService.recalcular_ocupacion(cajon_ids)
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        versiones.incrementar(CajonObjeto)
+        CajonService.recalcular_ocupacion([obj.cajon_id])
+
+    def delete_queryset(self, request, queryset):
+        cajon_ids = list(queryset.values_list('cajon_id', flat=True).distinct())
+        super().delete_queryset(request, queryset)
+        versiones.incrementar(CajonObjeto)
+        CajonService.recalcular_ocupacion(cajon_ids)
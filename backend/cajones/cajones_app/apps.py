@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class CajonesAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'cajones_app'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+
+        from . import basedatos, instrumentacion, signals  # noqa: F401
+        connection_created.connect(basedatos.configurar_sqlite, dispatch_uid='cajones_sqlite')
+        connection_created.connect(instrumentacion.instalar, dispatch_uid='cajones_instrumentacion')
@@ -0,0 +1,30 @@
+"""
+Configuración de cada conexión nueva a SQLite.
+
+Con el modo de journal por defecto un lector bloquea a los escritores y las
+escrituras concurrentes del historial fallan con "database is locked". Al
+abrirse cada conexión se aplican los PRAGMA de SQLITE_PRAGMAS: WAL (lectores y
+un escritor a la vez), synchronous=NORMAL (seguro con WAL, sin fsync por
+transacción), busy_timeout para esperar el lock en lugar de fallar, y
+cache_size/mmap_size para leer desde memoria.
+
+Los PRAGMA se ejecutan sobre la conexión de sqlite3, fuera de los cursores de
+Django, para que no cuenten como consultas del request (ver instrumentacion.py).
+"""
+from django.conf import settings
+
+# busy_timeout va primero: cambiar journal_mode necesita el lock de escritura
+ORDEN = ['busy_timeout', 'journal_mode', 'synchronous', 'cache_size', 'mmap_size', 'temp_store']
+
+
+def configurar_sqlite(sender, connection, **kwargs):
+    """Receptor de connection_created"""
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = getattr(settings, 'SQLITE_PRAGMAS', {})
+    en_memoria = connection.is_in_memory_db()
+    for nombre in sorted(pragmas, key=lambda nombre: ORDEN.index(nombre) if nombre in ORDEN else len(ORDEN)):
+        if en_memoria and nombre in ('journal_mode', 'mmap_size'):
+            # Una base en memoria no tiene archivo ni WAL
+            continue
+        connection.connection.execute(f'PRAGMA {nombre} = {pragmas[nombre]}')
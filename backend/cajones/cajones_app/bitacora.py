@@ -0,0 +1,137 @@
+"""
+Escritura del historial de los cajones (CajonHistorial).
+
+Por defecto cada entrada se inserta en el momento, dentro de la transacción
+de quien la registra. Con HISTORIAL_DIFERIDO=True las entradas se acumulan en
+memoria del proceso y un hilo las guarda con bulk_create cuando se juntan
+HISTORIAL_LOTE entradas o pasan HISTORIAL_INTERVALO segundos, lo que saca el
+INSERT (y el incremento de versión) del camino de cada request.
+
+Una entrada diferida solo se acumula cuando se confirma la transacción que la
+registró, así que un rollback la descarta junto con el resto de los cambios.
+Lo pendiente se guarda también al terminar el proceso; solo se pierde si el
+proceso muere sin poder ejecutar su salida normal (p. ej. SIGKILL). Si se
+superan HISTORIAL_MAX_PENDIENTES entradas, quien registra guarda el lote él
+mismo en lugar de seguir acumulando.
+"""
+import atexit
+import logging
+import threading
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+from . import versiones
+from .models import Cajon, CajonHistorial
+
+logger = logging.getLogger(__name__)
+
+_pendientes = []
+_lock = threading.Lock()
+_lock_vaciado = threading.Lock()
+_despertar = threading.Event()
+_hilo = None
+
+
+def _diferido():
+    return getattr(settings, 'HISTORIAL_DIFERIDO', False)
+
+
+def registrar(**campos):
+    """Registrar una entrada de historial; recibe los mismos campos que CajonHistorial"""
+    if not _diferido():
+        return CajonHistorial.objects.create(**campos)
+    registrar_lote([CajonHistorial(**campos)])
+
+
+def registrar_lote(entradas):
+    """
+    Registrar varias entradas de historial (instancias sin guardar). En modo
+    sincrónico se insertan con un solo bulk_create; quien llama incrementa la
+    versión del historial junto con la del resto de sus cambios.
+    """
+    if not _diferido():
+        CajonHistorial.objects.bulk_create(entradas, batch_size=500)
+        return
+    # `fecha` ya quedó fijada al crear cada instancia: es la del cambio, no
+    # la del momento en que se guarda el lote
+    transaction.on_commit(lambda: _acumular(entradas))
+
+
+def _acumular(entradas):
+    with _lock:
+        _pendientes.extend(entradas)
+        total = len(_pendientes)
+    _iniciar_hilo()
+    if total >= getattr(settings, 'HISTORIAL_MAX_PENDIENTES', 5000):
+        # El hilo no da abasto (o la base rechaza las escrituras): guardar aquí
+        try:
+            vaciar()
+        except Exception:
+            logger.exception("No se pudo guardar el historial pendiente")
+    elif total >= getattr(settings, 'HISTORIAL_LOTE', 200):
+        _despertar.set()
+
+
+def vaciar():
+    """
+    Guardar ahora todas las entradas pendientes y devolver cuántas se
+    guardaron. Las de cajones que ya no existen se descartan, como habría
+    hecho el borrado en cascada. Si la escritura falla, las entradas vuelven a
+    la cola y se propaga el error.
+    """
+    with _lock_vaciado:
+        with _lock:
+            entradas = _pendientes[:]
+            del _pendientes[:]
+        if not entradas:
+            return 0
+        try:
+            existentes = set(
+                Cajon.objects.filter(pk__in={entrada.cajon_id for entrada in entradas})
+                .values_list('pk', flat=True)
+            )
+            entradas = [entrada for entrada in entradas if entrada.cajon_id in existentes]
+            if entradas:
+                # La transacción empieza escribiendo: en SQLite una que
+                # empezara leyendo no podría esperar el lock de escritura de
+                # los requests y fallaría con "database is locked"
+                with transaction.atomic():
+                    CajonHistorial.objects.bulk_create(entradas, batch_size=500)
+                    versiones.incrementar(CajonHistorial)
+        except Exception:
+            for entrada in entradas:
+                entrada.pk = None
+            with _lock:
+                _pendientes[:0] = entradas
+            raise
+        return len(entradas)
+
+
+def _iniciar_hilo():
+    global _hilo
+    with _lock:
+        if _hilo is not None:
+            return
+        _hilo = threading.Thread(target=_escribir_en_segundo_plano, name='historial', daemon=True)
+        _hilo.start()
+    atexit.register(_vaciar_al_salir)
+
+
+def _escribir_en_segundo_plano():
+    while True:
+        _despertar.wait(getattr(settings, 'HISTORIAL_INTERVALO', 1.0))
+        _despertar.clear()
+        try:
+            vaciar()
+        except Exception:
+            logger.exception("No se pudo guardar el historial pendiente")
+        finally:
+            close_old_connections()
+
+
+def _vaciar_al_salir():
+    try:
+        vaciar()
+    except Exception:
+        logger.exception("Se perdieron entradas de historial al terminar el proceso")
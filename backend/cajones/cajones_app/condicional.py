@@ -0,0 +1,64 @@
+"""
+GET condicional a partir de las versiones de cada recurso (ver versiones.py).
+
+El ETag y Last-Modified de una vista salen de los contadores de los modelos
+que muestra, leídos con una sola consulta por clave primaria. Si el cliente
+ya tiene esa versión (If-None-Match / If-Modified-Since) se responde 304 sin
+ejecutar la consulta principal ni serializar nada.
+"""
+from calendar import timegm
+from functools import wraps
+from inspect import iscoroutinefunction
+
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from . import versiones
+
+
+def _validadores(huella, fecha):
+    return quote_etag(f'v{huella}'), timegm(fecha.utctimetuple()) if fecha else None
+
+
+def _agregar_encabezados(response, etag, last_modified):
+    if not response.has_header('ETag'):
+        response['ETag'] = etag
+    if last_modified is not None and not response.has_header('Last-Modified'):
+        response['Last-Modified'] = http_date(last_modified)
+    return response
+
+
+def condicional(*modelos):
+    """
+    Decorador para métodos get de APIView (o de las vistas asíncronas de
+    views_async.py). `modelos` son todas las tablas cuyo contenido influye en
+    la respuesta.
+
+    La versión se lee antes que los datos: si una escritura ocurre en medio,
+    el cliente recibe datos más nuevos con un ETag viejo y simplemente los
+    vuelve a pedir la próxima vez, nunca al revés.
+    """
+    def decorador(metodo):
+        if iscoroutinefunction(metodo):
+            @wraps(metodo)
+            async def envoltura_async(self, request, *args, **kwargs):
+                etag, last_modified = _validadores(*await versiones.aestado(*modelos))
+                response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+                if response is None:
+                    response = await metodo(self, request, *args, **kwargs)
+                    if response.status_code != 200:
+                        return response
+                return _agregar_encabezados(response, etag, last_modified)
+            return envoltura_async
+
+        @wraps(metodo)
+        def envoltura(self, request, *args, **kwargs):
+            etag, last_modified = _validadores(*versiones.estado(*modelos))
+            response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if response is None:
+                response = metodo(self, request, *args, **kwargs)
+                if response.status_code != 200:
+                    return response
+            return _agregar_encabezados(response, etag, last_modified)
+        return envoltura
+    return decorador
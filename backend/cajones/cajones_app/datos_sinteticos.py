@@ -0,0 +1,137 @@
+"""
+Datos sintéticos para medir la API con volúmenes realistas.
+
+Las distribuciones imitan un inventario real: pocos cajones concentran la
+mayoría de los objetos y pocos tipos la mayoría de los objetos de cada cajón
+(ambos con pesos de Zipf), los objetos pequeños son más comunes que los
+grandes, los nombres se repiten dentro de cada tipo (así hay duplicados
+reales) y el historial se reparte en los últimos días. Todo se inserta con
+bulk_create en lotes y con la misma semilla se generan los mismos datos.
+"""
+import random
+from collections import Counter
+from datetime import timedelta
+from itertools import islice
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import versiones
+from .models import Cajon, CajonHistorial, CajonObjeto, TipoObjeto
+
+TIPOS = [
+    ('Herramienta', ['Martillo', 'Destornillador', 'Llave inglesa', 'Alicate', 'Sierra', 'Taladro', 'Nivel']),
+    ('Cocina', ['Cuchara', 'Tenedor', 'Cuchillo', 'Sartén', 'Olla', 'Espátula', 'Colador']),
+    ('Papelería', ['Lápiz', 'Bolígrafo', 'Cuaderno', 'Grapadora', 'Tijeras', 'Regla', 'Clips']),
+    ('Electrónica', ['Cable USB', 'Cargador', 'Auriculares', 'Pilas', 'Adaptador', 'Mouse', 'Teclado']),
+    ('Ropa', ['Camiseta', 'Calcetines', 'Bufanda', 'Guantes', 'Gorra', 'Cinturón', 'Pañuelo']),
+    ('Limpieza', ['Esponja', 'Trapo', 'Cepillo', 'Detergente', 'Escoba', 'Guantes de goma', 'Balde']),
+    ('Jardinería', ['Pala', 'Rastrillo', 'Tijeras de podar', 'Manguera', 'Maceta', 'Semillas', 'Regadera']),
+    ('Deportes', ['Pelota', 'Raqueta', 'Cuerda', 'Pesas', 'Toalla', 'Botella', 'Rodilleras']),
+]
+CAJONES = ['Taller', 'Cocina', 'Oficina', 'Garaje', 'Dormitorio', 'Baño', 'Bodega', 'Jardín', 'Estudio', 'Sala']
+# Proporción de pequeños, medianos y grandes
+PESOS_TAMANIO = [
+    (CajonObjeto.CajonTamanio.PEQUENO, 0.6),
+    (CajonObjeto.CajonTamanio.MEDIANO, 0.3),
+    (CajonObjeto.CajonTamanio.GRANDE, 0.1),
+]
+
+
+def _zipf(cantidad, exponente=1.1):
+    return [1 / (rango ** exponente) for rango in range(1, cantidad + 1)]
+
+
+def sembrar(cajones, tipos, objetos, dias=90, semilla=0, tamanio_lote=5000):
+    """
+    Crear `cajones` cajones, `tipos` tipos y `objetos` objetos, con una entrada
+    de historial por cajón y por objeto. Devuelve la cantidad de filas creadas
+    por modelo.
+    """
+    azar = random.Random(semilla)
+    ahora = timezone.now()
+
+    def fecha():
+        return ahora - timedelta(seconds=azar.uniform(0, dias * 86400))
+
+    # Objetos por cajón; la capacidad deja entre 0 y 60 % libre
+    por_cajon = Counter(azar.choices(range(cajones), weights=_zipf(cajones), k=objetos))
+    ocupados = [por_cajon[indice] for indice in range(cajones)]
+    tamanios, pesos_tamanio = zip(*PESOS_TAMANIO)
+
+    with transaction.atomic():
+        lista_tipos = TipoObjeto.objects.bulk_create(
+            [
+                TipoObjeto(
+                    nombre=TIPOS[indice % len(TIPOS)][0] + (f' {indice // len(TIPOS) + 1}' if indice >= len(TIPOS) else ''),
+                    descripcion=f'Objetos de {TIPOS[indice % len(TIPOS)][0].lower()}'
+                )
+                for indice in range(tipos)
+            ],
+            batch_size=tamanio_lote
+        )
+        lista_cajones = Cajon.objects.bulk_create(
+            [
+                Cajon(
+                    nombre=f'{CAJONES[indice % len(CAJONES)]} {indice + 1}',
+                    capacidad_maxima=max(ocupados[indice] + int(ocupados[indice] * azar.uniform(0, 1.5)), 1),
+                    objetos_count=ocupados[indice]
+                )
+                for indice in range(cajones)
+            ],
+            batch_size=tamanio_lote
+        )
+        CajonHistorial.objects.bulk_create(
+            [
+                CajonHistorial(
+                    cajon=cajon, fecha=fecha(), accion='creado',
+                    descripcion=f'Cajón "{cajon.nombre}" creado con capacidad {cajon.capacidad_maxima}'
+                )
+                for cajon in lista_cajones
+            ],
+            batch_size=tamanio_lote
+        )
+        nombres_por_tipo = {tipo.id: TIPOS[indice % len(TIPOS)][1] for indice, tipo in enumerate(lista_tipos)}
+        pesos_tipo = _zipf(tipos)
+
+        def generar_objetos():
+            for cajon, cantidad in zip(lista_cajones, ocupados):
+                # Cada cajón tiene sus propios tipos más frecuentes
+                orden = azar.sample(lista_tipos, len(lista_tipos))
+                for tipo in azar.choices(orden, weights=pesos_tipo, k=cantidad):
+                    yield CajonObjeto(
+                        cajon=cajon,
+                        nombre_objeto=f'{azar.choice(nombres_por_tipo[tipo.id])} {azar.randint(1, 50)}',
+                        tipo_objeto=tipo,
+                        tamanio=azar.choices(tamanios, weights=pesos_tamanio)[0]
+                    )
+
+        # Por lotes, para no tener todos los objetos en memoria
+        pendientes = generar_objetos()
+        while lote := list(islice(pendientes, tamanio_lote)):
+            CajonObjeto.objects.bulk_create(lote, batch_size=tamanio_lote)
+            CajonHistorial.objects.bulk_create(
+                [
+                    CajonHistorial(
+                        cajon_id=objeto.cajon_id, fecha=fecha(), accion='objeto_agregado',
+                        descripcion=f'Objeto "{objeto.nombre_objeto}" agregado al cajón'
+                    )
+                    for objeto in lote
+                ],
+                batch_size=tamanio_lote
+            )
+        versiones.incrementar(Cajon, TipoObjeto, CajonObjeto, CajonHistorial)
+    return {
+        'cajones': cajones,
+        'tipos': tipos,
+        'objetos': objetos,
+        'historial': cajones + objetos,
+    }
+
+
+def limpiar():
+    """Eliminar cajones y tipos (y en cascada objetos e historial)"""
+    with transaction.atomic():
+        Cajon.objects.all().delete()
+        TipoObjeto.objects.all().delete()
+        versiones.incrementar(Cajon, TipoObjeto, CajonObjeto, CajonHistorial)
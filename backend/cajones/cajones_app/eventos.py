@@ -0,0 +1,204 @@
+"""
+Flujo de cambios del historial como server-sent events (text/event-stream).
+
+Cada entrada nueva de CajonHistorial se envía como un evento `historial` con
+un id, de modo que EventSource reanuda desde la última recibida al
+reconectarse (encabezado Last-Event-ID). Para detectar cambios no se relee la
+tabla: se consulta la versión del historial (ver versiones.py), una lectura
+por clave primaria, y solo cuando cambia se piden las entradas con id mayor a
+la última enviada, por la clave primaria.
+
+Con ASGI una única tarea por proceso vigila la versión y despierta a todas las
+conexiones abiertas, que no ocupan ningún hilo mientras esperan. Con WSGI cada
+conexión consulta la versión por su cuenta y ocupa un hilo del servidor.
+
+El flujo lee siempre de la primaria, versión y entradas: la respuesta se
+recorre fuera del request, y con una réplica atrasada el vigía vería el cambio
+antes que las entradas (ver replica.py).
+
+Con SQLite las escrituras se confirman de a una y las entradas aparecen en
+orden de id, pero con PostgreSQL una transacción puede confirmarse después de
+otra que tomó un id mayor. Por eso cada consulta revisa también la ventana de
+los HISTORIAL_EVENTOS_VENTANA ids anteriores al último enviado y omite los ya
+enviados. El `id` de cada evento es el mayor enviado hasta el momento, de modo
+que una entrada tardía no hace retroceder la reconexión.
+"""
+import asyncio
+import time
+import weakref
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import Max
+from django.http import StreamingHttpResponse
+from rest_framework.utils.encoders import JSONEncoder
+
+from . import versiones
+from .models import CajonHistorial
+from .serializers import CajonHistorialFilasSerializer
+
+# Entradas leídas por consulta al ponerse al día
+TAMANIO_LOTE = 500
+_encoder = JSONEncoder(ensure_ascii=False)
+
+
+def _intervalo():
+    return getattr(settings, 'HISTORIAL_EVENTOS_INTERVALO', 0.5)
+
+
+def _keepalive():
+    return getattr(settings, 'HISTORIAL_EVENTOS_KEEPALIVE', 15)
+
+
+def _ventana():
+    return getattr(settings, 'HISTORIAL_EVENTOS_VENTANA', 100)
+
+
+def leer_parametros(request):
+    """
+    Devolver (desde, cajon_id) o lanzar ValueError si no son válidos. `desde`
+    sale de Last-Event-ID (reconexión de EventSource) o de ?desde= y es None
+    si el cliente no indicó desde dónde seguir.
+    """
+    desde = request.headers.get('Last-Event-ID') or request.GET.get('desde')
+    cajon_id = request.GET.get('cajon_id')
+    desde = int(desde) if desde else None
+    cajon_id = int(cajon_id) if cajon_id else None
+    if (desde is not None and desde < 0) or (cajon_id is not None and cajon_id <= 0):
+        raise ValueError
+    return desde, cajon_id
+
+
+def respuesta(eventos):
+    response = StreamingHttpResponse(eventos, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Evitar que un proxy (p. ej. nginx) acumule los eventos antes de enviarlos
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def ultimo_id():
+    """Id de la última entrada existente: sin Last-Event-ID solo se envían las nuevas"""
+    return CajonHistorial.objects.using(DEFAULT_DB_ALIAS).aggregate(ultimo=Max('id'))['ultimo'] or 0
+
+
+class _Posicion:
+    """Última entrada enviada y los ids enviados dentro de la ventana anterior"""
+    def __init__(self, desde, cajon_id):
+        # Nada anterior a `desde` se envía, aunque esté en la ventana
+        self.inicio = self.desde = desde
+        self.cajon_id = cajon_id
+        self.enviados = set()
+
+    def nuevas(self):
+        entradas = CajonHistorial.objects.using(DEFAULT_DB_ALIAS).filter(
+            id__gt=max(self.desde - _ventana(), self.inicio)
+        )
+        if self.enviados:
+            entradas = entradas.exclude(id__in=self.enviados)
+        if self.cajon_id is not None:
+            entradas = entradas.filter(cajon_id=self.cajon_id)
+        return CajonHistorialFilasSerializer.preparar(entradas.order_by('id'))[:TAMANIO_LOTE]
+
+    def eventos(self, filas):
+        bloques = []
+        for entrada in CajonHistorialFilasSerializer(filas, many=True).data:
+            self.desde = max(self.desde, entrada['id'])
+            self.enviados.add(entrada['id'])
+            bloques.append(f'id: {self.desde}\nevent: historial\ndata: {_encoder.encode(entrada)}\n\n')
+        piso = self.desde - _ventana()
+        self.enviados = {entrada_id for entrada_id in self.enviados if entrada_id > piso}
+        return ''.join(bloques)
+
+
+def _inicio():
+    # Tiempo de reconexión sugerido a EventSource, en milisegundos
+    return f'retry: {int(_intervalo() * 1000) * 4}\n\n'
+
+
+def flujo(desde, cajon_id=None):
+    """Generador de eventos para WSGI: consulta la versión cada HISTORIAL_EVENTOS_INTERVALO segundos"""
+    yield _inicio()
+    posicion = _Posicion(desde, cajon_id)
+    version = None
+    ultimo_envio = time.monotonic()
+    while True:
+        # La versión se lee antes que las entradas: un cambio en medio se
+        # detecta en la siguiente vuelta
+        actual = versiones.huella(CajonHistorial, using=DEFAULT_DB_ALIAS)
+        if actual != version:
+            version = actual
+            while True:
+                filas = list(posicion.nuevas())
+                if not filas:
+                    break
+                ultimo_envio = time.monotonic()
+                yield posicion.eventos(filas)
+                if len(filas) < TAMANIO_LOTE:
+                    break
+        if time.monotonic() - ultimo_envio >= _keepalive():
+            ultimo_envio = time.monotonic()
+            yield ': ping\n\n'
+        time.sleep(_intervalo())
+
+
+class _Vigia:
+    """Tarea que lee la versión del historial y avisa a las conexiones de un event loop"""
+    def __init__(self):
+        self.cambio = asyncio.Event()
+        self.conexiones = 0
+        self.tarea = None
+
+    def conectar(self):
+        self.conexiones += 1
+        if self.tarea is None:
+            self.tarea = asyncio.get_running_loop().create_task(self.vigilar())
+
+    def desconectar(self):
+        self.conexiones -= 1
+
+    async def vigilar(self):
+        version = None
+        try:
+            while self.conexiones:
+                actual = await versiones.ahuella(CajonHistorial, using=DEFAULT_DB_ALIAS)
+                if actual != version:
+                    version = actual
+                    # Se reemplaza el evento antes de avisar: quien lo tomó
+                    # antes de consultar se despierta aunque el cambio haya
+                    # llegado mientras consultaba
+                    cambio, self.cambio = self.cambio, asyncio.Event()
+                    cambio.set()
+                await asyncio.sleep(_intervalo())
+        finally:
+            self.tarea = None
+
+
+_vigias = weakref.WeakKeyDictionary()
+
+
+async def aflujo(desde, cajon_id=None):
+    """Generador de eventos para ASGI, con un solo vigía por proceso"""
+    loop = asyncio.get_running_loop()
+    vigia = _vigias.get(loop)
+    if vigia is None:
+        vigia = _vigias[loop] = _Vigia()
+    vigia.conectar()
+    try:
+        yield _inicio()
+        posicion = _Posicion(desde, cajon_id)
+        while True:
+            cambio = vigia.cambio
+            while True:
+                filas = [fila async for fila in posicion.nuevas()]
+                if not filas:
+                    break
+                yield posicion.eventos(filas)
+                if len(filas) < TAMANIO_LOTE:
+                    break
+            try:
+                await asyncio.wait_for(cambio.wait(), timeout=_keepalive())
+            except asyncio.TimeoutError:
+                yield ': ping\n\n'
+    finally:
+        vigia.desconectar()
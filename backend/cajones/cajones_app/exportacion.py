@@ -0,0 +1,65 @@
+import csv
+
+from django.http import StreamingHttpResponse
+from rest_framework.utils.encoders import JSONEncoder
+
+
+FORMATOS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv; charset=utf-8',
+}
+
+
+class _Eco:
+    """Buffer mínimo para csv.writer: devuelve lo escrito en lugar de guardarlo"""
+    def write(self, valor):
+        return valor
+
+
+def _valor_plano(valor):
+    return valor.isoformat() if hasattr(valor, 'isoformat') else valor
+
+
+def filas_ndjson(campos, filas, filas_por_fragmento):
+    encoder = JSONEncoder(ensure_ascii=False)
+    fragmento = []
+    for fila in filas:
+        fragmento.append(encoder.encode(dict(zip(campos, fila))))
+        if len(fragmento) == filas_por_fragmento:
+            yield '\n'.join(fragmento) + '\n'
+            fragmento = []
+    if fragmento:
+        yield '\n'.join(fragmento) + '\n'
+
+
+def filas_csv(campos, filas, filas_por_fragmento):
+    writer = csv.writer(_Eco())
+    yield writer.writerow(campos)
+    fragmento = []
+    for fila in filas:
+        fragmento.append(writer.writerow([_valor_plano(valor) for valor in fila]))
+        if len(fragmento) == filas_por_fragmento:
+            yield ''.join(fragmento)
+            fragmento = []
+    if fragmento:
+        yield ''.join(fragmento)
+
+
+def respuesta_exportacion(queryset, campos, formato, nombre, chunk_size=2000, filas_por_fragmento=500):
+    """
+    Exportar `queryset` como NDJSON o CSV sin cargarlo en memoria.
+
+    `campos` es una lista de pares (nombre en la salida, campo o lookup del
+    queryset); los lookups con `__` resuelven las relaciones con un JOIN en la
+    misma consulta. Las filas se leen con un iterador y se envían en
+    fragmentos de `filas_por_fragmento`.
+    """
+    nombres = [nombre_campo for nombre_campo, _ in campos]
+    filas = queryset.values_list(*[lookup for _, lookup in campos]).iterator(chunk_size=chunk_size)
+    generar = filas_csv if formato == 'csv' else filas_ndjson
+    response = StreamingHttpResponse(
+        generar(nombres, filas, filas_por_fragmento),
+        content_type=FORMATOS[formato]
+    )
+    response['Content-Disposition'] = f'attachment; filename="{nombre}.{formato}"'
+    return response
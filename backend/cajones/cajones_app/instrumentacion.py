@@ -0,0 +1,158 @@
+"""
+Medición por request de las consultas a la base y de la serialización.
+
+InstrumentacionMiddleware registra cada consulta del request (también las de
+las vistas asíncronas, que se ejecutan en otros hilos con sync_to_async),
+cuánto tardó la base y cuánto la serialización de la respuesta, y lo informa
+en el encabezado Server-Timing:
+
+    Server-Timing: db;dur=3.1;desc="4 consultas", serializacion;dur=0.4, total;dur=5.2
+
+Una misma consulta (el mismo SQL con otros parámetros) que se repite
+INSTRUMENTACION_CONSULTAS_REPETIDAS veces o más suele ser un N+1: se registra
+una advertencia con el SQL. Lo mismo si el request supera su presupuesto de
+consultas (INSTRUMENTACION_PRESUPUESTOS por nombre de ruta, o
+INSTRUMENTACION_MAX_CONSULTAS). Con INSTRUMENTACION_ESTRICTA, en lugar de
+advertir se lanza ConsultasExcedidas, así una prueba que recorre la vista
+falla.
+"""
+import logging
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+_registro = ContextVar('registro_consultas', default=None)
+
+
+class ConsultasExcedidas(AssertionError):
+    """Un request hizo consultas repetidas o más de las de su presupuesto"""
+
+
+class Registro:
+    def __init__(self):
+        # (sql, segundos) de cada consulta, en orden
+        self.consultas = []
+        self.serializacion = 0.0
+
+    @property
+    def tiempo_db(self):
+        return sum(duracion for _, duracion in self.consultas)
+
+    def repetidas(self, umbral):
+        """[(sql, veces)] de las consultas que se ejecutaron `umbral` veces o más"""
+        veces = Counter(sql for sql, _ in self.consultas)
+        return [(sql, cantidad) for sql, cantidad in veces.most_common() if cantidad >= umbral]
+
+
+def registrar_consulta(execute, sql, params, many, context):
+    """Envoltorio de ejecución (connection.execute_wrappers) que alimenta el registro del request"""
+    registro = _registro.get()
+    if registro is None:
+        return execute(sql, params, many, context)
+    inicio = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        registro.consultas.append((sql, time.perf_counter() - inicio))
+
+
+def instalar(sender, connection, **kwargs):
+    """Receptor de connection_created: cada conexión, de cualquier hilo, usa registrar_consulta"""
+    if registrar_consulta not in connection.execute_wrappers:
+        connection.execute_wrappers.append(registrar_consulta)
+
+
+@contextmanager
+def medir_serializacion():
+    """Sumar al request actual el tiempo de serializar una respuesta armada en la vista"""
+    registro = _registro.get()
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        if registro is not None:
+            registro.serializacion += time.perf_counter() - inicio
+
+
+def presupuesto(request):
+    """Máximo de consultas para el request, según el nombre de su ruta, o None"""
+    nombre = getattr(request.resolver_match, 'url_name', None)
+    presupuestos = getattr(settings, 'INSTRUMENTACION_PRESUPUESTOS', {})
+    if nombre in presupuestos:
+        return presupuestos[nombre]
+    return getattr(settings, 'INSTRUMENTACION_MAX_CONSULTAS', None)
+
+
+class InstrumentacionMiddleware:
+    """Debe ir primero en MIDDLEWARE para medir todo el request"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        registro = Registro()
+        token = _registro.set(registro)
+        inicio = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _registro.reset(token)
+        return self.informar(request, response, registro, time.perf_counter() - inicio)
+
+    async def __acall__(self, request):
+        registro = Registro()
+        token = _registro.set(registro)
+        inicio = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _registro.reset(token)
+        return self.informar(request, response, registro, time.perf_counter() - inicio)
+
+    def process_template_response(self, request, response):
+        # Las respuestas de DRF se convierten a JSON después de la vista, al
+        # renderizarse: se mide desde aquí hasta que termina el render
+        registro = _registro.get()
+        if registro is not None:
+            inicio = time.perf_counter()
+
+            def terminar(response):
+                registro.serializacion += time.perf_counter() - inicio
+            response.add_post_render_callback(terminar)
+        return response
+
+    def informar(self, request, response, registro, total):
+        problemas = []
+        umbral = getattr(settings, 'INSTRUMENTACION_CONSULTAS_REPETIDAS', 5)
+        for sql, veces in registro.repetidas(umbral):
+            problemas.append(f'consulta repetida {veces} veces (posible N+1): {sql}')
+        maximo = presupuesto(request)
+        if maximo is not None and len(registro.consultas) > maximo:
+            problemas.append(f'{len(registro.consultas)} consultas, el presupuesto es {maximo}')
+        if problemas:
+            mensaje = f'{request.method} {request.path}: ' + '; '.join(problemas)
+            if getattr(settings, 'INSTRUMENTACION_ESTRICTA', False):
+                raise ConsultasExcedidas(mensaje)
+            logger.warning(mensaje)
+
+        metricas = [
+            f'db;dur={registro.tiempo_db * 1000:.1f};desc="{len(registro.consultas)} consultas"',
+            f'serializacion;dur={registro.serializacion * 1000:.1f}',
+            f'total;dur={total * 1000:.1f}',
+        ]
+        if response.has_header('Server-Timing'):
+            metricas.insert(0, response['Server-Timing'])
+        response['Server-Timing'] = ', '.join(metricas)
+        return response
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from cajones_app import retencion
+
+
+class Command(BaseCommand):
+    help = (
+        'Archiva en un archivo JSONL comprimido las entradas de historial más antiguas que la '
+        'retención, las resume por cajón, día y acción y las elimina de la base en lotes.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dias', type=int, help='Días de historial que se conservan (HISTORIAL_RETENCION_DIAS)')
+        parser.add_argument('--directorio', help='Directorio de los archivos (HISTORIAL_ARCHIVO_DIR)')
+        parser.add_argument('--lote', type=int, default=1000, help='Entradas eliminadas por transacción')
+        parser.add_argument('--pausa', type=float, default=0, help='Segundos de espera entre lotes')
+
+    def handle(self, *args, **options):
+        if options['dias'] is not None and options['dias'] < 0:
+            raise CommandError('--dias no puede ser negativo')
+        if options['lote'] <= 0:
+            raise CommandError('--lote debe ser mayor a 0')
+        ruta, total = retencion.archivar(
+            dias=options['dias'],
+            directorio=options['directorio'],
+            tamanio_lote=options['lote'],
+            pausa=options['pausa']
+        )
+        if not total:
+            self.stdout.write('No hay entradas de historial para archivar')
+            return
+        self.stdout.write(f'{total} entradas archivadas en {ruta}')
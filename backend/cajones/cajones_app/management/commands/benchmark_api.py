@@ -0,0 +1,182 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from cajones_app import urls
+from cajones_app.management.medicion import percentil
+from cajones_app.models import Cajon, CajonHistorial, CajonObjeto, RecomendacionTrabajo, TipoObjeto
+
+# Modelo del que se toma el id para el parámetro `pk` de cada ruta
+MODELOS_PK = {
+    'cajon-detail': Cajon,
+    'historial-detail': CajonHistorial,
+    'tipo-objeto-detail': TipoObjeto,
+    'objeto-detail': CajonObjeto,
+    'recomendacion-trabajo-detail': RecomendacionTrabajo,
+}
+PARAMETROS = {
+    'buscar': {'q': 'martillo'},
+    # El plan local no depende de Gemini
+    'recomendacion-simple': {'modo': 'local'},
+}
+OMITIR = {
+    'historial-eventos': 'flujo sin fin (server-sent events)',
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Ejecuta cada ruta GET de cajones_app/urls.py con el cliente de pruebas sobre los datos '
+        'actuales (ver sembrar_datos) e informa en JSON la latencia p50/p95/p99 y las consultas '
+        'de cada una. Con --base compara con un resultado anterior y falla si alguna ruta empeoró.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeticiones', type=int, default=30)
+        parser.add_argument('--calentamiento', type=int, default=2, help='Requests sin medir antes de cada ruta')
+        parser.add_argument('--rutas', nargs='+', help='Nombres de las rutas a medir (todas por defecto)')
+        parser.add_argument('--salida', help='Archivo donde guardar el resultado (por defecto, la salida estándar)')
+        parser.add_argument('--base', help='Resultado anterior con el que comparar')
+        parser.add_argument(
+            '--tolerancia', type=float, default=0.2, help='Aumento del p95 que se acepta respecto de la base (0.2 = 20 %%)'
+        )
+        parser.add_argument(
+            '--umbral-ms', type=float, default=5.0, help='Diferencias de p95 menores a esta no se consideran'
+        )
+
+    def handle(self, *args, **options):
+        if options['repeticiones'] <= 0:
+            raise CommandError('--repeticiones debe ser mayor a 0')
+        base = None
+        if options['base']:
+            try:
+                with open(options['base'], encoding='utf-8') as archivo:
+                    base = json.load(archivo)
+            except (OSError, ValueError) as e:
+                raise CommandError(f'No se pudo leer la base {options["base"]}: {e}')
+
+        with override_settings(ALLOWED_HOSTS=['testserver'], INSTRUMENTACION_ESTRICTA=False):
+            resultado = self.medir_rutas(options)
+
+        texto = json.dumps(resultado, ensure_ascii=False, indent=2)
+        if options['salida']:
+            with open(options['salida'], 'w', encoding='utf-8') as archivo:
+                archivo.write(texto + '\n')
+            self.stderr.write(f'Resultado guardado en {options["salida"]}')
+        else:
+            self.stdout.write(texto)
+
+        if base is not None:
+            if base.get('datos') != resultado['datos']:
+                self.stderr.write(
+                    f"Advertencia: los datos no son los de la base ({base.get('datos')} y {resultado['datos']})"
+                )
+            regresiones = self.comparar(base, resultado, options['tolerancia'], options['umbral_ms'])
+            if regresiones:
+                for regresion in regresiones:
+                    self.stderr.write(regresion)
+                raise CommandError(f'{len(regresiones)} rutas empeoraron respecto de {options["base"]}')
+            self.stderr.write(f'Sin regresiones respecto de {options["base"]}')
+
+    def medir_rutas(self, options):
+        client = Client()
+        rutas = {}
+        omitidas = {}
+        for nombre, ruta, motivo in self.rutas(options['rutas']):
+            if motivo:
+                omitidas[nombre] = motivo
+                continue
+            for _ in range(options['calentamiento']):
+                self.pedir(client, ruta, PARAMETROS.get(nombre, {}))
+            tiempos = []
+            consultas = 0
+            for _ in range(options['repeticiones']):
+                with CaptureQueriesContext(connection) as capturadas:
+                    inicio = time.perf_counter()
+                    estado = self.pedir(client, ruta, PARAMETROS.get(nombre, {}))
+                    tiempos.append((time.perf_counter() - inicio) * 1000)
+                consultas = max(consultas, len(capturadas))
+            rutas[nombre] = {
+                'ruta': ruta,
+                'estado': estado,
+                'p50_ms': round(percentil(tiempos, 50), 2),
+                'p95_ms': round(percentil(tiempos, 95), 2),
+                'p99_ms': round(percentil(tiempos, 99), 2),
+                'consultas': consultas,
+            }
+        return {
+            'datos': {
+                'cajones': Cajon.objects.count(),
+                'tipos': TipoObjeto.objects.count(),
+                'objetos': CajonObjeto.objects.count(),
+                'historial': CajonHistorial.objects.count(),
+            },
+            'repeticiones': options['repeticiones'],
+            'rutas': rutas,
+            'omitidas': omitidas,
+        }
+
+    @staticmethod
+    def rutas(nombres):
+        """(nombre, ruta concreta, motivo para omitirla o None) de cada ruta de la app"""
+        # Las rutas por cajón se miden con el cajón más ocupado
+        cajon = Cajon.objects.order_by('-objetos_count', 'id').values_list('id', flat=True).first()
+        for patron in urls.urlpatterns:
+            nombre = patron.name
+            if nombres and nombre not in nombres:
+                continue
+            vista = getattr(patron.callback, 'view_class', None)
+            if vista is None or not hasattr(vista, 'get'):
+                yield nombre, None, 'no acepta GET'
+                continue
+            if nombre in OMITIR:
+                yield nombre, None, OMITIR[nombre]
+                continue
+            parametros = {}
+            for parametro in patron.pattern.converters:
+                if parametro == 'cajon_id':
+                    parametros[parametro] = cajon
+                elif parametro == 'pk' and nombre in MODELOS_PK:
+                    parametros[parametro] = (
+                        MODELOS_PK[nombre].objects.order_by('id').values_list('id', flat=True).first()
+                    )
+                else:
+                    parametros[parametro] = None
+            if None in parametros.values():
+                yield nombre, None, 'no hay datos para completar la ruta'
+                continue
+            ruta = '/' + str(patron.pattern)
+            for parametro, valor in parametros.items():
+                ruta = ruta.replace(f'<int:{parametro}>', str(valor))
+            yield nombre, ruta, None
+
+    @staticmethod
+    def pedir(client, ruta, parametros):
+        response = client.get(ruta, parametros)
+        if response.streaming:
+            # Las exportaciones se miden hasta el último byte
+            for _ in response.streaming_content:
+                pass
+        return response.status_code
+
+    @staticmethod
+    def comparar(base, resultado, tolerancia, umbral_ms):
+        regresiones = []
+        for nombre, actual in resultado['rutas'].items():
+            anterior = base.get('rutas', {}).get(nombre)
+            if anterior is None:
+                continue
+            if actual['estado'] != anterior['estado']:
+                regresiones.append(f"{nombre}: responde {actual['estado']}, antes {anterior['estado']}")
+            if actual['consultas'] > anterior['consultas']:
+                regresiones.append(f"{nombre}: {actual['consultas']} consultas, antes {anterior['consultas']}")
+            if (
+                actual['p95_ms'] > anterior['p95_ms'] * (1 + tolerancia)
+                and actual['p95_ms'] - anterior['p95_ms'] > umbral_ms
+            ):
+                regresiones.append(f"{nombre}: p95 {actual['p95_ms']} ms, antes {anterior['p95_ms']} ms")
+        return regresiones
@@ -0,0 +1,111 @@
+import asyncio
+import time
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.core.management.base import BaseCommand
+from django.test import AsyncRequestFactory, override_settings
+
+from cajones_app.management.medicion import percentil
+from cajones_app.models import Cajon
+from cajones_app.services import ModeloLocal
+from cajones_app.views import CajonCapacidadView, RecomendacionSimpleView
+from cajones_app.views_async import CajonCapacidadAsyncView, RecomendacionAsyncView
+
+
+class ModeloLento(ModeloLocal):
+    """ModeloLocal que tarda lo que una llamada a Gemini"""
+    demora = 0.5
+
+    def generate_content(self, prompt):
+        time.sleep(self.demora)
+        return super().generate_content(prompt)
+
+    async def generate_content_async(self, prompt):
+        await asyncio.sleep(self.demora)
+        return super().generate_content(prompt)
+
+
+class Command(BaseCommand):
+    help = (
+        'Simula un worker ASGI que recibe a la vez pedidos de recomendaciones (con la demora de '
+        'Gemini) y lecturas de capacidad, primero con las vistas síncronas y después con las '
+        'asíncronas. Usa un cajón de prueba que se elimina al terminar.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recomendaciones', type=int, default=20)
+        parser.add_argument('--lecturas', type=int, default=200)
+        parser.add_argument('--demora', type=float, default=0.5, help='Segundos que tarda cada respuesta del modelo')
+
+    def handle(self, *args, **options):
+        ModeloLento.demora = options['demora']
+        cajon = Cajon.objects.create(nombre='Benchmark async', capacidad_maxima=10)
+        cache_desactivada = {
+            'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+            'recomendaciones': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+        }
+        try:
+            with override_settings(RECOMENDACIONES_MODELO='local', CACHES=cache_desactivada), \
+                    mock.patch('cajones_app.services.ModeloLocal', ModeloLento):
+                self.stdout.write(
+                    f"{'vistas':<10} {'total':>7} {'lectura p50':>12} {'lectura p95':>12} {'recomendación p50':>18}"
+                )
+                for nombre, recomendacion, capacidad in [
+                    ('síncronas', self.sincronica(RecomendacionSimpleView), self.sincronica(CajonCapacidadView)),
+                    ('asíncronas', RecomendacionAsyncView.as_view(), CajonCapacidadAsyncView.as_view()),
+                ]:
+                    total, lecturas, recomendaciones = asyncio.run(
+                        self.medir(recomendacion, capacidad, cajon.id, options)
+                    )
+                    self.stdout.write(
+                        f'{nombre:<10} {total:>6.2f}s {percentil(lecturas, 50) * 1000:>10.1f}ms '
+                        f'{percentil(lecturas, 95) * 1000:>10.1f}ms '
+                        f'{percentil(recomendaciones, 50):>17.2f}s'
+                    )
+        finally:
+            cajon.delete()
+
+    @staticmethod
+    def sincronica(vista):
+        """Una vista de DRF ejecutada como lo hace Django con ASGI: en el hilo compartido"""
+        vista = vista.as_view()
+
+        @sync_to_async
+        def ejecutar(request, **kwargs):
+            return vista(request, **kwargs).render()
+        return ejecutar
+
+    async def medir(self, recomendacion, capacidad, cajon_id, options):
+        factory = AsyncRequestFactory()
+
+        async def cronometrar(tipo, vista, request, **kwargs):
+            inicio = time.perf_counter()
+            response = await vista(request, **kwargs)
+            assert response.status_code == 200, response.content
+            return tipo, time.perf_counter() - inicio
+
+        recomendaciones = [
+            cronometrar('recomendacion', recomendacion, factory.get('/api/recomendacion/'))
+            for _ in range(options['recomendaciones'])
+        ]
+        lecturas = [
+            cronometrar('lectura', capacidad, factory.get(f'/api/cajones/{cajon_id}/capacidad/'), cajon_id=cajon_id)
+            for _ in range(options['lecturas'])
+        ]
+        # Las lecturas llegan intercaladas con los pedidos de recomendaciones
+        cada = max(len(lecturas) // max(len(recomendaciones), 1), 1)
+        tareas = []
+        for indice, lectura in enumerate(lecturas):
+            if indice % cada == 0 and recomendaciones:
+                tareas.append(recomendaciones.pop())
+            tareas.append(lectura)
+        tareas.extend(recomendaciones)
+        inicio = time.perf_counter()
+        tiempos = await asyncio.gather(*tareas)
+        total = time.perf_counter() - inicio
+        return (
+            total,
+            [tiempo for tipo, tiempo in tiempos if tipo == 'lectura'],
+            [tiempo for tipo, tiempo in tiempos if tipo == 'recomendacion'],
+        )
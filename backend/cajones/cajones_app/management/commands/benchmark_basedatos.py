@@ -0,0 +1,155 @@
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, close_old_connections, connection
+
+from cajones_app import datos_sinteticos
+from cajones_app.management.medicion import percentil
+from cajones_app.models import Cajon, CajonHistorial, CajonObjeto
+from cajones_app.services import CajonService
+
+# Variables de entorno de cada perfil; 'basico' reproduce la configuración
+# anterior (journal por defecto, sin PRAGMA y una conexión por request)
+PERFILES = {
+    'basico': {
+        'SQLITE_JOURNAL_MODE': 'DELETE',
+        'SQLITE_SYNCHRONOUS': 'FULL',
+        'SQLITE_CACHE_KB': '2000',
+        'SQLITE_MMAP_MB': '0',
+        'SQLITE_TRANSACTION_MODE': 'DEFERRED',
+        'DB_CONN_MAX_AGE': '0',
+    },
+    'produccion': {},
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Compara los perfiles de SQLite con lectores y escritores concurrentes sobre una base '
+        'temporal: cada perfil se ejecuta en un proceso aparte con sus variables de entorno. '
+        'Informa operaciones por segundo, p95 y errores "database is locked".'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--perfiles', nargs='+', choices=list(PERFILES), default=list(PERFILES))
+        parser.add_argument('--lectores', type=int, default=4)
+        parser.add_argument('--escritores', type=int, default=4)
+        parser.add_argument('--segundos', type=float, default=5)
+        parser.add_argument('--objetos', type=int, default=20000, help='Objetos sembrados antes de medir')
+        # Uso interno: el proceso de un perfil, que mide con la configuración de su entorno
+        parser.add_argument('--ejecutar', action='store_true', help='(interno) medir con la base configurada')
+
+    def handle(self, *args, **options):
+        if options['ejecutar']:
+            self.stdout.write(json.dumps(self.medir(options)))
+            return
+        if settings.DATABASES['default']['ENGINE'] != 'django.db.backends.sqlite3':
+            raise CommandError('El benchmark compara perfiles de SQLite')
+
+        self.stdout.write(
+            f"{'perfil':<11} {'lecturas/s':>10} {'lectura p95':>12} {'escrituras/s':>12} "
+            f"{'escritura p95':>14} {'errores':>8}"
+        )
+        for perfil in options['perfiles']:
+            with tempfile.TemporaryDirectory() as directorio:
+                entorno = {
+                    **os.environ,
+                    **PERFILES[perfil],
+                    'DB_ENGINE': 'sqlite',
+                    'SQLITE_PATH': os.path.join(directorio, 'benchmark.sqlite3'),
+                }
+                proceso = subprocess.run(
+                    [
+                        sys.executable, '-m', 'django', 'benchmark_basedatos', '--ejecutar',
+                        '--lectores', str(options['lectores']), '--escritores', str(options['escritores']),
+                        '--segundos', str(options['segundos']), '--objetos', str(options['objetos']),
+                    ],
+                    cwd=settings.BASE_DIR, env=entorno, capture_output=True, text=True
+                )
+            if proceso.returncode:
+                raise CommandError(f'Falló el perfil {perfil}:\n{proceso.stderr}')
+            r = json.loads(proceso.stdout.strip().splitlines()[-1])
+            self.stdout.write(
+                f"{perfil:<11} {r['lecturas'] / r['segundos']:>10.0f} {r['lectura_p95_ms']:>10.1f}ms "
+                f"{r['escrituras'] / r['segundos']:>12.0f} {r['escritura_p95_ms']:>12.1f}ms {r['errores']:>8}"
+            )
+
+    def medir(self, options):
+        call_command('migrate', verbosity=0)
+        datos_sinteticos.sembrar(50, 10, options['objetos'])
+        tipo_id = CajonObjeto.objects.values_list('tipo_objeto_id', flat=True).first()
+        # Cajones sin límite práctico para que las escrituras no fallen por capacidad
+        destinos = [CajonService.crear_cajon(f'Benchmark {i}', 10 ** 9).id for i in range(options['escritores'])]
+        cajones = list(Cajon.objects.values_list('id', flat=True))
+        connection.close()
+
+        def leer(azar):
+            cajon_id = azar.choice(cajones)
+            accion = azar.randrange(3)
+            if accion == 0:
+                list(CajonService.cajones_con_ocupacion().order_by('id')[:50])
+            elif accion == 1:
+                CajonService.obtener_estadisticas_cajon(cajon_id)
+            else:
+                list(CajonHistorial.objects.filter(cajon_id=cajon_id).order_by('-fecha', '-id')[:20])
+
+        def escribir(azar, indice, propios):
+            # Altas y movimientos entre cajones; mover_objeto lee antes de escribir
+            if propios and azar.random() < 0.5:
+                CajonService.mover_objeto(azar.choice(propios), azar.choice(destinos))
+            else:
+                propios.append(
+                    CajonService.agregar_objeto_a_cajon(destinos[indice], f'Objeto {azar.random()}', tipo_id, 'PE').id
+                )
+
+        tiempos = {'lectura': [], 'escritura': []}
+        errores = []
+        fin = time.perf_counter() + options['segundos']
+
+        def trabajar(tipo, indice):
+            azar = random.Random(indice)
+            duraciones = []
+            objetos = []
+            while time.perf_counter() < fin:
+                inicio = time.perf_counter()
+                try:
+                    if tipo == 'lectura':
+                        leer(azar)
+                    else:
+                        escribir(azar, indice, objetos)
+                    duraciones.append(time.perf_counter() - inicio)
+                except OperationalError as e:
+                    errores.append(str(e))
+                finally:
+                    # Como al terminar un request: con CONN_MAX_AGE = 0 se cierra la conexión
+                    close_old_connections()
+            tiempos[tipo].extend(duraciones)
+            connection.close()
+
+        hilos = [
+            threading.Thread(target=trabajar, args=('lectura', i)) for i in range(options['lectores'])
+        ] + [
+            threading.Thread(target=trabajar, args=('escritura', i)) for i in range(options['escritores'])
+        ]
+        inicio = time.perf_counter()
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        return {
+            'segundos': time.perf_counter() - inicio,
+            'lecturas': len(tiempos['lectura']),
+            'escrituras': len(tiempos['escritura']),
+            'lectura_p95_ms': percentil(tiempos['lectura'], 95) * 1000,
+            'escritura_p95_ms': percentil(tiempos['escritura'], 95) * 1000,
+            'errores': len(errores),
+        }
@@ -0,0 +1,66 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from cajones_app.models import Cajon, CajonObjeto, TipoObjeto
+from cajones_app.serializers import CajonObjetoSerializer, CajonObjetoFilasSerializer
+
+
+class Command(BaseCommand):
+    help = (
+        'Compara el tiempo de serializar listados de objetos con ModelSerializer '
+        'y con la serialización por values(). Los datos de prueba se descartan al terminar.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--filas', type=int, nargs='+', default=[10000, 100000])
+        parser.add_argument('--repeticiones', type=int, default=3)
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'filas':>8} {'ModelSerializer':>16} {'values()':>10} {'mejora':>7}")
+        for filas in options['filas']:
+            with transaction.atomic():
+                queryset = self.crear_datos(filas)
+                modelo = self.medir(
+                    lambda: CajonObjetoSerializer(list(queryset), many=True).data,
+                    options['repeticiones']
+                )
+                rapido = self.medir(
+                    lambda: CajonObjetoFilasSerializer(
+                        list(CajonObjetoFilasSerializer.preparar(queryset)), many=True
+                    ).data,
+                    options['repeticiones']
+                )
+                transaction.set_rollback(True)
+            self.stdout.write(f'{filas:>8} {modelo:>15.3f}s {rapido:>9.3f}s {modelo / rapido:>6.1f}x')
+
+    def crear_datos(self, filas):
+        tipos = TipoObjeto.objects.bulk_create(TipoObjeto(nombre=f'Tipo {i}') for i in range(20))
+        cajones = Cajon.objects.bulk_create(
+            Cajon(nombre=f'Cajón {i}', capacidad_maxima=filas) for i in range(50)
+        )
+        tamanios = CajonObjeto.CajonTamanio.values
+        CajonObjeto.objects.bulk_create(
+            (
+                CajonObjeto(
+                    cajon=cajones[i % len(cajones)],
+                    nombre_objeto=f'Objeto {i}',
+                    tipo_objeto=tipos[i % len(tipos)],
+                    tamanio=tamanios[i % len(tamanios)]
+                )
+                for i in range(filas)
+            ),
+            batch_size=5000
+        )
+        ids = [cajon.id for cajon in cajones]
+        return CajonObjeto.objects.filter(cajon_id__in=ids).order_by('id')
+
+    def medir(self, funcion, repeticiones):
+        mejor = None
+        for _ in range(repeticiones):
+            inicio = time.perf_counter()
+            funcion()
+            duracion = time.perf_counter() - inicio
+            mejor = duracion if mejor is None else min(mejor, duracion)
+        return mejor
@@ -0,0 +1,42 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from cajones_app import datos_sinteticos
+
+
+class Command(BaseCommand):
+    help = (
+        'Crea cajones, tipos y objetos sintéticos con distribuciones realistas (y su historial) '
+        'para medir la API con el volumen de datos esperado. Ver cajones_app/datos_sinteticos.py.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cajones', type=int, default=200)
+        parser.add_argument('--tipos', type=int, default=30)
+        parser.add_argument('--objetos', type=int, default=50000)
+        parser.add_argument('--dias', type=int, default=90, help='Días en los que se reparte el historial')
+        parser.add_argument('--semilla', type=int, default=0, help='La misma semilla genera los mismos datos')
+        parser.add_argument('--lote', type=int, default=5000, help='Filas por bulk_create')
+        parser.add_argument(
+            '--limpiar', action='store_true', help='Eliminar antes todos los cajones, tipos, objetos e historial'
+        )
+
+    def handle(self, *args, **options):
+        if options['cajones'] <= 0 or options['tipos'] <= 0:
+            raise CommandError('--cajones y --tipos deben ser mayores a 0')
+        if options['objetos'] < 0:
+            raise CommandError('--objetos no puede ser negativo')
+        if options['lote'] <= 0:
+            raise CommandError('--lote debe ser mayor a 0')
+        inicio = time.perf_counter()
+        if options['limpiar']:
+            datos_sinteticos.limpiar()
+        creados = datos_sinteticos.sembrar(
+            options['cajones'], options['tipos'], options['objetos'],
+            dias=options['dias'], semilla=options['semilla'], tamanio_lote=options['lote']
+        )
+        self.stdout.write(
+            f"{creados['cajones']} cajones, {creados['tipos']} tipos, {creados['objetos']} objetos y "
+            f"{creados['historial']} entradas de historial creados en {time.perf_counter() - inicio:.1f}s"
+        )
@@ -0,0 +1,29 @@
+import time
+
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+
+from cajones_app import replica
+
+
+class Command(BaseCommand):
+    help = (
+        'Copia la base SQLite primaria a la réplica (SQLITE_REPLICA_PATH) para probar en local '
+        'la réplica de lectura. Con --cada se repite, como una replicación con retraso.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cada', type=float, help='Segundos entre copias (por defecto, una sola copia)')
+
+    def handle(self, *args, **options):
+        if options['cada'] is not None and options['cada'] <= 0:
+            raise CommandError('--cada debe ser mayor a 0')
+        while True:
+            try:
+                replica.sincronizar()
+            except ImproperlyConfigured as e:
+                raise CommandError(str(e))
+            self.stdout.write(f'Réplica sincronizada ({time.strftime("%H:%M:%S")})')
+            if options['cada'] is None:
+                return
+            time.sleep(options['cada'])
@@ -0,0 +1,9 @@
+"""Cálculos comunes de los comandos de benchmark"""
+import statistics
+
+
+def percentil(valores, p):
+    """Percentil `p` (1 a 99) de los valores, interpolando entre las muestras"""
+    if len(valores) < 2:
+        return valores[0] if valores else 0
+    return statistics.quantiles(valores, n=100, method='inclusive')[p - 1]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.4 on 2026-10-18 16:34
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def calcular_objetos_count(apps, schema_editor):
+    Cajon = apps.get_model('cajones_app', 'Cajon')
+    CajonObjeto = apps.get_model('cajones_app', 'CajonObjeto')
+    conteo = (
+        CajonObjeto.objects.filter(cajon=OuterRef('pk'))
+        .values('cajon')
+        .annotate(total=Count('id'))
+        .values('total')
+    )
+    Cajon.objects.update(objetos_count=Coalesce(Subquery(conteo), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cajones_app', '0002_remove_cajon_historial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cajon',
+            name='objetos_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(calcular_objetos_count, migrations.RunPython.noop),
+    ]
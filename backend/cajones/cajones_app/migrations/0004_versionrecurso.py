@@ -0,0 +1,32 @@
+# Generated by Django 5.2.4 on 2026-10-18 16:39
+
+from django.db import migrations, models
+
+
+RECURSOS = ['cajones_app.cajon', 'cajones_app.tipoobjeto', 'cajones_app.cajonobjeto']
+
+
+def crear_contadores(apps, schema_editor):
+    VersionRecurso = apps.get_model('cajones_app', 'VersionRecurso')
+    VersionRecurso.objects.bulk_create(
+        [VersionRecurso(recurso=recurso, version=1) for recurso in RECURSOS],
+        ignore_conflicts=True
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cajones_app', '0003_cajon_objetos_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VersionRecurso',
+            fields=[
+                ('recurso', models.CharField(max_length=100, primary_key=True, serialize=False)),
+                ('version', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(crear_contadores, migrations.RunPython.noop),
+    ]
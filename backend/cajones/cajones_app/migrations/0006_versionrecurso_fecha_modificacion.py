@@ -0,0 +1,25 @@
+# Generated by Django 5.2.4 on 2026-10-18 16:53
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def crear_contador_historial(apps, schema_editor):
+    VersionRecurso = apps.get_model('cajones_app', 'VersionRecurso')
+    VersionRecurso.objects.get_or_create(recurso='cajones_app.cajonhistorial', defaults={'version': 1})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cajones_app', '0005_recomendaciontrabajo'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='versionrecurso',
+            name='fecha_modificacion',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.RunPython(crear_contador_historial, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.4 on 2026-10-18 16:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cajones_app', '0006_versionrecurso_fecha_modificacion'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cajonhistorial',
+            index=models.Index(fields=['cajon', '-fecha', '-id'], name='historial_cajon_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cajonhistorial',
+            index=models.Index(fields=['-fecha', '-id'], name='historial_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cajonobjeto',
+            index=models.Index(fields=['cajon', 'tamanio'], name='objeto_cajon_tamanio_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cajonobjeto',
+            index=models.Index(fields=['tipo_objeto', 'tamanio'], name='objeto_tipo_tamanio_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cajonobjeto',
+            index=models.Index(fields=['nombre_objeto', 'tipo_objeto', 'tamanio'], name='objeto_nombre_tipo_tamanio_idx'),
+        ),
+    ]
@@ -0,0 +1,80 @@
+from django.db import migrations
+
+
+# Índice de texto completo (SQLite FTS5) sobre los objetos: una fila por objeto
+# con su nombre y el nombre y la descripción de su tipo. Los triggers lo
+# mantienen sincronizado en cualquier escritura (vistas, CajonService,
+# bulk_create, update(), admin o SQL directo). En otros motores no se crea y
+# la búsqueda usa consultas normales.
+CREAR = [
+    """
+    CREATE VIRTUAL TABLE cajones_app_busqueda USING fts5(
+        nombre_objeto, tipo_nombre, tipo_descripcion,
+        tokenize='unicode61 remove_diacritics 2',
+        prefix='2 3'
+    )
+    """,
+    """
+    INSERT INTO cajones_app_busqueda (rowid, nombre_objeto, tipo_nombre, tipo_descripcion)
+    SELECT o.id, o.nombre_objeto, t.nombre, COALESCE(t.descripcion, '')
+    FROM cajones_app_cajonobjeto o
+    JOIN cajones_app_tipoobjeto t ON t.id = o.tipo_objeto_id
+    """,
+    """
+    CREATE TRIGGER cajones_app_busqueda_objeto_ai AFTER INSERT ON cajones_app_cajonobjeto BEGIN
+        INSERT INTO cajones_app_busqueda (rowid, nombre_objeto, tipo_nombre, tipo_descripcion)
+        SELECT new.id, new.nombre_objeto, t.nombre, COALESCE(t.descripcion, '')
+        FROM cajones_app_tipoobjeto t WHERE t.id = new.tipo_objeto_id;
+    END
+    """,
+    """
+    CREATE TRIGGER cajones_app_busqueda_objeto_au
+    AFTER UPDATE OF nombre_objeto, tipo_objeto_id ON cajones_app_cajonobjeto BEGIN
+        DELETE FROM cajones_app_busqueda WHERE rowid = old.id;
+        INSERT INTO cajones_app_busqueda (rowid, nombre_objeto, tipo_nombre, tipo_descripcion)
+        SELECT new.id, new.nombre_objeto, t.nombre, COALESCE(t.descripcion, '')
+        FROM cajones_app_tipoobjeto t WHERE t.id = new.tipo_objeto_id;
+    END
+    """,
+    """
+    CREATE TRIGGER cajones_app_busqueda_objeto_ad AFTER DELETE ON cajones_app_cajonobjeto BEGIN
+        DELETE FROM cajones_app_busqueda WHERE rowid = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER cajones_app_busqueda_tipo_au
+    AFTER UPDATE OF nombre, descripcion ON cajones_app_tipoobjeto BEGIN
+        UPDATE cajones_app_busqueda
+        SET tipo_nombre = new.nombre, tipo_descripcion = COALESCE(new.descripcion, '')
+        WHERE rowid IN (SELECT id FROM cajones_app_cajonobjeto WHERE tipo_objeto_id = new.id);
+    END
+    """,
+]
+
+ELIMINAR = [
+    'DROP TRIGGER IF EXISTS cajones_app_busqueda_tipo_au',
+    'DROP TRIGGER IF EXISTS cajones_app_busqueda_objeto_ad',
+    'DROP TRIGGER IF EXISTS cajones_app_busqueda_objeto_au',
+    'DROP TRIGGER IF EXISTS cajones_app_busqueda_objeto_ai',
+    'DROP TABLE IF EXISTS cajones_app_busqueda',
+]
+
+
+def ejecutar(sentencias):
+    def operacion(apps, schema_editor):
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for sentencia in sentencias:
+            schema_editor.execute(sentencia)
+    return operacion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cajones_app', '0007_indices_consultas_frecuentes'),
+    ]
+
+    operations = [
+        migrations.RunPython(ejecutar(CREAR), ejecutar(ELIMINAR)),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.4 on 2026-10-18 17:16
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cajones_app', '0008_busqueda_fts'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='cajonhistorial',
+            name='fecha',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.4 on 2026-10-18 17:21
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cajones_app', '0009_fecha_historial_diferido'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HistorialResumen',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dia', models.DateField()),
+                ('accion', models.CharField(max_length=100)),
+                ('cantidad', models.PositiveIntegerField(default=0)),
+                ('cajon', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='resumen_historial', to='cajones_app.cajon')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('cajon', 'dia', 'accion'), name='resumen_cajon_dia_accion_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.4 on 2026-10-18 18:01
+
+from django.db import migrations, models
+
+ACTIVOS = ['pendiente', 'en_proceso']
+
+
+def cerrar_duplicados(apps, schema_editor):
+    """Dejar activo solo el trabajo más reciente de cada criterio"""
+    RecomendacionTrabajo = apps.get_model('cajones_app', 'RecomendacionTrabajo')
+    vistos = set()
+    for trabajo in RecomendacionTrabajo.objects.filter(estado__in=ACTIVOS).order_by('-id'):
+        if trabajo.tipo_ordenamiento in vistos:
+            RecomendacionTrabajo.objects.filter(pk=trabajo.pk).update(
+                estado='error', error='Trabajo duplicado de otro del mismo criterio'
+            )
+        vistos.add(trabajo.tipo_ordenamiento)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cajones_app', '0010_historialresumen'),
+    ]
+
+    operations = [
+        migrations.RunPython(cerrar_duplicados, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='recomendaciontrabajo',
+            constraint=models.UniqueConstraint(condition=models.Q(('estado__in', ['pendiente', 'en_proceso'])), fields=('tipo_ordenamiento',), name='trabajo_activo_por_criterio_uniq'),
+        ),
+    ]
@@ -1,21 +1,33 @@
 from django.db import models
+from django.utils import timezone
 
 # Create your models here.
 
 class Cajon(models.Model):
     nombre = models.CharField(max_length=100)
     capacidad_maxima = models.IntegerField()
-    
+    # Cantidad de objetos contenidos. La mantiene CajonService con UPDATE
+    # condicionales para que verificar la capacidad sea O(1) y atómico.
+    objetos_count = models.PositiveIntegerField(default=0)
+
     def __str__(self):
         return self.nombre + f" (Capacidad: {self.capacidad_maxima})"
     
     
 class CajonHistorial(models.Model):
     cajon = models.ForeignKey(Cajon, on_delete=models.CASCADE, related_name='historial_entries')
-    fecha = models.DateTimeField(auto_now_add=True)
+    # La fecha del cambio; con el historial diferido la entrada se guarda después
+    fecha = models.DateTimeField(default=timezone.now, editable=False)
     accion = models.CharField(max_length=100)  # e.g., 'creado', 'modificado', 'eliminado'
     descripcion = models.TextField(blank=True, null=True)
 
+    class Meta:
+        indexes = [
+            # Historial de un cajón y listado general, del más reciente al más antiguo
+            models.Index(fields=['cajon', '-fecha', '-id'], name='historial_cajon_fecha_idx'),
+            models.Index(fields=['-fecha', '-id'], name='historial_fecha_idx'),
+        ]
+
     def __str__(self):
         return f"{self.cajon.nombre} - {self.accion} en {self.fecha}"
 
@@ -43,6 +55,76 @@ class CajonObjeto(models.Model):
         default=CajonTamanio.PEQUENO
     )
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['cajon', 'tamanio'], name='objeto_cajon_tamanio_idx'),
+            models.Index(fields=['tipo_objeto', 'tamanio'], name='objeto_tipo_tamanio_idx'),
+            # Búsqueda de duplicados por nombre, tipo y tamaño
+            models.Index(fields=['nombre_objeto', 'tipo_objeto', 'tamanio'], name='objeto_nombre_tipo_tamanio_idx'),
+        ]
+
     def __str__(self):
         return f"{self.nombre_objeto} ({self.tipo_objeto.nombre}) en {self.cajon.nombre} - Tamaño: {self.tamanio}"
-    
\ No newline at end of file
+    
+
+class VersionRecurso(models.Model):
+    """
+    Contador de escrituras por tabla. Se incrementa en cada transacción que
+    modifica el recurso y sirve como huella barata del inventario (cache de
+    recomendaciones, ETags y Last-Modified). Ver versiones.py.
+    """
+    recurso = models.CharField(max_length=100, primary_key=True)
+    version = models.BigIntegerField(default=0)
+    fecha_modificacion = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.recurso} v{self.version}"
+
+
+class RecomendacionTrabajo(models.Model):
+    """Generación de recomendaciones ejecutada en segundo plano"""
+    class Estado(models.TextChoices):
+        PENDIENTE = 'pendiente', 'Pendiente'
+        EN_PROCESO = 'en_proceso', 'En proceso'
+        COMPLETADO = 'completado', 'Completado'
+        ERROR = 'error', 'Error'
+
+    tipo_ordenamiento = models.CharField(max_length=20)
+    estado = models.CharField(max_length=20, choices=Estado.choices, default=Estado.PENDIENTE)
+    recomendaciones = models.JSONField(blank=True, null=True)
+    error = models.TextField(blank=True, null=True)
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            # Un solo trabajo activo por criterio, aunque dos requests lo pidan a la vez
+            models.UniqueConstraint(
+                fields=['tipo_ordenamiento'],
+                condition=models.Q(estado__in=['pendiente', 'en_proceso']),
+                name='trabajo_activo_por_criterio_uniq'
+            ),
+        ]
+
+    def __str__(self):
+        return f"Trabajo {self.id} ({self.tipo_ordenamiento}) - {self.estado}"
+
+
+class HistorialResumen(models.Model):
+    """
+    Cantidad diaria de entradas de historial por cajón y acción. Se completa
+    al archivar el historial antiguo (ver retencion.py), de modo que los
+    conteos se conservan aunque las entradas ya no estén en la base.
+    """
+    cajon = models.ForeignKey(Cajon, on_delete=models.CASCADE, related_name='resumen_historial')
+    dia = models.DateField()
+    accion = models.CharField(max_length=100)
+    cantidad = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['cajon', 'dia', 'accion'], name='resumen_cajon_dia_accion_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.cajon_id} - {self.accion} el {self.dia}: {self.cantidad}"
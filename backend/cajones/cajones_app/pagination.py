@@ -0,0 +1,119 @@
+import base64
+import json
+from urllib import parse
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+
+class KeysetPagination(BasePagination):
+    """
+    Paginación por cursor (keyset) para los listados grandes.
+
+    En lugar de usar OFFSET, cada página se obtiene filtrando por la última
+    posición vista según `ordering`, por lo que el costo de una página no
+    depende de cuán profunda sea. El último campo de `ordering` debe ser único
+    (normalmente el id) para que la posición no sea ambigua.
+    """
+    page_size = api_settings.PAGE_SIZE or 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+    cursor_query_param = 'cursor'
+    ordering = ('id',)
+    invalid_cursor_message = 'Cursor inválido'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.model = queryset.model
+
+        posicion = self.decode_cursor(request)
+        if posicion is not None:
+            queryset = queryset.filter(self.filtro_siguiente(posicion))
+
+        # Se pide un elemento extra para saber si existe una página siguiente
+        page = list(queryset.order_by(*self.ordering)[:self.page_size + 1])
+        self.has_next = len(page) > self.page_size
+        page = page[:self.page_size]
+        self.next_position = self.get_position(page[-1]) if self.has_next else None
+        return page
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'page_size': self.page_size,
+            'results': data,
+        })
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        url = self.request.build_absolute_uri()
+        (scheme, netloc, path, query, fragment) = parse.urlsplit(url)
+        query_dict = parse.parse_qs(query, keep_blank_values=True)
+        query_dict[self.cursor_query_param] = [self.encode_cursor(self.next_position)]
+        query = parse.urlencode(sorted(query_dict.items()), doseq=True)
+        return parse.urlunsplit((scheme, netloc, path, query, fragment))
+
+    def get_position(self, item):
+        campos = [campo.lstrip('-') for campo in self.ordering]
+        # Las páginas pueden ser instancias o diccionarios de values()
+        if isinstance(item, dict):
+            return [item[campo] for campo in campos]
+        return [getattr(item, campo) for campo in campos]
+
+    def filtro_siguiente(self, posicion):
+        """
+        Construir el filtro "posterior a la posición" para una clave compuesta:
+        (a > x) OR (a = x AND b > y) OR ..., respetando la dirección de cada campo
+        """
+        filtro = Q()
+        iguales = {}
+        for campo, valor in zip(self.ordering, posicion):
+            nombre = campo.lstrip('-')
+            lookup = 'lt' if campo.startswith('-') else 'gt'
+            filtro |= Q(**iguales, **{f'{nombre}__{lookup}': valor})
+            iguales[nombre] = valor
+        return filtro
+
+    def encode_cursor(self, posicion):
+        valores = [valor.isoformat() if hasattr(valor, 'isoformat') else valor for valor in posicion]
+        return base64.urlsafe_b64encode(json.dumps(valores).encode('ascii')).decode('ascii')
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            valores = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')).decode('ascii'))
+            if not isinstance(valores, list) or len(valores) != len(self.ordering):
+                raise ValueError
+            # Convertir cada valor al tipo Python del campo (p. ej. fechas)
+            return [
+                self.model._meta.get_field(campo.lstrip('-')).to_python(valor)
+                for campo, valor in zip(self.ordering, valores)
+            ]
+        except Exception:
+            raise NotFound(self.invalid_cursor_message)
+
+
+class HistorialPagination(KeysetPagination):
+    """Historial del más reciente al más antiguo, con el id como desempate"""
+    ordering = ('-fecha', '-id')
+
+
+class CajonObjetoPagination(KeysetPagination):
+    """Objetos en orden de creación"""
+    ordering = ('id',)
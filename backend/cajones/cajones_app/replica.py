@@ -0,0 +1,134 @@
+"""
+Lecturas en una réplica de la base de datos.
+
+EnrutadorReplica envía a la réplica (settings.DB_REPLICA) las lecturas de los
+requests GET, HEAD y OPTIONS, así los listados, las estadísticas, el
+ordenamiento y las exportaciones no compiten con las escrituras. Todo lo demás
+usa la primaria: las escrituras, cualquier lectura de un request que modifica
+datos y las lecturas dentro de una transacción. Fuera de un request (comandos,
+hilos de trabajos) se usa la primaria, salvo dentro de `en_replica()`.
+
+Lectura de lo propio: cuando un request escribe, ReplicaMiddleware devuelve la
+cookie `leer_primaria_hasta` y durante DB_REPLICA_PEGAJOSO_SEGUNDOS los GET de
+ese cliente leen de la primaria, hasta que la réplica alcanzó sus cambios.
+
+Para probarlo en local con dos archivos SQLite, `sincronizar()` (comando
+sincronizar_replica) copia la primaria a la réplica con la API de backup.
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DEFAULT_DB_ALIAS, connections
+
+COOKIE = 'leer_primaria_hasta'
+METODOS_LECTURA = {'GET', 'HEAD', 'OPTIONS'}
+
+_en_replica = ContextVar('lecturas_en_replica', default=False)
+# Modelos escritos durante el request actual
+_escrituras = ContextVar('escrituras_del_request', default=None)
+
+
+def alias_replica():
+    alias = getattr(settings, 'DB_REPLICA', None)
+    return alias if alias in connections.settings else None
+
+
+@contextmanager
+def en_replica():
+    """Leer de la réplica fuera de un request (p. ej. un comando que solo lee)"""
+    token = _en_replica.set(True)
+    try:
+        yield
+    finally:
+        _en_replica.reset(token)
+
+
+class EnrutadorReplica:
+    def db_for_read(self, model, **hints):
+        if not _en_replica.get():
+            return None
+        alias = alias_replica()
+        if alias is None or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        return alias
+
+    def db_for_write(self, model, **hints):
+        escrituras = _escrituras.get()
+        if escrituras is not None:
+            escrituras.add(model)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # La réplica tiene los mismos datos que la primaria
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # El esquema de la réplica llega por la replicación
+        return db != alias_replica()
+
+
+class ReplicaMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    @staticmethod
+    def lee_de_replica(request):
+        if request.method not in METODOS_LECTURA:
+            return False
+        try:
+            return float(request.COOKIES.get(COOKIE, 0)) <= time.time()
+        except ValueError:
+            return True
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        escrituras = set()
+        tokens = _en_replica.set(self.lee_de_replica(request)), _escrituras.set(escrituras)
+        try:
+            response = self.get_response(request)
+        finally:
+            _en_replica.reset(tokens[0])
+            _escrituras.reset(tokens[1])
+        return self.marcar(response, escrituras)
+
+    async def __acall__(self, request):
+        escrituras = set()
+        tokens = _en_replica.set(self.lee_de_replica(request)), _escrituras.set(escrituras)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _en_replica.reset(tokens[0])
+            _escrituras.reset(tokens[1])
+        return self.marcar(response, escrituras)
+
+    @staticmethod
+    def marcar(response, escrituras):
+        if escrituras and alias_replica():
+            segundos = getattr(settings, 'DB_REPLICA_PEGAJOSO_SEGUNDOS', 5)
+            response.set_cookie(
+                COOKIE, f'{time.time() + segundos:.3f}', max_age=segundos, httponly=True, samesite='Lax'
+            )
+        return response
+
+
+def sincronizar(alias=None):
+    """Copiar la base primaria a la réplica, ambas SQLite"""
+    alias = alias or alias_replica()
+    if alias is None:
+        raise ImproperlyConfigured('No hay una réplica configurada (SQLITE_REPLICA_PATH)')
+    origen, destino = connections[DEFAULT_DB_ALIAS], connections[alias]
+    if origen.vendor != 'sqlite' or destino.vendor != 'sqlite':
+        raise ImproperlyConfigured('Solo se sincronizan réplicas SQLite; con PostgreSQL usar su replicación')
+    origen.ensure_connection()
+    destino.ensure_connection()
+    origen.connection.backup(destino.connection)
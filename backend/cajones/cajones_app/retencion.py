@@ -0,0 +1,108 @@
+"""
+Retención del historial de los cajones.
+
+Las entradas con más de HISTORIAL_RETENCION_DIAS días se copian a un archivo
+JSONL comprimido con gzip (una línea por entrada, con su id), se suman a
+HistorialResumen por cajón, día y acción y se eliminan de la base. El trabajo
+se hace en lotes y cada lote es una transacción corta, así que el listado y
+las escrituras del resto de la API no quedan bloqueados mientras se archiva.
+
+Cada lote se escribe en el archivo antes de confirmar su borrado: si el
+proceso se interrumpe entre ambos pasos, el lote vuelve a archivarse en la
+próxima ejecución (las líneas repetidas se reconocen por el id), pero nunca
+se pierde.
+"""
+import gzip
+import os
+import time
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.utils.encoders import JSONEncoder
+
+from . import versiones
+from .models import CajonHistorial, HistorialResumen
+
+# Pares (nombre en el archivo, campo o lookup)
+CAMPOS = [
+    ('id', 'id'),
+    ('cajon', 'cajon_id'),
+    ('cajon_nombre', 'cajon__nombre'),
+    ('fecha', 'fecha'),
+    ('accion', 'accion'),
+    ('descripcion', 'descripcion'),
+]
+
+
+def archivar(dias=None, directorio=None, tamanio_lote=1000, pausa=0):
+    """
+    Archivar y eliminar las entradas de historial con más de `dias` días.
+    Devuelve (ruta del archivo creado o None, cantidad de entradas archivadas).
+    """
+    if dias is None:
+        dias = getattr(settings, 'HISTORIAL_RETENCION_DIAS', 180)
+    directorio = directorio or settings.HISTORIAL_ARCHIVO_DIR
+    antiguas = (
+        CajonHistorial.objects.filter(fecha__lt=timezone.now() - timedelta(days=dias))
+        .order_by('fecha', 'id')
+        .values_list(*[lookup for _, lookup in CAMPOS])
+    )
+    if not antiguas.exists():
+        return None, 0
+
+    os.makedirs(directorio, exist_ok=True)
+    ruta = os.path.join(directorio, f'historial-{timezone.now():%Y%m%d-%H%M%S-%f}.jsonl.gz')
+    nombres = [nombre for nombre, _ in CAMPOS]
+    encoder = JSONEncoder(ensure_ascii=False)
+    total = 0
+    # 'x': nunca reemplazar un archivo anterior
+    with gzip.open(ruta, 'xt', encoding='utf-8') as archivo:
+        while True:
+            # Los lotes anteriores ya se eliminaron: siempre se lee desde el principio
+            lote = list(antiguas[:tamanio_lote])
+            if not lote:
+                break
+            archivo.write(''.join(encoder.encode(dict(zip(nombres, fila))) + '\n' for fila in lote))
+            archivo.flush()
+            _resumir_y_eliminar(lote)
+            total += len(lote)
+            if pausa:
+                time.sleep(pausa)
+    return ruta, total
+
+
+def _resumir_y_eliminar(lote):
+    zona = timezone.get_current_timezone()
+    conteos = Counter(
+        (cajon_id, fecha.astimezone(zona).date(), accion)
+        for _, cajon_id, _, fecha, accion, _ in lote
+    )
+    with transaction.atomic():
+        # La transacción empieza escribiendo para que en SQLite espere el
+        # lock de escritura en lugar de fallar con "database is locked"
+        CajonHistorial.objects.filter(id__in=[fila[0] for fila in lote]).delete()
+        existentes = {
+            (cajon_id, dia, accion): cantidad
+            for cajon_id, dia, accion, cantidad in HistorialResumen.objects.filter(
+                cajon_id__in={cajon_id for cajon_id, _, _ in conteos},
+                dia__in={dia for _, dia, _ in conteos}
+            ).values_list('cajon_id', 'dia', 'accion', 'cantidad')
+        }
+        # Un único INSERT ... ON CONFLICT DO UPDATE con los totales ya sumados
+        HistorialResumen.objects.bulk_create(
+            [
+                HistorialResumen(
+                    cajon_id=cajon_id, dia=dia, accion=accion,
+                    cantidad=existentes.get((cajon_id, dia, accion), 0) + cantidad
+                )
+                for (cajon_id, dia, accion), cantidad in conteos.items()
+            ],
+            batch_size=500,
+            update_conflicts=True,
+            unique_fields=['cajon', 'dia', 'accion'],
+            update_fields=['cantidad']
+        )
+        versiones.incrementar(CajonHistorial)
@@ -1,10 +1,17 @@
 from rest_framework import serializers
-from .models import Cajon, CajonHistorial, TipoObjeto, CajonObjeto
+from .models import Cajon, CajonHistorial, TipoObjeto, CajonObjeto, RecomendacionTrabajo
 
 class CajonSerializer(serializers.ModelSerializer):
     class Meta:
         model = Cajon
         fields = '__all__'
+        read_only_fields = ('objetos_count',)
+
+class CajonOcupacionSerializer(CajonSerializer):
+    """Cajón con su ocupación, a partir de CajonService.cajones_con_ocupacion()"""
+    objetos_actuales = serializers.IntegerField(read_only=True)
+    capacidad_disponible = serializers.IntegerField(read_only=True)
+    porcentaje_ocupacion = serializers.FloatField(read_only=True)
 
 class CajonHistorialSerializer(serializers.ModelSerializer):
     class Meta:
@@ -21,3 +28,109 @@ class CajonObjetoSerializer(serializers.ModelSerializer):
         model = CajonObjeto
         fields = '__all__'
 
+
+
+class FilasSerializer:
+    """
+    Serialización rápida para listados grandes.
+
+    Trabaja sobre diccionarios de `values()` en lugar de instancias: el mapeo
+    de campos se arma una sola vez por clase y cada fila se convierte con
+    búsquedas directas, sin la introspección por campo de ModelSerializer.
+    `campos` son pares (nombre de salida, lookup de values()); un nombre con
+    punto ('tipo_objeto.nombre') anida el valor en un objeto, y los lookups con
+    `__` resuelven la relación con un JOIN en la misma consulta.
+    """
+    campos = ()
+    conversiones = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.lookups = tuple(lookup for _, lookup in cls.campos)
+        cls.fila = staticmethod(cls._compilar())
+
+    @classmethod
+    def _compilar(cls):
+        """
+        Armar la función que convierte una fila: los pasos (padres, clave,
+        lookup, conversión) se calculan una sola vez por clase
+        """
+        pasos = []
+        for salida, lookup in cls.campos:
+            *padres, hoja = salida.split('.')
+            pasos.append((tuple(padres), hoja, lookup, cls.conversiones.get(salida)))
+
+        def fila(valores):
+            resultado = {}
+            for padres, hoja, lookup, convertir in pasos:
+                destino = resultado
+                for padre in padres:
+                    destino = destino.setdefault(padre, {})
+                valor = valores[lookup]
+                destino[hoja] = convertir(valor) if convertir else valor
+            return resultado
+
+        return fila
+
+    def __init__(self, filas, many=True):
+        self.filas = filas
+
+    @classmethod
+    def preparar(cls, queryset):
+        """Reducir el queryset a los valores que necesita la serialización"""
+        return queryset.values(*cls.lookups)
+
+    @property
+    def data(self):
+        return list(map(self.fila, self.filas))
+
+
+class CajonObjetoFilasSerializer(FilasSerializer):
+    """Mismos campos que CajonObjetoSerializer, con el tipo como {id, nombre}"""
+    campos = (
+        ('id', 'id'),
+        ('nombre_objeto', 'nombre_objeto'),
+        ('tamanio', 'tamanio'),
+        ('cajon', 'cajon'),
+        ('tipo_objeto.id', 'tipo_objeto'),
+        ('tipo_objeto.nombre', 'tipo_objeto__nombre'),
+    )
+
+
+class CajonHistorialFilasSerializer(FilasSerializer):
+    """Mismos campos y formato que CajonHistorialSerializer"""
+    campos = (
+        ('id', 'id'),
+        ('fecha', 'fecha'),
+        ('accion', 'accion'),
+        ('descripcion', 'descripcion'),
+        ('cajon', 'cajon'),
+    )
+    conversiones = {'fecha': serializers.DateTimeField().to_representation}
+
+
+class CajonObjetoLoteSerializer(serializers.Serializer):
+    """
+    Validación de cada elemento de una carga masiva. Las relaciones se reciben
+    como ids y se verifican en bloque en CajonService para no consultar la
+    base de datos por cada elemento.
+    """
+    cajon = serializers.IntegerField()
+    nombre_objeto = serializers.CharField(max_length=100)
+    tipo_objeto = serializers.IntegerField()
+    tamanio = serializers.ChoiceField(
+        choices=CajonObjeto.CajonTamanio.choices,
+        default=CajonObjeto.CajonTamanio.PEQUENO
+    )
+
+
+class MovimientoSerializer(serializers.Serializer):
+    """Un paso de un plan de movimientos: el objeto y su cajón destino (ids)"""
+    objeto = serializers.IntegerField()
+    cajon = serializers.IntegerField()
+
+
+class RecomendacionTrabajoSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = RecomendacionTrabajo
+        fields = '__all__'
@@ -1,7 +1,20 @@
+import heapq
 import os
+import re
+import unicodedata
+from itertools import groupby
+from operator import itemgetter
+from types import SimpleNamespace
+
 import google.generativeai as genai
-from django.db import transaction
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections, router, transaction
+from django.db.models import Case, Count, F, FloatField, OuterRef, Q, Subquery, Value, When, Window
+from django.db.models.functions import Coalesce, RowNumber
 from django.core.exceptions import ValidationError
+from . import bitacora, versiones
 from .models import Cajon, CajonObjeto, CajonHistorial, TipoObjeto
 
 
@@ -26,7 +39,7 @@ class CajonService:
             )
             
             # Crear entrada en el historial
-            CajonHistorial.objects.create(
+            bitacora.registrar(
                 cajon=cajon,
                 accion='creado',
                 descripcion=f'Cajón "{cajon.nombre}" creado con capacidad {cajon.capacidad_maxima}'
@@ -34,6 +47,63 @@ class CajonService:
             
             return cajon
     
+    @staticmethod
+    def reservar_espacio(cajon_id, cantidad=1):
+        """
+        Incrementar objetos_count solo si el cajón tiene espacio para `cantidad`
+        objetos más. La verificación y el incremento son un único UPDATE
+        condicional, por lo que es correcto aunque haya escrituras concurrentes.
+        Devuelve True si se reservó el espacio.
+        """
+        reservado = CajonService._reservar_sin_versionar(cajon_id, cantidad)
+        if reservado:
+            versiones.incrementar(Cajon)
+        return reservado
+    
+    @staticmethod
+    def _reservar_sin_versionar(cajon_id, cantidad):
+        actualizados = Cajon.objects.filter(
+            pk=cajon_id,
+            objetos_count__lte=F('capacidad_maxima') - cantidad
+        ).update(objetos_count=F('objetos_count') + cantidad)
+        return actualizados == 1
+    
+    @staticmethod
+    def liberar_espacio(cajon_id, cantidad=1):
+        """Descontar objetos que salen de un cajón"""
+        Cajon.objects.filter(pk=cajon_id).update(objetos_count=F('objetos_count') - cantidad)
+        versiones.incrementar(Cajon)
+    
+    @staticmethod
+    def recalcular_ocupacion(cajon_ids):
+        """Recalcular objetos_count desde la tabla de objetos (p. ej. tras borrados en cascada)"""
+        conteo = (
+            CajonObjeto.objects.filter(cajon=OuterRef('pk'))
+            .values('cajon')
+            .annotate(total=Count('id'))
+            .values('total')
+        )
+        Cajon.objects.filter(pk__in=cajon_ids).update(
+            objetos_count=Coalesce(Subquery(conteo), 0)
+        )
+        versiones.incrementar(Cajon)
+    
+    @staticmethod
+    def cajones_con_ocupacion():
+        """
+        Cajones con los mismos datos de ocupación que /capacidad/, calculados
+        en la misma consulta a partir de objetos_count (sin JOIN ni COUNT)
+        """
+        return Cajon.objects.annotate(
+            objetos_actuales=F('objetos_count'),
+            capacidad_disponible=F('capacidad_maxima') - F('objetos_count'),
+            porcentaje_ocupacion=Case(
+                When(capacidad_maxima__gt=0, then=F('objetos_count') * Value(100.0) / F('capacidad_maxima')),
+                default=Value(0.0),
+                output_field=FloatField()
+            )
+        )
+    
     @staticmethod
     def agregar_objeto_a_cajon(cajon_id, nombre_objeto, tipo_objeto_id, tamanio):
         """Agregar un objeto a un cajón con validaciones de capacidad"""
@@ -42,14 +112,13 @@ class CajonService:
         except Cajon.DoesNotExist:
             raise ValidationError("El cajón especificado no existe")
         
-        # Verificar capacidad
-        objetos_count = cajon.objetos.count()
-        if objetos_count >= cajon.capacidad_maxima:
-            raise ValidationError(
-                f"El cajón '{cajon.nombre}' está lleno. Capacidad máxima: {cajon.capacidad_maxima}"
-            )
-        
         with transaction.atomic():
+            # Verificar capacidad y reservar el lugar en la misma operación
+            if not CajonService.reservar_espacio(cajon.id):
+                raise ValidationError(
+                    f"El cajón '{cajon.nombre}' está lleno. Capacidad máxima: {cajon.capacidad_maxima}"
+                )
+            
             objeto = CajonObjeto.objects.create(
                 cajon=cajon,
                 nombre_objeto=nombre_objeto,
@@ -58,7 +127,7 @@ class CajonService:
             )
             
             # Crear entrada en el historial
-            CajonHistorial.objects.create(
+            bitacora.registrar(
                 cajon=cajon,
                 accion='objeto_agregado',
                 descripcion=f'Objeto "{objeto.nombre_objeto}" agregado al cajón'
@@ -67,35 +136,116 @@ class CajonService:
             return objeto
     
     @staticmethod
-    def mover_objeto(objeto_id, nuevo_cajon_id):
-        """Mover un objeto de un cajón a otro"""
-        try:
-            objeto = CajonObjeto.objects.get(id=objeto_id)
-            nuevo_cajon = Cajon.objects.get(id=nuevo_cajon_id)
-        except (CajonObjeto.DoesNotExist, Cajon.DoesNotExist):
-            raise ValidationError("El objeto o cajón especificado no existe")
-        
-        # Verificar capacidad del nuevo cajón
-        objetos_count = nuevo_cajon.objetos.count()
-        if objetos_count >= nuevo_cajon.capacidad_maxima:
-            raise ValidationError(
-                f"El cajón destino '{nuevo_cajon.nombre}' está lleno"
-            )
+    def agregar_objetos_en_lote(items):
+        """
+        Agregar muchos objetos, posiblemente en distintos cajones, en una sola
+        transacción. `items` es una lista de pares (indice, datos) donde datos
+        tiene cajon, nombre_objeto, tipo_objeto (ids) y tamanio.
         
-        cajon_anterior = objeto.cajon
+        Los objetos que no caben o referencian cajones/tipos inexistentes no se
+        insertan; se devuelven como errores por índice. Devuelve
+        (creados, errores): creados es una lista de pares (indice, objeto) y
+        errores un dict {indice: mensaje}.
+        """
+        errores = {}
+        cajon_ids = {datos['cajon'] for _, datos in items}
+        tipo_ids = {datos['tipo_objeto'] for _, datos in items}
         
         with transaction.atomic():
+            # Capacidad de todos los cajones involucrados en una sola consulta
+            cajones = {
+                cajon.id: cajon
+                for cajon in Cajon.objects.select_for_update().filter(pk__in=cajon_ids)
+            }
+            tipos_existentes = set(TipoObjeto.objects.filter(pk__in=tipo_ids).values_list('id', flat=True))
+            
+            disponibles = {
+                cajon.id: cajon.capacidad_maxima - cajon.objetos_count for cajon in cajones.values()
+            }
+            aceptados_por_cajon = {}
+            for indice, datos in items:
+                cajon = cajones.get(datos['cajon'])
+                if cajon is None:
+                    errores[indice] = "El cajón especificado no existe"
+                elif datos['tipo_objeto'] not in tipos_existentes:
+                    errores[indice] = "El tipo de objeto especificado no existe"
+                elif disponibles[cajon.id] <= 0:
+                    errores[indice] = (
+                        f"El cajón '{cajon.nombre}' está lleno. Capacidad máxima: {cajon.capacidad_maxima}"
+                    )
+                else:
+                    disponibles[cajon.id] -= 1
+                    aceptados_por_cajon.setdefault(cajon.id, []).append((indice, datos))
+            
+            # Reservar el espacio con un UPDATE condicional por cajón, no por objeto
+            for cajon_id, aceptados in list(aceptados_por_cajon.items()):
+                if not CajonService._reservar_sin_versionar(cajon_id, len(aceptados)):
+                    cajon = cajones[cajon_id]
+                    for indice, _ in aceptados:
+                        errores[indice] = f"El cajón '{cajon.nombre}' está lleno"
+                    del aceptados_por_cajon[cajon_id]
+            
+            creados = sorted(
+                (
+                    (indice, CajonObjeto(
+                        cajon_id=cajon_id,
+                        nombre_objeto=datos['nombre_objeto'],
+                        tipo_objeto_id=datos['tipo_objeto'],
+                        tamanio=datos['tamanio']
+                    ))
+                    for cajon_id, aceptados in aceptados_por_cajon.items()
+                    for indice, datos in aceptados
+                ),
+                key=lambda par: par[0]
+            )
+            CajonObjeto.objects.bulk_create([objeto for _, objeto in creados], batch_size=500)
+            if creados:
+                versiones.incrementar(Cajon, CajonObjeto, CajonHistorial)
+            
+            # Crear las entradas en el historial
+            bitacora.registrar_lote([
+                CajonHistorial(
+                    cajon_id=objeto.cajon_id,
+                    accion='objeto_agregado',
+                    descripcion=f'Objeto "{objeto.nombre_objeto}" agregado al cajón'
+                )
+                for _, objeto in creados
+            ])
+        
+        return creados, errores
+    
+    @staticmethod
+    def mover_objeto(objeto_id, nuevo_cajon_id):
+        """Mover un objeto de un cajón a otro"""
+        with transaction.atomic():
+            try:
+                objeto = CajonObjeto.objects.select_for_update().get(id=objeto_id)
+                nuevo_cajon = Cajon.objects.get(id=nuevo_cajon_id)
+            except (CajonObjeto.DoesNotExist, Cajon.DoesNotExist):
+                raise ValidationError("El objeto o cajón especificado no existe")
+            
+            cajon_anterior = objeto.cajon
+            if cajon_anterior.id == nuevo_cajon.id:
+                return objeto
+            
+            # Verificar capacidad del nuevo cajón
+            if not CajonService.reservar_espacio(nuevo_cajon.id):
+                raise ValidationError(
+                    f"El cajón destino '{nuevo_cajon.nombre}' está lleno"
+                )
+            CajonService.liberar_espacio(cajon_anterior.id)
+            
             objeto.cajon = nuevo_cajon
-            objeto.save()
+            objeto.save(update_fields=['cajon'])
             
             # Crear entradas en el historial
-            CajonHistorial.objects.create(
+            bitacora.registrar(
                 cajon=cajon_anterior,
                 accion='objeto_movido',
                 descripcion=f'Objeto "{objeto.nombre_objeto}" movido fuera del cajón'
             )
             
-            CajonHistorial.objects.create(
+            bitacora.registrar(
                 cajon=nuevo_cajon,
                 accion='objeto_recibido',
                 descripcion=f'Objeto "{objeto.nombre_objeto}" movido al cajón'
@@ -104,148 +254,753 @@ class CajonService:
             return objeto
     
     @staticmethod
-    def obtener_estadisticas_cajon(cajon_id):
-        """Obtener estadísticas detalladas de un cajón"""
-        try:
-            cajon = Cajon.objects.get(id=cajon_id)
-        except Cajon.DoesNotExist:
-            raise ValidationError("El cajón especificado no existe")
-        
-        objetos = cajon.objetos.all()
-        objetos_count = objetos.count()
-        capacidad_disponible = cajon.capacidad_maxima - objetos_count
+    def aplicar_deltas_ocupacion(deltas, tamanio_lote=200):
+        """
+        Aplicar cambios de ocupación {cajon_id: delta} a varios cajones con
+        UPDATE condicionales agrupados: los cajones que reciben objetos solo se
+        actualizan si el resultado no supera su capacidad. Devuelve False si
+        algún cajón no pudo actualizarse; en ese caso la transacción que llama
+        debe revertirse.
+        """
+        items = [(cajon_id, delta) for cajon_id, delta in deltas.items() if delta]
+        if items:
+            versiones.incrementar(Cajon)
+        for inicio in range(0, len(items), tamanio_lote):
+            lote = items[inicio:inicio + tamanio_lote]
+            condicion = Q()
+            for cajon_id, delta in lote:
+                if delta > 0:
+                    condicion |= Q(pk=cajon_id, objetos_count__lte=F('capacidad_maxima') - delta)
+                else:
+                    condicion |= Q(pk=cajon_id)
+            actualizados = Cajon.objects.filter(condicion).update(
+                objetos_count=F('objetos_count') + Case(
+                    *[When(pk=cajon_id, then=Value(delta)) for cajon_id, delta in lote],
+                    default=Value(0)
+                )
+            )
+            if actualizados != len(lote):
+                return False
+        return True
+    
+    @staticmethod
+    def mover_objetos_en_lote(movimientos):
+        """
+        Aplicar un plan de movimientos [(objeto_id, nuevo_cajon_id), ...] de
+        forma atómica. La capacidad final de cada cajón destino se verifica
+        antes de mover nada; si algún movimiento no es válido no se aplica
+        ninguno. Devuelve la cantidad de objetos movidos.
+        """
+        destinos = {}
+        for objeto_id, nuevo_cajon_id in movimientos:
+            if objeto_id in destinos:
+                raise ValidationError(f"El objeto {objeto_id} aparece más de una vez en el plan")
+            destinos[objeto_id] = nuevo_cajon_id
         
-        # Estadísticas por tamaño
-        tamanios = {}
-        for tamanio_choice in CajonObjeto.choices:
-            tamanios[tamanio_choice[1]] = objetos.filter(tamanio=tamanio_choice[0]).count()
+        with transaction.atomic():
+            objetos = list(
+                CajonObjeto.objects.select_for_update()
+                .filter(pk__in=destinos.keys())
+                .only('id', 'cajon_id', 'nombre_objeto')
+            )
+            faltantes = destinos.keys() - {objeto.id for objeto in objetos}
+            if faltantes:
+                raise ValidationError(
+                    f"Los objetos especificados no existen: {', '.join(map(str, sorted(faltantes)))}"
+                )
+            
+            cajon_ids = set(destinos.values()) | {objeto.cajon_id for objeto in objetos}
+            cajones = Cajon.objects.in_bulk(cajon_ids)
+            faltantes = cajon_ids - cajones.keys()
+            if faltantes:
+                raise ValidationError(
+                    f"Los cajones especificados no existen: {', '.join(map(str, sorted(faltantes)))}"
+                )
+            
+            # Cambio neto de ocupación de cada cajón según el plan completo
+            movidos = []
+            deltas = {}
+            for objeto in objetos:
+                origen_id, destino_id = objeto.cajon_id, destinos[objeto.id]
+                if origen_id == destino_id:
+                    continue
+                deltas[origen_id] = deltas.get(origen_id, 0) - 1
+                deltas[destino_id] = deltas.get(destino_id, 0) + 1
+                movidos.append((objeto, origen_id))
+            
+            # Verificar la capacidad final de todos los destinos antes de mover
+            excedidos = [
+                cajones[cajon_id] for cajon_id, delta in sorted(deltas.items())
+                if delta > 0 and cajones[cajon_id].objetos_count + delta > cajones[cajon_id].capacidad_maxima
+            ]
+            if excedidos:
+                nombres = ', '.join(f"'{cajon.nombre}'" for cajon in excedidos)
+                raise ValidationError(f"El plan excede la capacidad de los cajones: {nombres}")
+            if not CajonService.aplicar_deltas_ocupacion(deltas):
+                raise ValidationError(
+                    "La ocupación de los cajones cambió mientras se aplicaba el plan, intente nuevamente"
+                )
+            
+            for objeto, _ in movidos:
+                objeto.cajon_id = destinos[objeto.id]
+            CajonObjeto.objects.bulk_update([objeto for objeto, _ in movidos], ['cajon'], batch_size=500)
+            versiones.incrementar(CajonObjeto, CajonHistorial)
+            
+            # Crear entradas en el historial
+            historial = []
+            for objeto, origen_id in movidos:
+                historial.append(CajonHistorial(
+                    cajon_id=origen_id,
+                    accion='objeto_movido',
+                    descripcion=f'Objeto "{objeto.nombre_objeto}" movido fuera del cajón'
+                ))
+                historial.append(CajonHistorial(
+                    cajon_id=objeto.cajon_id,
+                    accion='objeto_recibido',
+                    descripcion=f'Objeto "{objeto.nombre_objeto}" movido al cajón'
+                ))
+            bitacora.registrar_lote(historial)
         
-        # Estadísticas por tipo
-        tipos = {}
-        for objeto in objetos:
-            tipo_nombre = objeto.tipo_objeto.nombre
-            if tipo_nombre not in tipos:
-                tipos[tipo_nombre] = 0
-            tipos[tipo_nombre] += 1
+        return len(movidos)
+    
+    @staticmethod
+    def eliminar_objeto(objeto):
+        """
+        Eliminar un objeto liberando su lugar en el cajón. Devuelve False si
+        el objeto ya no existe.
+        """
+        with transaction.atomic():
+            # El cajón se toma de la fila bloqueada: `objeto` pudo leerse antes
+            # de que otro request lo moviera
+            try:
+                objeto = CajonObjeto.objects.select_for_update().get(pk=objeto.pk)
+            except CajonObjeto.DoesNotExist:
+                return False
+            # Crear entrada en el historial antes de eliminar
+            bitacora.registrar(
+                cajon_id=objeto.cajon_id,
+                accion='objeto_eliminado',
+                descripcion=f'Objeto "{objeto.nombre_objeto}" eliminado del cajón'
+            )
+            CajonObjeto.objects.filter(pk=objeto.pk).delete()
+            versiones.incrementar(CajonObjeto)
+            CajonService.liberar_espacio(objeto.cajon_id)
+        return True
+    
+    @staticmethod
+    def _agrupar_estadisticas(cajon_ids=None):
+        """
+        Contar objetos por (cajón, tamaño, tipo) en una sola consulta agrupada.
+        Devuelve {cajon_id: {'por_tamanio': {...}, 'por_tipo': {...}, 'total': n}}
+        """
+        objetos = CajonObjeto.objects.all()
+        if cajon_ids is not None:
+            objetos = objetos.filter(cajon_id__in=cajon_ids)
+        filas = (
+            objetos.values_list('cajon_id', 'tamanio', 'tipo_objeto__nombre')
+            .annotate(total=Count('id'))
+            .order_by()
+        )
         
+        nombres_tamanio = dict(CajonObjeto.CajonTamanio.choices)
+        estadisticas = {}
+        for cajon_id, tamanio, tipo_nombre, total in filas:
+            datos = estadisticas.setdefault(cajon_id, {
+                'por_tamanio': {nombre: 0 for nombre in nombres_tamanio.values()},
+                'por_tipo': {},
+                'total': 0
+            })
+            datos['por_tamanio'][nombres_tamanio.get(tamanio, tamanio)] += total
+            datos['por_tipo'][tipo_nombre] = datos['por_tipo'].get(tipo_nombre, 0) + total
+            datos['total'] += total
+        return estadisticas
+    
+    @staticmethod
+    def _estadisticas_de_cajon(cajon, datos):
+        nombres_tamanio = CajonObjeto.CajonTamanio.labels
+        objetos_count = datos['total'] if datos else 0
         return {
             'cajon': {
                 'id': cajon.id,
                 'nombre': cajon.nombre,
                 'capacidad_maxima': cajon.capacidad_maxima,
                 'objetos_actuales': objetos_count,
-                'capacidad_disponible': capacidad_disponible,
-                'porcentaje_ocupacion': (objetos_count / cajon.capacidad_maxima) * 100
+                'capacidad_disponible': cajon.capacidad_maxima - objetos_count,
+                'porcentaje_ocupacion': (
+                    (objetos_count / cajon.capacidad_maxima) * 100 if cajon.capacidad_maxima > 0 else 0
+                )
             },
-            'estadisticas_por_tamanio': tamanios,
-            'estadisticas_por_tipo': tipos
+            'estadisticas_por_tamanio': datos['por_tamanio'] if datos else {nombre: 0 for nombre in nombres_tamanio},
+            'estadisticas_por_tipo': dict(sorted(datos['por_tipo'].items())) if datos else {}
+        }
+    
+    @staticmethod
+    def obtener_estadisticas_cajon(cajon_id):
+        """Obtener estadísticas detalladas de un cajón"""
+        try:
+            cajon = Cajon.objects.get(id=cajon_id)
+        except Cajon.DoesNotExist:
+            raise ValidationError("El cajón especificado no existe")
+        
+        datos = CajonService._agrupar_estadisticas([cajon.id]).get(cajon.id)
+        return CajonService._estadisticas_de_cajon(cajon, datos)
+    
+    @staticmethod
+    def obtener_estadisticas_generales():
+        """
+        Obtener las estadísticas de todos los cajones y los totales del sistema.
+        Usa dos consultas sin importar cuántos cajones, objetos o tipos haya.
+        """
+        estadisticas = CajonService._agrupar_estadisticas()
+        cajones = [
+            CajonService._estadisticas_de_cajon(cajon, estadisticas.get(cajon.id))
+            for cajon in Cajon.objects.order_by('id')
+        ]
+        
+        por_tamanio = {nombre: 0 for nombre in CajonObjeto.CajonTamanio.labels}
+        por_tipo = {}
+        for datos in estadisticas.values():
+            for nombre, total in datos['por_tamanio'].items():
+                por_tamanio[nombre] += total
+            for nombre, total in datos['por_tipo'].items():
+                por_tipo[nombre] = por_tipo.get(nombre, 0) + total
+        
+        capacidad_total = sum(item['cajon']['capacidad_maxima'] for item in cajones)
+        objetos_total = sum(item['cajon']['objetos_actuales'] for item in cajones)
+        return {
+            'cajones': cajones,
+            'totales': {
+                'cajones': len(cajones),
+                'capacidad_maxima': capacidad_total,
+                'objetos_actuales': objetos_total,
+                'capacidad_disponible': capacidad_total - objetos_total,
+                'porcentaje_ocupacion': (objetos_total / capacidad_total) * 100 if capacidad_total > 0 else 0,
+                'estadisticas_por_tamanio': por_tamanio,
+                'estadisticas_por_tipo': dict(sorted(por_tipo.items()))
+            }
         }
 
 
 class OrdenamientoService:
     """
     Servicio para manejar la lógica de ordenamiento de objetos en cajones
+    
+    El orden se resuelve en SQL y los objetos se agrupan recorriendo un
+    iterador, así que la memoria usada no depende del tamaño del inventario.
+    Cada método devuelve un generador de grupos cuyo 'objetos' también es un
+    iterador: hay que consumir los objetos de un grupo antes de pasar al
+    siguiente. `limite` acota la cantidad de objetos por grupo ('cantidad'
+    sigue siendo el total del grupo).
     """
+    CAMPOS_OBJETO = ('id', 'nombre_objeto', 'tamanio', 'cajon', 'tipo_objeto')
+    TAMANIOS = CajonObjeto.CajonTamanio
+    RANGO_TAMANIO = Case(
+        When(tamanio=TAMANIOS.PEQUENO, then=Value(0)),
+        When(tamanio=TAMANIOS.MEDIANO, then=Value(1)),
+        When(tamanio=TAMANIOS.GRANDE, then=Value(2)),
+        default=Value(3)
+    )
     
     @staticmethod
-    def ordenar_por_tipo(cajon_id=None):
+    def _agrupar(cajon_id, claves, orden, limite=None, chunk_size=2000):
+        """
+        Recorrer los objetos ordenados por `orden` y agruparlos por `claves`.
+        Devuelve pares (clave, cantidad, objetos) en el orden de la consulta.
+        """
+        objetos = CajonObjeto.objects.all()
+        if cajon_id:
+            objetos = objetos.filter(cajon_id=cajon_id)
+        
+        # Los totales de cada grupo salen de una consulta agrupada para poder
+        # escribirlos antes de los objetos
+        cantidades = {
+            tuple(fila[:-1]): fila[-1]
+            for fila in objetos.values_list(*claves).annotate(cantidad=Count('id')).order_by()
+        }
+        
+        objetos = objetos.annotate(rango_tamanio=OrdenamientoService.RANGO_TAMANIO)
+        if limite:
+            objetos = objetos.annotate(
+                posicion=Window(RowNumber(), partition_by=[F(clave) for clave in claves], order_by=F('id').asc())
+            ).filter(posicion__lte=limite)
+        filas = objetos.order_by(*orden, 'id').values_list(*claves, *OrdenamientoService.CAMPOS_OBJETO)
+        
+        n = len(claves)
+        campos = OrdenamientoService.CAMPOS_OBJETO
+        for clave, grupo in groupby(filas.iterator(chunk_size=chunk_size), key=lambda fila: fila[:n]):
+            yield clave, cantidades[clave], (dict(zip(campos, fila[n:])) for fila in grupo)
+    
+    @staticmethod
+    def ordenar_por_tipo(cajon_id=None, limite=None):
         """
         Ordenar objetos por tipo de objeto
         Si se especifica cajon_id, ordena solo los objetos de ese cajón
         """
-        if cajon_id:
-            objetos = CajonObjeto.objects.filter(cajon_id=cajon_id).select_related('tipo_objeto', 'cajon')
-        else:
-            objetos = CajonObjeto.objects.all().select_related('tipo_objeto', 'cajon')
-        
-        # Agrupar por tipo de objeto
-        objetos_por_tipo = {}
-        for objeto in objetos:
-            tipo_nombre = objeto.tipo_objeto.nombre
-            if tipo_nombre not in objetos_por_tipo:
-                objetos_por_tipo[tipo_nombre] = []
-            objetos_por_tipo[tipo_nombre].append(objeto)
-        
-        # Crear resultado ordenado
-        resultado = []
-        for tipo_nombre, objetos_list in sorted(objetos_por_tipo.items()):
-            resultado.append({
+        grupos = OrdenamientoService._agrupar(
+            cajon_id, ('tipo_objeto__nombre',), ('tipo_objeto__nombre',), limite
+        )
+        for (tipo_nombre,), cantidad, objetos in grupos:
+            yield {
                 'tipo': tipo_nombre,
-                'cantidad': len(objetos_list),
-                'objetos': objetos_list
-            })
-        
-        return resultado
+                'cantidad': cantidad,
+                'objetos': objetos
+            }
     
     @staticmethod
-    def ordenar_por_tamanio(cajon_id=None):
+    def ordenar_por_tamanio(cajon_id=None, limite=None):
         """
-        Ordenar objetos por tamaño
+        Ordenar objetos por tamaño (Pequeño, Mediano, Grande)
         Si se especifica cajon_id, ordena solo los objetos de ese cajón
         """
-        if cajon_id:
-            objetos = CajonObjeto.objects.filter(cajon_id=cajon_id).select_related('tipo_objeto', 'cajon')
-        else:
-            objetos = CajonObjeto.objects.all().select_related('tipo_objeto', 'cajon')
-        
-        # Agrupar por tamaño
-        objetos_por_tamanio = {}
-        for objeto in objetos:
-            tamanio_display = objeto.get_tamanio_display()
-            if tamanio_display not in objetos_por_tamanio:
-                objetos_por_tamanio[tamanio_display] = []
-            objetos_por_tamanio[tamanio_display].append(objeto)
-        
-        # Ordenar por tamaño (Pequeño, Mediano, Grande)
-        orden_tamanios = ['Pequeño', 'Mediano', 'Grande']
-        resultado = []
-        for tamanio in orden_tamanios:
-            if tamanio in objetos_por_tamanio:
-                resultado.append({
-                    'tamanio': tamanio,
-                    'cantidad': len(objetos_por_tamanio[tamanio]),
-                    'objetos': objetos_por_tamanio[tamanio]
-                })
-        
-        return resultado
+        nombres = dict(CajonObjeto.CajonTamanio.choices)
+        grupos = OrdenamientoService._agrupar(cajon_id, ('tamanio',), ('rango_tamanio',), limite)
+        for (tamanio,), cantidad, objetos in grupos:
+            yield {
+                'tamanio': nombres.get(tamanio, tamanio),
+                'cantidad': cantidad,
+                'objetos': objetos
+            }
     
     @staticmethod
-    def ordenar_mixto(cajon_id=None):
+    def ordenar_mixto(cajon_id=None, limite=None):
         """
         Ordenar objetos combinando tipo y tamaño para optimizar espacio
         Si se especifica cajon_id, ordena solo los objetos de ese cajón
         """
-        if cajon_id:
-            objetos = CajonObjeto.objects.filter(cajon_id=cajon_id).select_related('tipo_objeto', 'cajon')
+        nombres = dict(CajonObjeto.CajonTamanio.choices)
+        grupos = OrdenamientoService._agrupar(
+            cajon_id, ('tipo_objeto__nombre', 'tamanio'), ('tipo_objeto__nombre', 'rango_tamanio'), limite
+        )
+        for (tipo_nombre, tamanio), cantidad, objetos in grupos:
+            yield {
+                'tipo': tipo_nombre,
+                'tamanio': nombres.get(tamanio, tamanio),
+                'cantidad': cantidad,
+                'objetos': objetos
+            }
+
+
+class BusquedaService:
+    """
+    Búsqueda de objetos por su nombre y por el nombre y la descripción de su
+    tipo. En SQLite usa el índice FTS5 cajones_app_busqueda (ver la migración
+    0008), con coincidencia por prefijo.
+    
+    Calcular la relevancia (bm25) cuesta en proporción a la cantidad de
+    coincidencias, así que solo se ordena por relevancia cuando hay pocas
+    (hasta `max_candidatos`). Las búsquedas muy amplias devuelven primero los
+    objetos cuyo nombre coincide y después el resto, de los más nuevos a los
+    más viejos, sin recorrer todas las coincidencias. Con `cajon_id` se
+    consideran solo las coincidencias de ese cajón, con el mismo orden.
+    """
+    # Peso de cada columna del índice en la relevancia
+    PESOS = (10.0, 5.0, 1.0)
+    max_candidatos = 2000
+    
+    @staticmethod
+    def terminos(texto):
+        return re.findall(r'\w+', texto or '')
+    
+    @classmethod
+    def buscar(cls, texto, limite=20, cajon_id=None):
+        """Objetos que contienen todos los términos (como prefijo), los más relevantes primero"""
+        terminos = cls.terminos(texto)
+        if not terminos:
+            raise ValidationError("Debe indicar al menos una palabra para buscar")
+        # La misma base que usan las consultas del ORM (la réplica en los GET)
+        conexion = connections[router.db_for_read(CajonObjeto)]
+        if conexion.vendor != 'sqlite':
+            return cls._buscar_sin_indice(terminos, limite, cajon_id)
+        
+        consulta = ' '.join(f'"{termino}"*' for termino in terminos)
+        with conexion.cursor() as cursor:
+            # Sondeo barato: el índice devuelve los rowid en orden sin calcular relevancia
+            candidatos = cls._coincidencias(cursor, consulta, cls.max_candidatos + 1, cajon_id)
+            if len(candidatos) <= cls.max_candidatos:
+                ids = cls._coincidencias(cursor, consulta, limite, cajon_id, por_relevancia=True)
+            else:
+                ids = cls._coincidencias(cursor, '{nombre_objeto} : (' + consulta + ')', limite, cajon_id)
+                vistos = set(ids)
+                ids.extend(objeto_id for objeto_id in candidatos if objeto_id not in vistos)
+                ids = ids[:limite]
+        
+        detalles = {
+            fila[0]: fila
+            for fila in CajonObjeto.objects.filter(id__in=ids).values_list(
+                'id', 'nombre_objeto', 'tamanio', 'cajon_id', 'cajon__nombre', 'tipo_objeto_id', 'tipo_objeto__nombre'
+            )
+        }
+        return [cls._resultado(*detalles[objeto_id]) for objeto_id in ids if objeto_id in detalles]
+    
+    @classmethod
+    def _coincidencias(cls, cursor, consulta, limite, cajon_id=None, por_relevancia=False):
+        """Ids de los objetos que coinciden, por relevancia o de los más nuevos a los más viejos"""
+        if por_relevancia:
+            orden, pesos = 'bm25(cajones_app_busqueda, %s, %s, %s)', list(cls.PESOS)
         else:
-            objetos = CajonObjeto.objects.all().select_related('tipo_objeto', 'cajon')
-        
-        # Agrupar por tipo y tamaño
-        objetos_por_tipo_tamanio = {}
-        for objeto in objetos:
-            tipo_nombre = objeto.tipo_objeto.nombre
-            tamanio_display = objeto.get_tamanio_display()
-            clave = f"{tipo_nombre}_{tamanio_display}"
+            orden, pesos = 'rowid DESC', []
+        filtro, parametros = '', []
+        if cajon_id:
+            # Los objetos del cajón salen del índice de cajon_id
+            filtro = f' AND rowid IN (SELECT id FROM {CajonObjeto._meta.db_table} WHERE cajon_id = %s)'
+            parametros = [cajon_id]
+        cursor.execute(
+            'SELECT rowid FROM cajones_app_busqueda WHERE cajones_app_busqueda MATCH %s'
+            f'{filtro} ORDER BY {orden} LIMIT %s',
+            [consulta, *parametros, *pesos, limite]
+        )
+        return [fila[0] for fila in cursor.fetchall()]
+    
+    @staticmethod
+    def _buscar_sin_indice(terminos, limite, cajon_id):
+        """
+        Búsqueda por subcadena, sin índice de texto completo, para otros
+        motores. Todos los términos, los más nuevos primero.
+        """
+        objetos = CajonObjeto.objects.all()
+        if cajon_id:
+            objetos = objetos.filter(cajon_id=cajon_id)
+        for termino in terminos:
+            objetos = objetos.filter(
+                Q(nombre_objeto__icontains=termino)
+                | Q(tipo_objeto__nombre__icontains=termino)
+                | Q(tipo_objeto__descripcion__icontains=termino)
+            )
+        filas = objetos.order_by('-id').values_list(
+            'id', 'nombre_objeto', 'tamanio', 'cajon_id', 'cajon__nombre', 'tipo_objeto_id', 'tipo_objeto__nombre'
+        )[:limite]
+        return [BusquedaService._resultado(*fila) for fila in filas]
+    
+    @staticmethod
+    def _resultado(objeto_id, nombre_objeto, tamanio, cajon_id, cajon_nombre, tipo_id, tipo_nombre):
+        return {
+            'id': objeto_id,
+            'nombre_objeto': nombre_objeto,
+            'tamanio': tamanio,
+            'cajon': {'id': cajon_id, 'nombre': cajon_nombre},
+            'tipo_objeto': {'id': tipo_id, 'nombre': tipo_nombre},
+        }
+
+
+class DuplicadosService:
+    """
+    Detección y eliminación de objetos duplicados: mismo nombre normalizado
+    (sin mayúsculas, acentos ni espacios extra), mismo tipo y mismo tamaño,
+    opcionalmente dentro del mismo cajón. El inventario se recorre una sola
+    vez agrupando en un diccionario, así que el costo es lineal.
+    """
+    
+    @staticmethod
+    def normalizar(nombre):
+        # La mayoría de los nombres son ASCII y no necesitan quitar acentos
+        if not nombre.isascii():
+            nombre = ''.join(
+                caracter for caracter in unicodedata.normalize('NFKD', nombre)
+                if not unicodedata.combining(caracter)
+            )
+        return ' '.join(nombre.casefold().split())
+    
+    @staticmethod
+    def _agrupar(mismo_cajon=False):
+        """Grupos de duplicados: listas de (id, nombre_objeto, cajon_id, tipo_id, tamanio), del más viejo al más nuevo"""
+        primeros = {}
+        grupos = {}
+        filas = CajonObjeto.objects.order_by('id').values_list(
+            'id', 'nombre_objeto', 'cajon_id', 'tipo_objeto_id', 'tamanio'
+        ).iterator(chunk_size=5000)
+        for fila in filas:
+            objeto_id, nombre, cajon_id, tipo_id, tamanio = fila
+            clave = (DuplicadosService.normalizar(nombre), tipo_id, tamanio, cajon_id if mismo_cajon else None)
+            primero = primeros.setdefault(clave, fila)
+            if primero is not fila:
+                grupos.setdefault(clave, [primero]).append(fila)
+        return list(grupos.values())
+    
+    @staticmethod
+    def buscar(mismo_cajon=False):
+        """Reporte de los grupos de duplicados; en cada uno se conserva el objeto más antiguo"""
+        grupos = DuplicadosService._agrupar(mismo_cajon)
+        tipos = dict(
+            TipoObjeto.objects.filter(id__in={grupo[0][3] for grupo in grupos}).values_list('id', 'nombre')
+        )
+        return [
+            {
+                'nombre_objeto': grupo[0][1],
+                'tipo_objeto': {'id': grupo[0][3], 'nombre': tipos.get(grupo[0][3])},
+                'tamanio': grupo[0][4],
+                'cantidad': len(grupo),
+                'conservar': grupo[0][0],
+                'objetos': [
+                    {'id': objeto_id, 'nombre_objeto': nombre, 'cajon': cajon_id}
+                    for objeto_id, nombre, cajon_id, _, _ in grupo
+                ]
+            }
+            for grupo in grupos
+        ]
+    
+    @staticmethod
+    def eliminar(mismo_cajon=False, tamanio_lote=500):
+        """
+        Eliminar los duplicados conservando el objeto más antiguo de cada grupo.
+        Borra en lotes, libera el lugar en los cajones con un UPDATE agrupado y
+        escribe el historial en bloque. Devuelve (grupos, eliminados).
+        """
+        with transaction.atomic():
+            grupos = DuplicadosService._agrupar(mismo_cajon)
+            sobrantes = [fila for grupo in grupos for fila in grupo[1:]]
             
-            if clave not in objetos_por_tipo_tamanio:
-                objetos_por_tipo_tamanio[clave] = {
-                    'tipo': tipo_nombre,
-                    'tamanio': tamanio_display,
-                    'objetos': []
-                }
-            objetos_por_tipo_tamanio[clave]['objetos'].append(objeto)
+            eliminados = []
+            for inicio in range(0, len(sobrantes), tamanio_lote):
+                ids = [fila[0] for fila in sobrantes[inicio:inicio + tamanio_lote]]
+                # Se registran solo las filas que realmente se borran en esta transacción
+                lote = list(
+                    CajonObjeto.objects.select_for_update().filter(id__in=ids).values_list('id', 'nombre_objeto', 'cajon_id')
+                )
+                CajonObjeto.objects.filter(id__in=[objeto_id for objeto_id, _, _ in lote]).delete()
+                eliminados.extend(lote)
+            if not eliminados:
+                return len(grupos), 0
+            
+            deltas = {}
+            for _, _, cajon_id in eliminados:
+                deltas[cajon_id] = deltas.get(cajon_id, 0) - 1
+            CajonService.aplicar_deltas_ocupacion(deltas)
+            versiones.incrementar(CajonObjeto, CajonHistorial)
+            bitacora.registrar_lote([
+                CajonHistorial(
+                    cajon_id=cajon_id,
+                    accion='objeto_eliminado',
+                    descripcion=f'Objeto "{nombre}" eliminado por estar duplicado'
+                )
+                for _, nombre, cajon_id in eliminados
+            ])
+        return len(grupos), len(eliminados)
+
+
+class PlanificadorService:
+    """
+    Planificador local y determinista de la organización de los cajones.
+    
+    Calcula un plan concreto de movimientos para agrupar los objetos según el
+    criterio ('tipo', 'tamanio' o 'mixto') sin superar la capacidad de ningún
+    cajón. Cada grupo recibe como "cajones hogar" aquellos donde ya tiene más
+    objetos (asignación voraz), de modo que se mueva la menor cantidad posible
+    de objetos; los grupos que no entran en sus hogares usan los cajones libres
+    más grandes.
+    """
+    CRITERIOS = ('tipo', 'tamanio', 'mixto')
+    
+    @staticmethod
+    def planificar(objetos, capacidades):
+        """
+        Núcleo del algoritmo, independiente de la base de datos.
+        objetos: iterable de (objeto_id, cajon_id, grupo)
+        capacidades: {cajon_id: capacidad_maxima}
+        Devuelve (movimientos, hogares): movimientos es una lista de
+        (objeto_id, origen, destino) y hogares {cajon_id: grupo}.
+        """
+        por_cajon_grupo = {}
+        totales = {}
+        for objeto_id, cajon_id, grupo in objetos:
+            por_cajon_grupo.setdefault((cajon_id, grupo), []).append(objeto_id)
+            totales[grupo] = totales.get(grupo, 0) + 1
         
-        # Crear resultado ordenado
-        resultado = []
-        for clave, datos in sorted(objetos_por_tipo_tamanio.items()):
-            datos['cantidad'] = len(datos['objetos'])
-            resultado.append(datos)
+        # 1. Hogares: los pares (cajón, grupo) con más objetos primero
+        hogares = {}
+        asignado = dict.fromkeys(totales, 0)
+        pares = sorted(
+            por_cajon_grupo.items(),
+            key=lambda item: (-len(item[1]), -capacidades[item[0][0]], item[0][0], str(item[0][1]))
+        )
+        for (cajon_id, grupo), ids in pares:
+            if cajon_id in hogares or asignado[grupo] >= totales[grupo]:
+                continue
+            hogares[cajon_id] = grupo
+            asignado[grupo] += capacidades[cajon_id]
         
-        return resultado
+        # Los grupos que aún no entran reciben los cajones sin asignar más grandes
+        deficit = [(asignado[grupo] - total, str(grupo), grupo) for grupo, total in totales.items()
+                   if asignado[grupo] < total]
+        heapq.heapify(deficit)
+        libres = sorted(
+            (cajon_id for cajon_id, capacidad in capacidades.items() if cajon_id not in hogares and capacidad > 0),
+            key=lambda cajon_id: (-capacidades[cajon_id], cajon_id)
+        )
+        for cajon_id in libres:
+            if not deficit:
+                break
+            faltante, clave, grupo = heapq.heappop(deficit)
+            hogares[cajon_id] = grupo
+            faltante += capacidades[cajon_id]
+            if faltante < 0:
+                heapq.heappush(deficit, (faltante, clave, grupo))
+        
+        hogares_por_grupo = {}
+        for cajon_id, grupo in hogares.items():
+            hogares_por_grupo.setdefault(grupo, []).append(cajon_id)
+        for grupo, cajones in hogares_por_grupo.items():
+            cajones.sort(key=lambda cajon_id: (-len(por_cajon_grupo.get((cajon_id, grupo), ())), cajon_id))
+        
+        # 2. Objetos fuera de su hogar. Los de grupos sin hogar se quedan donde están.
+        propios = {cajon_id: len(por_cajon_grupo.get((cajon_id, grupo), ())) for cajon_id, grupo in hogares.items()}
+        quedan = dict.fromkeys(hogares, 0)
+        a_mover = {}
+        for (cajon_id, grupo), ids in sorted(por_cajon_grupo.items(), key=lambda item: (item[0][0], str(item[0][1]))):
+            if hogares.get(cajon_id) == grupo:
+                continue
+            if grupo in hogares_por_grupo:
+                a_mover.setdefault(grupo, []).extend((objeto_id, cajon_id) for objeto_id in ids)
+            elif cajon_id in quedan:
+                quedan[cajon_id] += len(ids)
+        
+        # 3. Si un grupo no tiene lugar para todos sus objetos, algunos se quedan
+        # donde están; eso ocupa lugar en el cajón de origen, así que se repite
+        # hasta que no cambie nada
+        while True:
+            libre = {
+                cajon_id: capacidades[cajon_id] - propios[cajon_id] - quedan[cajon_id]
+                for cajon_id in hogares
+            }
+            cambios = False
+            for grupo, pendientes in a_mover.items():
+                lugares = sum(max(libre[cajon_id], 0) for cajon_id in hogares_por_grupo[grupo])
+                exceso = len(pendientes) - lugares
+                if exceso <= 0:
+                    continue
+                # Se quedan primero los que no ocupan lugar en un hogar ajeno
+                pendientes.sort(key=lambda par: (par[1] in hogares, par[0]))
+                for objeto_id, cajon_id in pendientes[:exceso]:
+                    if cajon_id in quedan:
+                        quedan[cajon_id] += 1
+                del pendientes[:exceso]
+                cambios = True
+            if not cambios:
+                break
+        
+        # 4. Asignar destino a los que se mueven, llenando primero los hogares
+        # donde el grupo ya tiene más objetos
+        movimientos = []
+        for grupo, pendientes in a_mover.items():
+            destinos = iter(hogares_por_grupo[grupo])
+            destino = next(destinos, None)
+            for objeto_id, origen in sorted(pendientes):
+                while destino is not None and libre[destino] <= 0:
+                    destino = next(destinos, None)
+                if destino is None:
+                    break
+                libre[destino] -= 1
+                movimientos.append((objeto_id, origen, destino))
+        movimientos.sort()
+        return movimientos, hogares
+    
+    @staticmethod
+    def generar_plan(tipo_ordenamiento='tipo'):
+        """Calcular el plan de organización del inventario completo"""
+        if tipo_ordenamiento not in PlanificadorService.CRITERIOS:
+            raise ValidationError("Tipo de ordenamiento no válido. Use: tipo, tamanio, mixto")
+        
+        cajones = {
+            cajon_id: (nombre, capacidad)
+            for cajon_id, nombre, capacidad in Cajon.objects.values_list('id', 'nombre', 'capacidad_maxima')
+        }
+        tipos = dict(TipoObjeto.objects.values_list('id', 'nombre'))
+        nombres_tamanio = dict(CajonObjeto.CajonTamanio.choices)
+        
+        filas = CajonObjeto.objects.values_list('id', 'cajon_id', 'tipo_objeto_id', 'tamanio').iterator(chunk_size=5000)
+        if tipo_ordenamiento == 'tipo':
+            objetos = ((objeto_id, cajon_id, tipo_id) for objeto_id, cajon_id, tipo_id, _ in filas)
+            nombre_grupo = lambda grupo: tipos.get(grupo, str(grupo))
+        elif tipo_ordenamiento == 'tamanio':
+            objetos = ((objeto_id, cajon_id, tamanio) for objeto_id, cajon_id, _, tamanio in filas)
+            nombre_grupo = lambda grupo: nombres_tamanio.get(grupo, grupo)
+        else:
+            objetos = ((objeto_id, cajon_id, (tipo_id, tamanio)) for objeto_id, cajon_id, tipo_id, tamanio in filas)
+            nombre_grupo = lambda grupo: f"{tipos.get(grupo[0], grupo[0])} {nombres_tamanio.get(grupo[1], grupo[1])}"
+        
+        movimientos, hogares = PlanificadorService.planificar(
+            objetos, {cajon_id: capacidad for cajon_id, (_, capacidad) in cajones.items()}
+        )
+        
+        recibidos = {}
+        for _, _, destino in movimientos:
+            recibidos[destino] = recibidos.get(destino, 0) + 1
+        return {
+            'tipo_ordenamiento': tipo_ordenamiento,
+            'total_movimientos': len(movimientos),
+            'asignacion': [
+                {
+                    'cajon_id': cajon_id,
+                    'cajon_nombre': cajones[cajon_id][0],
+                    'grupo': nombre_grupo(grupo),
+                    'objetos_recibidos': recibidos.get(cajon_id, 0)
+                }
+                for cajon_id, grupo in sorted(hogares.items())
+            ],
+            'movimientos': [
+                {'objeto': objeto_id, 'desde': origen, 'cajon': destino}
+                for objeto_id, origen, destino in movimientos
+            ]
+        }
+    
+    @staticmethod
+    def recomendaciones_desde_plan(plan):
+        """Resumir un plan en 3 recomendaciones de texto, con el mismo formato que las de Gemini"""
+        criterio = plan['tipo_ordenamiento']
+        if not plan['total_movimientos']:
+            return [
+                f"La organización actual ya agrupa los objetos por {criterio}; no hace falta mover nada",
+                "Agregar los objetos nuevos en el cajón asignado a su grupo",
+                "Revisar la ocupación de los cajones antes de agregar muchos objetos",
+            ]
+        
+        recomendaciones = [
+            f"Mover {plan['total_movimientos']} objetos para agrupar por {criterio} sin superar la capacidad de ningún cajón"
+        ]
+        destinos = sorted(
+            (item for item in plan['asignacion'] if item['objetos_recibidos']),
+            key=lambda item: (-item['objetos_recibidos'], item['cajon_id'])
+        )
+        for item in destinos[:2]:
+            recomendaciones.append(
+                f"Destinar el cajón \"{item['cajon_nombre']}\" a {item['grupo']} "
+                f"(recibe {item['objetos_recibidos']} objetos)"
+            )
+        while len(recomendaciones) < 3:
+            recomendaciones.append("No hay suficientes datos para generar esta recomendación")
+        return recomendaciones
+
+
+class ModeloLocal:
+    """
+    Reemplazo de Gemini que responde sin salir a la red. Se usa con
+    RECOMENDACIONES_MODELO='local' para desarrollo y pruebas sin API key.
+    """
+    def generate_content(self, prompt):
+        criterio = prompt.split('basadas en el criterio:', 1)[-1].split('.', 1)[0].strip()
+        return SimpleNamespace(text='\n'.join([
+            f"1. Agrupar los objetos según el criterio {criterio} en los cajones con más espacio disponible",
+            "2. Vaciar primero los cajones con mayor porcentaje de ocupación",
+            "3. Revisar los cajones vacíos para asignarlos a los tipos con más objetos",
+        ]))
+
+    async def generate_content_async(self, prompt):
+        return self.generate_content(prompt)
 
 
 class RecomendacionService:
-    def __init__(self):
+    # Alias de settings.CACHES donde se guardan las recomendaciones generadas
+    cache_alias = 'recomendaciones'
+    # Tablas que forman el contexto enviado a Gemini
+    modelos_contexto = (Cajon, TipoObjeto, CajonObjeto)
+    
+    def __init__(self, model=None):
+        if model is not None:
+            self.model = model
+            return
+        if getattr(settings, 'RECOMENDACIONES_MODELO', 'gemini') == 'local':
+            self.model = ModeloLocal()
+            return
+        
         # Configurar Gemini AI
         api_key = os.getenv('GEMINI_API_KEY')
         if not api_key:
@@ -256,62 +1011,207 @@ class RecomendacionService:
     
     def generar_contexto_completo(self):
         """Generar contexto completo de la base de datos para Gemini"""
-        cajones = Cajon.objects.all()
-        objetos = CajonObjeto.objects.all()
-        tipos = TipoObjeto.objects.all()
+        return self.construir_contexto()
+    
+    @staticmethod
+    def construir_contexto(max_tokens=None, max_objetos_detalle=None, top_tipos=3):
+        """
+        Construir el contexto para Gemini con un número fijo de consultas,
+        sin importar cuántos cajones, objetos o tipos haya.
+        
+        El texto se limita a `max_tokens` (estimando ~4 caracteres por token):
+        los cajones con hasta `max_objetos_detalle` objetos listan su contenido,
+        los más grandes se resumen con sus `top_tipos` tipos más frecuentes y
+        los que ya no entran en el presupuesto se agregan en una sola línea.
+        """
+        if max_tokens is None:
+            max_tokens = getattr(settings, 'RECOMENDACIONES_CONTEXTO_MAX_TOKENS', 6000)
+        if max_objetos_detalle is None:
+            max_objetos_detalle = getattr(settings, 'RECOMENDACIONES_CONTEXTO_MAX_OBJETOS_CAJON', 15)
+        # Se reserva lugar para los encabezados y las líneas "... y N más"
+        presupuesto = max_tokens * 4 - 300
+        nombres_tamanio = dict(CajonObjeto.CajonTamanio.choices)
+        
+        cajones = list(
+            Cajon.objects.order_by('id').values_list('id', 'nombre', 'capacidad_maxima', 'objetos_count')
+        )
+        tipos = list(
+            TipoObjeto.objects.annotate(total=Count('objetos'))
+            .order_by('-total', 'nombre')
+            .values_list('id', 'nombre', 'descripcion', 'total')
+        )
+        # Los 3 primeros objetos de cada tipo, como ejemplos
+        ejemplos = {}
+        filas_ejemplo = (
+            CajonObjeto.objects.annotate(
+                posicion=Window(RowNumber(), partition_by=F('tipo_objeto_id'), order_by=F('id').asc())
+            )
+            .filter(posicion__lte=3)
+            .values_list('tipo_objeto_id', 'nombre_objeto')
+        )
+        for tipo_id, nombre_objeto in filas_ejemplo:
+            ejemplos.setdefault(tipo_id, []).append(nombre_objeto)
+        por_tamanio = dict(
+            CajonObjeto.objects.values_list('tamanio').annotate(total=Count('id')).order_by()
+        )
+        # Cantidad por tipo de los cajones que no se listan objeto por objeto
+        tipos_por_cajon = {}
+        filas_resumen = (
+            CajonObjeto.objects.filter(cajon__objetos_count__gt=max_objetos_detalle)
+            .values_list('cajon_id', 'tipo_objeto__nombre')
+            .annotate(total=Count('id'))
+            .order_by()
+        )
+        for cajon_id, tipo_nombre, total in filas_resumen:
+            tipos_por_cajon.setdefault(cajon_id, []).append((total, tipo_nombre))
+        # Objetos de los cajones chicos, leídos en orden a medida que se usan
+        objetos_detalle = groupby(
+            CajonObjeto.objects.filter(cajon__objetos_count__lte=max_objetos_detalle)
+            .order_by('cajon_id', 'id')
+            .values_list('cajon_id', 'nombre_objeto', 'tipo_objeto__nombre', 'tamanio')
+            .iterator(chunk_size=2000),
+            key=itemgetter(0)
+        )
+        siguiente_grupo = next(objetos_detalle, None)
+        
+        def resumen_tipos(conteos):
+            conteos = sorted(conteos, key=lambda par: (-par[0], par[1]))
+            partes = [f"{nombre} x{total}" for total, nombre in conteos[:top_tipos]]
+            if len(conteos) > top_tipos:
+                partes.append(f"+{len(conteos) - top_tipos} tipos más")
+            return ', '.join(partes)
         
-        contexto = "CONTEXTO COMPLETO DEL SISTEMA DE CAJONES:\n\n"
+        # Estadísticas generales y tipos tienen prioridad en el presupuesto
+        total_objetos = sum(cajon[3] for cajon in cajones)
+        estadisticas = [
+            "=== ESTADÍSTICAS GENERALES ===",
+            f"Total de cajones: {len(cajones)}",
+            f"Total de objetos: {total_objetos}",
+            f"Total de tipos: {len(tipos)}",
+            "Distribución por tamaños:",
+            *[f"   - {nombre}: {por_tamanio.get(codigo, 0)} objetos" for codigo, nombre in nombres_tamanio.items()],
+            "",
+        ]
         
-        # Información detallada de cajones
-        contexto += "=== CAJONES DISPONIBLES ===\n"
-        for cajon in cajones:
-            objetos_count = cajon.objetos.count()
-            capacidad_disponible = cajon.capacidad_maxima - objetos_count
-            porcentaje_ocupacion = (objetos_count / cajon.capacidad_maxima) * 100
+        lineas_tipos = ["=== TIPOS DE OBJETOS ==="]
+        presupuesto_tipos = presupuesto // 4
+        usados = len(lineas_tipos[0])
+        for indice, (tipo_id, nombre, descripcion, total) in enumerate(tipos):
+            bloque = [
+                f"{nombre}: {descripcion or 'Sin descripción'}",
+                f"   - Cantidad total: {total} objetos",
+            ]
+            if tipo_id in ejemplos:
+                bloque.append(f"   - Ejemplos: {', '.join(ejemplos[tipo_id])}")
+            bloque.append("")
+            tamanio_bloque = sum(len(linea) + 1 for linea in bloque)
+            if usados + tamanio_bloque > presupuesto_tipos:
+                restantes = tipos[indice:]
+                lineas_tipos.append(
+                    f"... y {len(restantes)} tipos más con {sum(tipo[3] for tipo in restantes)} objetos en total"
+                )
+                lineas_tipos.append("")
+                break
+            lineas_tipos.extend(bloque)
+            usados += tamanio_bloque
+        
+        lineas_cajones = ["=== CAJONES DISPONIBLES ==="]
+        usados += sum(len(linea) + 1 for linea in estadisticas) + len(lineas_cajones[0])
+        for indice, (cajon_id, nombre, capacidad, objetos_count) in enumerate(cajones):
+            detalle = []
+            while siguiente_grupo is not None and siguiente_grupo[0] <= cajon_id:
+                if siguiente_grupo[0] == cajon_id:
+                    detalle = list(siguiente_grupo[1])
+                siguiente_grupo = next(objetos_detalle, None)
             
-            contexto += f"CAJÓN: {cajon.nombre}\n"
-            contexto += f"   - Capacidad: {objetos_count}/{cajon.capacidad_maxima} objetos\n"
-            contexto += f"   - Espacio disponible: {capacidad_disponible}\n"
-            contexto += f"   - Ocupación: {porcentaje_ocupacion:.1f}%\n"
+            porcentaje = (objetos_count / capacidad) * 100 if capacidad > 0 else 0
+            bloque = [
+                f"CAJÓN: {nombre}",
+                f"   - Capacidad: {objetos_count}/{capacidad} objetos",
+                f"   - Espacio disponible: {capacidad - objetos_count}",
+                f"   - Ocupación: {porcentaje:.1f}%",
+            ]
+            if objetos_count == 0:
+                opciones = [["   - Objetos contenidos: VACÍO"]]
+            elif detalle:
+                conteos = {}
+                for _, _, tipo_nombre, _ in detalle:
+                    conteos[tipo_nombre] = conteos.get(tipo_nombre, 0) + 1
+                opciones = [
+                    ["   - Objetos contenidos:"] + [
+                        f"     • {nombre_objeto} (Tipo: {tipo_nombre}, Tamaño: {nombres_tamanio.get(tamanio, tamanio)})"
+                        for _, nombre_objeto, tipo_nombre, tamanio in detalle
+                    ],
+                    [f"   - Tipos contenidos: {resumen_tipos([(t, n) for n, t in conteos.items()])}"],
+                ]
+            else:
+                opciones = [[f"   - Tipos contenidos: {resumen_tipos(tipos_por_cajon.get(cajon_id, []))}"]]
             
-            # Objetos en este cajón
-            objetos_cajon = cajon.objetos.all()
-            if objetos_cajon:
-                contexto += f"   - Objetos contenidos:\n"
-                for obj in objetos_cajon:
-                    contexto += f"     • {obj.nombre_objeto} (Tipo: {obj.tipo_objeto.nombre}, Tamaño: {obj.get_tamanio_display()})\n"
+            # Usar la versión más detallada que entre en el presupuesto
+            for contenido in opciones:
+                lineas = bloque + contenido + [""]
+                tamanio_bloque = sum(len(linea) + 1 for linea in lineas)
+                if usados + tamanio_bloque <= presupuesto:
+                    lineas_cajones.extend(lineas)
+                    usados += tamanio_bloque
+                    break
             else:
-                contexto += f"   - Objetos contenidos: VACÍO\n"
-            contexto += "\n"
-        
-        contexto += "=== TIPOS DE OBJETOS ===\n"
-        for tipo in tipos:
-            objetos_tipo = tipo.objetos.all()
-            contexto += f"{tipo.nombre}: {tipo.descripcion or 'Sin descripción'}\n"
-            contexto += f"   - Cantidad total: {objetos_tipo.count()} objetos\n"
-            if objetos_tipo:
-                contexto += f"   - Ejemplos: {', '.join([obj.nombre_objeto for obj in objetos_tipo[:3]])}\n"
-            contexto += "\n"
-        
-        # Estadísticas generales
-        contexto += "=== ESTADÍSTICAS GENERALES ===\n"
-        contexto += f"Total de cajones: {cajones.count()}\n"
-        contexto += f"Total de objetos: {objetos.count()}\n"
-        contexto += f"Total de tipos: {tipos.count()}\n"
-        
-        # Distribución por tamaños
-        tamanios_stats = {}
-        for tamanio_choice in CajonObjeto.CajonTamanio.choices:
-            count = objetos.filter(tamanio=tamanio_choice[0]).count()
-            tamanios_stats[tamanio_choice[1]] = count
-        
-        contexto += f"Distribución por tamaños:\n"
-        for tamanio, count in tamanios_stats.items():
-            contexto += f"   - {tamanio}: {count} objetos\n"
-        
-        contexto += "\n"
-        
-        return contexto
+                restantes = cajones[indice:]
+                ocupados = sum(cajon[3] for cajon in restantes)
+                libres = sum(cajon[2] - cajon[3] for cajon in restantes)
+                lineas_cajones.append(
+                    f"... y {len(restantes)} cajones más con {ocupados} objetos y {libres} lugares disponibles"
+                )
+                lineas_cajones.append("")
+                break
+        
+        return '\n'.join([
+            "CONTEXTO COMPLETO DEL SISTEMA DE CAJONES:",
+            "",
+            *lineas_cajones,
+            *lineas_tipos,
+            *estadisticas,
+            "",
+        ])
+    
+    @classmethod
+    def clave_cache(cls, tipo_ordenamiento):
+        """
+        Clave de cache: el criterio más la versión de las tablas que forman el
+        contexto, de modo que solo un cambio real del inventario la invalida
+        """
+        huella = versiones.huella(*cls.modelos_contexto)
+        return f'recomendaciones:{tipo_ordenamiento}:{huella}'
+    
+    @classmethod
+    async def aclave_cache(cls, tipo_ordenamiento):
+        huella = await versiones.ahuella(*cls.modelos_contexto)
+        return f'recomendaciones:{tipo_ordenamiento}:{huella}'
+    
+    @classmethod
+    def obtener_recomendaciones(cls, tipo_ordenamiento='tipo'):
+        """
+        Obtener recomendaciones desde la cache y, si el inventario cambió o la
+        entrada expiró, generarlas con Gemini. Los errores no se guardan en cache.
+        """
+        cache = caches[cls.cache_alias]
+        clave = cls.clave_cache(tipo_ordenamiento)
+        recomendaciones = cache.get(clave)
+        if recomendaciones is None:
+            recomendaciones = cls().generar_recomendaciones(tipo_ordenamiento)
+            cache.set(clave, recomendaciones)
+        return recomendaciones
+    
+    @classmethod
+    async def aobtener_recomendaciones(cls, tipo_ordenamiento='tipo'):
+        """Variante asíncrona de obtener_recomendaciones, para las vistas ASGI"""
+        cache = caches[cls.cache_alias]
+        clave = await cls.aclave_cache(tipo_ordenamiento)
+        recomendaciones = await cache.aget(clave)
+        if recomendaciones is None:
+            recomendaciones = await cls().agenerar_recomendaciones(tipo_ordenamiento)
+            await cache.aset(clave, recomendaciones)
+        return recomendaciones
     
     def generar_recomendaciones_organizacion(self, tipo_ordenamiento='tipo'):
         """
@@ -319,9 +1219,37 @@ class RecomendacionService:
         tipo_ordenamiento: 'tipo', 'tamanio'
         """
         try:
-            contexto = self.generar_contexto_completo()
-            
-            prompt = f"""
+            return self.generar_recomendaciones(tipo_ordenamiento)
+        except Exception as e:
+            return [
+                f"Error al generar recomendación 1: {str(e)}",
+                "Error al generar recomendación 2",
+                "Error al generar recomendación 3"
+            ]
+    
+    def generar_recomendaciones(self, tipo_ordenamiento='tipo'):
+        """Igual que generar_recomendaciones_organizacion, pero propaga los errores"""
+        prompt = self.construir_prompt(self.generar_contexto_completo(), tipo_ordenamiento)
+        response = self.model.generate_content(prompt)
+        return self.procesar_respuesta(response.text)
+    
+    async def agenerar_recomendaciones(self, tipo_ordenamiento='tipo'):
+        """
+        Variante asíncrona de generar_recomendaciones: el contexto se arma en
+        el hilo de Django para el ORM y la respuesta de Gemini se espera sin
+        ocupar ningún hilo
+        """
+        contexto = await sync_to_async(self.generar_contexto_completo)()
+        prompt = self.construir_prompt(contexto, tipo_ordenamiento)
+        if hasattr(self.model, 'generate_content_async'):
+            response = await self.model.generate_content_async(prompt)
+        else:
+            response = await sync_to_async(self.model.generate_content, thread_sensitive=False)(prompt)
+        return self.procesar_respuesta(response.text)
+    
+    @staticmethod
+    def construir_prompt(contexto, tipo_ordenamiento):
+        return f"""
 {contexto}
 
 INSTRUCCIONES:
@@ -350,28 +1278,23 @@ EJEMPLO:
 
 RESPONDE SOLO LAS 3 RECOMENDACIONES NUMERADAS:
 """
-            
-            response = self.model.generate_content(prompt)
-            recomendaciones_texto = response.text.strip()
-            
-            # Procesar las recomendaciones para asegurar formato correcto
-            recomendaciones = []
-            for linea in recomendaciones_texto.split('\n'):
-                linea = linea.strip()
-                if linea and (linea.startswith('1.') or linea.startswith('2.') or linea.startswith('3.')):
-                    # Extraer solo el texto de la recomendación
-                    recomendacion = linea.split('.', 1)[1].strip() if '.' in linea else linea
-                    recomendaciones.append(recomendacion)
-            
-            # Asegurar que tengamos exactamente 3 recomendaciones
-            while len(recomendaciones) < 3:
-                recomendaciones.append("No hay suficientes datos para generar esta recomendación")
-            
-            return recomendaciones[:3]  # Solo las primeras 3
-            
-        except Exception as e:
-            return [
-                f"Error al generar recomendación 1: {str(e)}",
-                "Error al generar recomendación 2",
-                "Error al generar recomendación 3"
-            ] 
\ No newline at end of file
+    
+    @staticmethod
+    def procesar_respuesta(texto):
+        """Extraer exactamente 3 recomendaciones del texto devuelto por el modelo"""
+        recomendaciones_texto = texto.strip()
+        
+        # Procesar las recomendaciones para asegurar formato correcto
+        recomendaciones = []
+        for linea in recomendaciones_texto.split('\n'):
+            linea = linea.strip()
+            if linea and (linea.startswith('1.') or linea.startswith('2.') or linea.startswith('3.')):
+                # Extraer solo el texto de la recomendación
+                recomendacion = linea.split('.', 1)[1].strip() if '.' in linea else linea
+                recomendaciones.append(recomendacion)
+        
+        # Asegurar que tengamos exactamente 3 recomendaciones
+        while len(recomendaciones) < 3:
+            recomendaciones.append("No hay suficientes datos para generar esta recomendación")
+        
+        return recomendaciones[:3]  # Solo las primeras 3
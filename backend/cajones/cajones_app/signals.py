@@ -0,0 +1,28 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import versiones
+from .models import Cajon, CajonHistorial, CajonObjeto, TipoObjeto
+
+
+@receiver(post_save, sender=Cajon)
+@receiver(post_save, sender=TipoObjeto)
+@receiver(post_save, sender=CajonObjeto)
+@receiver(post_save, sender=CajonHistorial)
+def marcar_version(sender, using, **kwargs):
+    """Las escrituras por instancia actualizan la versión de su tabla"""
+    versiones.incrementar(sender, using=using)
+
+
+# No se escucha post_delete de CajonObjeto ni de CajonHistorial para que
+# Django pueda seguir borrando en cascada con un único DELETE; quien elimina
+# esas filas directamente (CajonService, admin) incrementa la versión por su
+# cuenta.
+@receiver(post_delete, sender=Cajon)
+def marcar_version_cajon_eliminado(sender, using, **kwargs):
+    versiones.incrementar(sender, CajonObjeto, CajonHistorial, using=using)
+
+
+@receiver(post_delete, sender=TipoObjeto)
+def marcar_version_en_cascada(sender, using, **kwargs):
+    versiones.incrementar(sender, CajonObjeto, using=using)
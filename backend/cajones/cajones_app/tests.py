@@ -1,3 +1,1502 @@
-from django.test import TestCase
+import asyncio
+import csv
+import gzip
+import io
+import json
+import logging
+import os
+import random
+import re
+import shutil
+import tempfile
+import unittest
+import threading
+import time
+from collections import Counter
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+from django.core.cache import caches
+from django.core.exceptions import ValidationError
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, connection, connections, transaction
+from django.db.models import Count
+from django.http import JsonResponse
+from django.test import AsyncRequestFactory, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from . import bitacora, datos_sinteticos, instrumentacion, replica, trabajos, versiones
+from .models import Cajon, CajonHistorial, HistorialResumen, RecomendacionTrabajo, TipoObjeto, CajonObjeto
+from .pagination import HistorialPagination
+from .serializers import CajonObjetoSerializer
+from .services import CajonService, ModeloLocal, OrdenamientoService, PlanificadorService, RecomendacionService
+from .views import ExportacionObjetosView
+from .views_async import (
+    BusquedaAsyncView, CajonCapacidadAsyncView, CajonEstadisticasAsyncView, CajonHistorialAsyncView,
+    CajonObjetosAsyncView, EstadisticasAsyncView, HistorialEventosAsyncView, RecomendacionAsyncView
+)
+
+logger = logging.getLogger(__name__)
+
+
+class PaginacionCursorTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.cajon = Cajon.objects.create(nombre='Oficina', capacidad_maxima=100)
+        self.tipo = TipoObjeto.objects.create(nombre='Libros')
+        for i in range(25):
+            CajonObjeto.objects.create(
+                cajon=self.cajon, nombre_objeto=f'Libro {i}', tipo_objeto=self.tipo
+            )
+            CajonHistorial.objects.create(cajon=self.cajon, accion='objeto_agregado')
+
+    def recorrer(self, url):
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            ids.extend(item['id'] for item in response.data['results'])
+            url = response.data['next']
+        return ids
+
+    def test_objetos_recorre_todas_las_paginas_sin_repetir(self):
+        ids = self.recorrer('/api/objetos/?page_size=10')
+        self.assertEqual(ids, sorted(CajonObjeto.objects.values_list('id', flat=True)))
+
+    def test_historial_ordenado_por_fecha_descendente(self):
+        ids = self.recorrer(f'/api/cajones/{self.cajon.id}/historial/?page_size=7')
+        esperado = list(
+            CajonHistorial.objects.order_by('-fecha', '-id').values_list('id', flat=True)
+        )
+        self.assertEqual(ids, esperado)
+
+    def test_ultima_pagina_sin_next(self):
+        response = self.client.get('/api/historial/?page_size=100')
+        self.assertIsNone(response.data['next'])
+        self.assertEqual(len(response.data['results']), 25)
+
+    def test_cursor_invalido(self):
+        response = self.client.get('/api/historial/?cursor=no-es-un-cursor')
+        self.assertEqual(response.status_code, 404)
+
+
+class OcupacionCajonTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.tipo = TipoObjeto.objects.create(nombre='Herramientas')
+        self.origen = Cajon.objects.create(nombre='Taller', capacidad_maxima=2)
+        self.destino = Cajon.objects.create(nombre='Garaje', capacidad_maxima=1)
+
+    def agregar(self, cajon):
+        return CajonService.agregar_objeto_a_cajon(cajon.id, 'Martillo', self.tipo.id, 'ME')
+
+    def test_agregar_respeta_capacidad(self):
+        self.agregar(self.origen)
+        self.agregar(self.origen)
+        with self.assertRaises(ValidationError):
+            self.agregar(self.origen)
+        self.origen.refresh_from_db()
+        self.assertEqual(self.origen.objetos_count, 2)
+        self.assertEqual(self.origen.objetos.count(), 2)
+
+    def test_mover_actualiza_ambos_cajones(self):
+        objeto = self.agregar(self.origen)
+        otro = self.agregar(self.origen)
+        CajonService.mover_objeto(objeto.id, self.destino.id)
+        with self.assertRaises(ValidationError):
+            CajonService.mover_objeto(otro.id, self.destino.id)
+        self.origen.refresh_from_db()
+        self.destino.refresh_from_db()
+        self.assertEqual((self.origen.objetos_count, self.destino.objetos_count), (1, 1))
+
+    def test_post_objeto_en_cajon_lleno(self):
+        self.agregar(self.destino)
+        response = self.client.post('/api/objetos/', {
+            'cajon': self.destino.id, 'nombre_objeto': 'Sierra',
+            'tipo_objeto': self.tipo.id, 'tamanio': 'GR'
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.destino.objetos.count(), 1)
+
+    def test_eliminar_objeto_y_tipo_liberan_espacio(self):
+        objeto = self.agregar(self.origen)
+        self.agregar(self.origen)
+        self.assertEqual(self.client.delete(f'/api/objetos/{objeto.id}/').status_code, 204)
+        self.origen.refresh_from_db()
+        self.assertEqual(self.origen.objetos_count, 1)
+        self.client.delete(f'/api/tipos-objeto/{self.tipo.id}/')
+        self.origen.refresh_from_db()
+        self.assertEqual(self.origen.objetos_count, 0)
+
+    def test_eliminar_objeto_movido_despues_de_leerlo(self):
+        objeto = self.agregar(self.origen)
+        self.agregar(self.origen)
+        # Otro request mueve el objeto entre la lectura y la eliminación
+        CajonService.mover_objeto(objeto.id, self.destino.id)
+        self.assertTrue(CajonService.eliminar_objeto(objeto))
+        for cajon in (self.origen, self.destino):
+            cajon.refresh_from_db()
+            self.assertEqual(cajon.objetos_count, cajon.objetos.count())
+        self.assertEqual(self.destino.historial_entries.latest('id').accion, 'objeto_eliminado')
+        self.assertFalse(CajonService.eliminar_objeto(objeto))
+        self.assertEqual(self.client.delete(f'/api/objetos/{objeto.id}/').status_code, 404)
+
+
+class OcupacionConcurrenteTests(TransactionTestCase):
+    """
+    Prueba de estrés: varios hilos agregan objetos al mismo cajón a la vez y la
+    ocupación nunca debe superar la capacidad máxima
+    """
+    hilos = 8
+    intentos_por_hilo = 25
+    capacidad = 60
+
+    def test_capacidad_bajo_concurrencia(self):
+        cajon = Cajon.objects.create(nombre='Compartido', capacidad_maxima=self.capacidad)
+        tipo = TipoObjeto.objects.create(nombre='Repuestos')
+        resultados = {'agregados': 0, 'rechazados': 0}
+        lock = threading.Lock()
+        inicio = threading.Barrier(self.hilos)
+
+        def trabajador(numero):
+            inicio.wait()
+            try:
+                for i in range(self.intentos_por_hilo):
+                    while True:
+                        try:
+                            CajonService.agregar_objeto_a_cajon(cajon.id, f'Pieza {numero}-{i}', tipo.id, 'PE')
+                            clave = 'agregados'
+                        except ValidationError:
+                            clave = 'rechazados'
+                        except OperationalError:
+                            # SQLite en memoria devuelve "table is locked" en vez de esperar
+                            time.sleep(0.001)
+                            continue
+                        break
+                    with lock:
+                        resultados[clave] += 1
+            finally:
+                connection.close()
+
+        hilos = [threading.Thread(target=trabajador, args=(n,)) for n in range(self.hilos)]
+        comienzo = time.perf_counter()
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        duracion = time.perf_counter() - comienzo
+
+        cajon.refresh_from_db()
+        total = self.hilos * self.intentos_por_hilo
+        self.assertEqual(resultados['agregados'], self.capacidad)
+        self.assertEqual(resultados['rechazados'], total - self.capacidad)
+        self.assertEqual(cajon.objetos_count, self.capacidad)
+        self.assertEqual(cajon.objetos.count(), self.capacidad)
+        logger.info(
+            'Ocupación: %s escrituras en %.3f s (%.0f ops/s, %s hilos)', total, duracion, total / duracion, self.hilos
+        )
+
+    def test_mover_por_put_con_otro_movimiento_en_curso(self):
+        origen = Cajon.objects.create(nombre='Origen', capacidad_maxima=5)
+        destino = Cajon.objects.create(nombre='Destino', capacidad_maxima=5)
+        tipo = TipoObjeto.objects.create(nombre='Repuestos')
+        objeto = CajonService.agregar_objeto_a_cajon(origen.id, 'Pieza', tipo.id, 'PE')
+        is_valid = CajonObjetoSerializer.is_valid
+
+        def mover_desde_otro_hilo():
+            try:
+                CajonService.mover_objeto(objeto.id, destino.id)
+            except OperationalError:
+                # El PUT tiene la transacción abierta: este movimiento espera su turno
+                pass
+            finally:
+                connection.close()
+
+        def validar(serializer, *args, **kwargs):
+            # Otro request mueve el objeto después de que el PUT lo leyó
+            hilo = threading.Thread(target=mover_desde_otro_hilo)
+            hilo.start()
+            hilo.join()
+            return is_valid(serializer, *args, **kwargs)
+
+        datos = {'cajon': destino.id, 'nombre_objeto': 'Pieza', 'tipo_objeto': tipo.id, 'tamanio': 'PE'}
+        with mock.patch.object(CajonObjetoSerializer, 'is_valid', validar):
+            response = APIClient().put(f'/api/objetos/{objeto.id}/', datos, format='json')
+        self.assertEqual(response.status_code, 200)
+
+        for cajon in (origen, destino):
+            cajon.refresh_from_db()
+            self.assertEqual(cajon.objetos_count, cajon.objetos.count())
+        self.assertEqual(destino.objetos_count, 1)
+
+
+class CargaMasivaTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.tipo = TipoObjeto.objects.create(nombre='Libros')
+        self.chico = Cajon.objects.create(nombre='Mesa de luz', capacidad_maxima=2)
+        self.grande = Cajon.objects.create(nombre='Biblioteca', capacidad_maxima=100)
+
+    def test_carga_con_errores_por_elemento(self):
+        objetos = [
+            {'cajon': self.grande.id, 'nombre_objeto': f'Libro {i}', 'tipo_objeto': self.tipo.id, 'tamanio': 'ME'}
+            for i in range(50)
+        ] + [
+            {'cajon': self.chico.id, 'nombre_objeto': f'Novela {i}', 'tipo_objeto': self.tipo.id}
+            for i in range(3)
+        ] + [
+            {'cajon': 9999, 'nombre_objeto': 'Perdido', 'tipo_objeto': self.tipo.id},
+            {'cajon': self.grande.id, 'nombre_objeto': 'Sin tamaño válido', 'tipo_objeto': self.tipo.id, 'tamanio': 'XL'},
+        ]
+        with self.assertNumQueries(9):
+            response = self.client.post('/api/objetos/lote/', {'objetos': objetos}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['creados'], 52)
+        self.assertEqual([error['indice'] for error in response.data['errores']], [52, 53, 54])
+        self.grande.refresh_from_db()
+        self.chico.refresh_from_db()
+        self.assertEqual((self.grande.objetos_count, self.chico.objetos_count), (50, 2))
+        self.assertEqual(CajonHistorial.objects.filter(accion='objeto_agregado').count(), 52)
+
+    def test_lista_vacia(self):
+        response = self.client.post('/api/objetos/lote/', {'objetos': []}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class MovimientoEnLoteTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        tipo = TipoObjeto.objects.create(nombre='Ropa')
+        self.a = Cajon.objects.create(nombre='A', capacidad_maxima=10)
+        self.b = Cajon.objects.create(nombre='B', capacidad_maxima=3)
+        items = [(i, {'cajon': self.a.id, 'nombre_objeto': f'Prenda {i}', 'tipo_objeto': tipo.id, 'tamanio': 'PE'})
+                 for i in range(6)]
+        creados, _ = CajonService.agregar_objetos_en_lote(items)
+        self.objetos = [objeto for _, objeto in creados]
+
+    def mover(self, objetos, destino):
+        return self.client.post('/api/objetos/mover/', {
+            'movimientos': [{'objeto': objeto.id, 'cajon': destino.id} for objeto in objetos]
+        }, format='json')
+
+    def test_plan_valido_se_aplica_completo(self):
+        response = self.mover(self.objetos[:3], self.b)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['movidos'], 3)
+        self.a.refresh_from_db()
+        self.b.refresh_from_db()
+        self.assertEqual((self.a.objetos_count, self.b.objetos_count), (3, 3))
+        self.assertEqual(self.b.objetos.count(), 3)
+        self.assertEqual(CajonHistorial.objects.filter(accion='objeto_recibido', cajon=self.b).count(), 3)
+
+    def test_plan_que_excede_capacidad_no_mueve_nada(self):
+        response = self.mover(self.objetos[:4], self.b)
+        self.assertEqual(response.status_code, 400)
+        self.b.refresh_from_db()
+        self.assertEqual(self.b.objetos_count, 0)
+        self.assertEqual(self.a.objetos.count(), 6)
+
+    def test_cantidad_de_consultas_no_depende_del_plan(self):
+        with self.assertNumQueries(9):
+            self.mover(self.objetos[:1], self.b)
+        with self.assertNumQueries(9):
+            self.mover(self.objetos[1:3], self.b)
+
+
+class EstadisticasTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.cajon = Cajon.objects.create(nombre='Cocina', capacidad_maxima=20)
+        self.vacio = Cajon.objects.create(nombre='Vacío', capacidad_maxima=5)
+        tipos = [TipoObjeto.objects.create(nombre=nombre) for nombre in ('Cubiertos', 'Ollas', 'Vasos')]
+        for i in range(12):
+            CajonObjeto.objects.create(
+                cajon=self.cajon, nombre_objeto=f'Objeto {i}',
+                tipo_objeto=tipos[i % 3], tamanio=('PE', 'ME', 'GR', 'PE')[i % 4]
+            )
+        CajonService.recalcular_ocupacion([self.cajon.id])
+
+    def test_estadisticas_de_un_cajon(self):
+        # Dos consultas más la lectura de versiones para el ETag
+        with self.assertNumQueries(3):
+            response = self.client.get(f'/api/cajones/{self.cajon.id}/estadisticas/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['cajon']['objetos_actuales'], 12)
+        self.assertEqual(response.data['cajon']['porcentaje_ocupacion'], 60)
+        self.assertEqual(response.data['estadisticas_por_tamanio'], {'Pequeño': 6, 'Mediano': 3, 'Grande': 3})
+        self.assertEqual(response.data['estadisticas_por_tipo'], {'Cubiertos': 4, 'Ollas': 4, 'Vasos': 4})
+
+    def test_estadisticas_de_todos_los_cajones(self):
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/estadisticas/')
+        self.assertEqual(len(response.data['cajones']), 2)
+        self.assertEqual(response.data['cajones'][1]['cajon']['objetos_actuales'], 0)
+        self.assertEqual(response.data['totales']['objetos_actuales'], 12)
+        self.assertEqual(response.data['totales']['capacidad_disponible'], 13)
+
+    def test_cajon_inexistente(self):
+        self.assertEqual(self.client.get('/api/cajones/999/estadisticas/').status_code, 404)
+
+
+class CacheRecomendacionesTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        caches[RecomendacionService.cache_alias].clear()
+        self.tipo = TipoObjeto.objects.create(nombre='Juguetes')
+        self.cajon = Cajon.objects.create(nombre='Cuarto', capacidad_maxima=10)
+        patcher = mock.patch.object(RecomendacionService, '__init__', return_value=None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(
+            RecomendacionService, 'generar_recomendaciones', return_value=['uno', 'dos', 'tres']
+        )
+        self.generar = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_repite_desde_cache_hasta_que_cambia_el_inventario(self):
+        for _ in range(3):
+            response = self.client.get('/api/recomendacion/?tipo_ordenamiento=tipo')
+            self.assertEqual(response.data['recomendaciones'], ['uno', 'dos', 'tres'])
+        self.assertEqual(self.generar.call_count, 1)
+
+        # Otro criterio es otra entrada
+        self.client.get('/api/recomendacion/?tipo_ordenamiento=tamanio')
+        self.assertEqual(self.generar.call_count, 2)
+
+        CajonService.agregar_objeto_a_cajon(self.cajon.id, 'Pelota', self.tipo.id, 'PE')
+        self.client.get('/api/recomendacion/?tipo_ordenamiento=tipo')
+        self.assertEqual(self.generar.call_count, 3)
+
+    def test_errores_no_se_guardan(self):
+        self.generar.side_effect = RuntimeError('sin conexión')
+        self.assertEqual(self.client.get('/api/recomendacion/').status_code, 500)
+        self.generar.side_effect = None
+        self.assertEqual(self.client.get('/api/recomendacion/').status_code, 200)
+        self.assertEqual(self.generar.call_count, 2)
+
+
+class ContextoRecomendacionTests(TestCase):
+    def setUp(self):
+        tipos = [TipoObjeto.objects.create(nombre=f'Tipo {i}') for i in range(5)]
+        items = []
+        for c in range(30):
+            cajon = Cajon.objects.create(nombre=f'Cajón {c}', capacidad_maxima=100)
+            # Cajones chicos (3 objetos) y grandes (40 objetos) alternados
+            for i in range(3 if c % 2 else 40):
+                items.append((len(items), {
+                    'cajon': cajon.id, 'nombre_objeto': f'Objeto {c}-{i}',
+                    'tipo_objeto': tipos[i % 5].id, 'tamanio': 'PE'
+                }))
+        CajonService.agregar_objetos_en_lote(items)
+
+    def test_consultas_fijas(self):
+        with self.assertNumQueries(6):
+            contexto = RecomendacionService.construir_contexto(max_tokens=100000)
+        self.assertIn('• Objeto 1-0 (Tipo: Tipo 0, Tamaño: Pequeño)', contexto)
+        self.assertIn('Tipos contenidos: Tipo 0 x8, Tipo 1 x8, Tipo 2 x8, +2 tipos más', contexto)
+        self.assertIn('Total de objetos: 645', contexto)
+
+    def test_respeta_presupuesto_de_tokens(self):
+        contexto = RecomendacionService.construir_contexto(max_tokens=500)
+        self.assertLessEqual(len(contexto), 500 * 4)
+        self.assertIn('cajones más con', contexto)
+        self.assertIn('=== ESTADÍSTICAS GENERALES ===', contexto)
+
+
+@override_settings(RECOMENDACIONES_MODELO='local')
+class TrabajosRecomendacionTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        caches[RecomendacionService.cache_alias].clear()
+        Cajon.objects.create(nombre='Depósito', capacidad_maxima=5)
+
+    @override_settings(RECOMENDACIONES_TRABAJOS_SINCRONOS=True)
+    def test_enviar_y_consultar(self):
+        response = self.client.post('/api/recomendacion/trabajos/', {'tipo_ordenamiento': 'mixto'}, format='json')
+        self.assertEqual(response.status_code, 202)
+        response = self.client.get(f"/api/recomendacion/trabajos/{response.data['id']}/")
+        self.assertEqual(response.data['estado'], 'completado')
+        self.assertEqual(len(response.data['recomendaciones']), 3)
+        self.assertIn('criterio mixto', response.data['recomendaciones'][0])
+
+    def test_criterio_invalido(self):
+        response = self.client.post('/api/recomendacion/trabajos/', {'tipo_ordenamiento': 'color'}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_trabajo_inexistente(self):
+        self.assertEqual(self.client.get('/api/recomendacion/trabajos/999/').status_code, 404)
+
+    @override_settings(RECOMENDACIONES_TRABAJOS_MAX_EN_COLA=1)
+    def test_transaccion_revertida_no_ocupa_lugar_en_la_cola(self):
+        for _ in range(3):
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                trabajos.encolar('tipo')
+                raise RuntimeError
+        self.assertEqual(trabajos._en_cola, 0)
+        with self.captureOnCommitCallbacks() as callbacks:
+            trabajos.encolar('tipo')
+        self.assertEqual(len(callbacks), 1)
+
+    def test_alta_simultanea_devuelve_el_trabajo_existente(self):
+        existente = RecomendacionTrabajo.objects.create(tipo_ordenamiento='mixto')
+        activo = trabajos._activo
+        consultas = []
+
+        def activo_tardio(tipo_ordenamiento):
+            # La primera consulta no ve el trabajo que otro request acaba de crear
+            consultas.append(tipo_ordenamiento)
+            return None if len(consultas) == 1 else activo(tipo_ordenamiento)
+
+        with mock.patch.object(trabajos, '_activo', activo_tardio):
+            trabajo = trabajos.encolar('mixto')
+        self.assertEqual(trabajo, existente)
+        self.assertEqual(RecomendacionTrabajo.objects.count(), 1)
+
+    def test_conflicto_sin_trabajo_activo_responde_503(self):
+        RecomendacionTrabajo.objects.create(tipo_ordenamiento='mixto')
+        # El alta choca con el trabajo activo, pero este ya no aparece al buscarlo
+        with mock.patch.object(trabajos, '_activo', return_value=None):
+            response = self.client.post('/api/recomendacion/trabajos/', {'tipo_ordenamiento': 'mixto'}, format='json')
+        self.assertEqual(response.status_code, 503)
+        self.assertIn('error', response.data)
+
+    @override_settings(RECOMENDACIONES_TRABAJOS_TIMEOUT=60)
+    def test_trabajo_interrumpido_se_reemplaza(self):
+        viejo = RecomendacionTrabajo.objects.create(tipo_ordenamiento='tipo')
+        RecomendacionTrabajo.objects.filter(pk=viejo.pk).update(
+            fecha_actualizacion=timezone.now() - timedelta(minutes=5)
+        )
+        with self.captureOnCommitCallbacks():
+            nuevo = trabajos.encolar('tipo')
+        self.assertNotEqual(nuevo.pk, viejo.pk)
+        viejo.refresh_from_db()
+        self.assertEqual(viejo.estado, 'error')
+
+
+@override_settings(RECOMENDACIONES_MODELO='local')
+class TrabajosRecomendacionPoolTests(TransactionTestCase):
+    def test_se_completa_en_segundo_plano(self):
+        client = APIClient()
+        caches[RecomendacionService.cache_alias].clear()
+        response = client.post('/api/recomendacion/trabajos/', {'tipo_ordenamiento': 'tipo'}, format='json')
+        self.assertEqual(response.status_code, 202)
+        url = f"/api/recomendacion/trabajos/{response.data['id']}/"
+        for _ in range(200):
+            response = client.get(url)
+            if response.data['estado'] in ('completado', 'error'):
+                break
+            time.sleep(0.01)
+        self.assertEqual(response.data['estado'], 'completado')
+
+
+class PlanificadorTests(TestCase):
+    def verificar_plan(self, objetos, capacidades, movimientos):
+        ubicacion = {objeto_id: (cajon_id, grupo) for objeto_id, cajon_id, grupo in objetos}
+        for objeto_id, origen, destino in movimientos:
+            self.assertEqual(ubicacion[objeto_id][0], origen)
+            ubicacion[objeto_id] = (destino, ubicacion[objeto_id][1])
+        ocupacion = {}
+        for cajon_id, _ in ubicacion.values():
+            ocupacion[cajon_id] = ocupacion.get(cajon_id, 0) + 1
+        for cajon_id, cantidad in ocupacion.items():
+            self.assertLessEqual(cantidad, capacidades[cajon_id])
+        return ubicacion
+
+    def test_agrupa_con_minimos_movimientos(self):
+        # Cajón 1: 3 herramientas y 1 cable; cajón 2: 2 cables y 1 herramienta
+        objetos = [(1, 1, 'h'), (2, 1, 'h'), (3, 1, 'h'), (4, 1, 'c'), (5, 2, 'c'), (6, 2, 'c'), (7, 2, 'h')]
+        capacidades = {1: 4, 2: 4}
+        movimientos, hogares = PlanificadorService.planificar(objetos, capacidades)
+        self.assertEqual(hogares, {1: 'h', 2: 'c'})
+        self.assertEqual(movimientos, [(4, 1, 2), (7, 2, 1)])
+        self.verificar_plan(objetos, capacidades, movimientos)
+
+    def test_respeta_capacidad_si_no_todo_entra(self):
+        objetos = [(i, 1, 'h') for i in range(1, 5)] + [(i, 2, 'c') for i in range(5, 8)] + [(8, 2, 'h')]
+        capacidades = {1: 4, 2: 4}
+        movimientos, _ = PlanificadorService.planificar(objetos, capacidades)
+        # La herramienta del cajón 2 no tiene lugar en el cajón 1, se queda
+        self.assertEqual(movimientos, [])
+        self.verificar_plan(objetos, capacidades, movimientos)
+
+    def test_usa_cajones_vacios(self):
+        objetos = [(1, 1, 'h'), (2, 1, 'c'), (3, 1, 'h'), (4, 1, 'c')]
+        capacidades = {1: 4, 2: 2}
+        movimientos, hogares = PlanificadorService.planificar(objetos, capacidades)
+        self.assertEqual(hogares, {1: 'c', 2: 'h'})
+        self.assertEqual(len(movimientos), 2)
+        ubicacion = self.verificar_plan(objetos, capacidades, movimientos)
+        self.assertEqual({cajon for cajon, grupo in ubicacion.values() if grupo == 'h'}, {2})
+
+    def test_cien_mil_objetos(self):
+        aleatorio = random.Random(7)
+        # 500 cajones con 200 objetos cada uno, ocupados entre la mitad y el 80 %
+        capacidades = {cajon_id: aleatorio.randint(250, 400) for cajon_id in range(1, 501)}
+        objetos = [
+            (cajon_id * 200 + i, cajon_id, (aleatorio.randrange(40), aleatorio.choice('PMG')))
+            for cajon_id in capacidades
+            for i in range(200)
+        ]
+        self.assertEqual(len(objetos), 100000)
+        movimientos, _ = PlanificadorService.planificar(objetos, capacidades)
+        self.assertEqual(PlanificadorService.planificar(objetos, capacidades)[0], movimientos)
+        self.verificar_plan(objetos, capacidades, movimientos)
+
+    def test_vista_modo_local(self):
+        herramienta = TipoObjeto.objects.create(nombre='Herramienta')
+        cable = TipoObjeto.objects.create(nombre='Cable')
+        cajon_a = Cajon.objects.create(nombre='A', capacidad_maxima=3)
+        cajon_b = Cajon.objects.create(nombre='B', capacidad_maxima=3)
+        for cajon, tipos in ((cajon_a, [herramienta, herramienta, cable]), (cajon_b, [cable, cable, herramienta])):
+            for i, tipo in enumerate(tipos):
+                CajonService.agregar_objeto_a_cajon(cajon.id, f'{tipo.nombre} {i}', tipo.id, 'PE')
+        client = APIClient()
+        response = client.get('/api/recomendacion/', {'tipo_ordenamiento': 'tipo', 'modo': 'local'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['modo'], 'local')
+        self.assertEqual(response.data['plan']['total_movimientos'], 2)
+        self.assertEqual(len(response.data['recomendaciones']), 3)
+
+        # El plan se puede aplicar tal cual con el endpoint de movimientos
+        response = client.post('/api/objetos/mover/', {'movimientos': response.data['plan']['movimientos']}, format='json')
+        self.assertEqual(response.status_code, 200)
+        response = client.get('/api/recomendacion/', {'tipo_ordenamiento': 'tipo', 'modo': 'local'})
+        self.assertEqual(response.data['plan']['total_movimientos'], 0)
+
+        response = client.get('/api/recomendacion/', {'tipo_ordenamiento': 'color', 'modo': 'local'})
+        self.assertEqual(response.status_code, 400)
+
+
+class OrdenamientoStreamingTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        herramienta = TipoObjeto.objects.create(nombre='Herramienta')
+        cable = TipoObjeto.objects.create(nombre='Cable')
+        self.cajon = Cajon.objects.create(nombre='A', capacidad_maxima=20)
+        otro = Cajon.objects.create(nombre='B', capacidad_maxima=20)
+        items = []
+        for i, (tipo, tamanio) in enumerate([
+            (herramienta, 'GR'), (cable, 'PE'), (herramienta, 'PE'), (cable, 'ME'), (herramienta, 'PE'), (cable, 'GR')
+        ]):
+            items.append((i, {'cajon': self.cajon.id, 'nombre_objeto': f'Objeto {i}', 'tipo_objeto': tipo.id, 'tamanio': tamanio}))
+        items.append((6, {'cajon': otro.id, 'nombre_objeto': 'Otro', 'tipo_objeto': cable.id, 'tamanio': 'PE'}))
+        CajonService.agregar_objetos_en_lote(items)
+
+    def obtener(self, **params):
+        response = self.client.get('/api/ordenamiento/', params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return json.loads(b''.join(response.streaming_content))
+
+    def test_por_tipo(self):
+        datos = self.obtener(tipo_ordenamiento='tipo', cajon_id=self.cajon.id)
+        self.assertEqual(datos['cajon_id'], self.cajon.id)
+        self.assertEqual([(g['tipo'], g['cantidad']) for g in datos['resultado']], [('Cable', 3), ('Herramienta', 3)])
+        objeto = datos['resultado'][0]['objetos'][0]
+        self.assertEqual(set(objeto), {'id', 'nombre_objeto', 'tamanio', 'cajon', 'tipo_objeto'})
+        self.assertEqual(objeto['nombre_objeto'], 'Objeto 1')
+
+    def test_por_tamanio_en_orden_de_rango(self):
+        datos = self.obtener(tipo_ordenamiento='tamanio')
+        self.assertEqual([(g['tamanio'], g['cantidad']) for g in datos['resultado']],
+                         [('Pequeño', 3 + 1), ('Mediano', 1), ('Grande', 2)])
+
+    def test_mixto_con_limite(self):
+        datos = self.obtener(tipo_ordenamiento='mixto', limite=1)
+        grupos = [(g['tipo'], g['tamanio'], g['cantidad'], len(g['objetos'])) for g in datos['resultado']]
+        self.assertEqual(grupos, [
+            ('Cable', 'Pequeño', 2, 1), ('Cable', 'Mediano', 1, 1), ('Cable', 'Grande', 1, 1),
+            ('Herramienta', 'Pequeño', 2, 1), ('Herramienta', 'Grande', 1, 1),
+        ])
+
+    def test_parametros_invalidos(self):
+        self.assertEqual(self.client.get('/api/ordenamiento/', {'tipo_ordenamiento': 'color'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/ordenamiento/', {'limite': '0'}).status_code, 400)
+
+    def test_consultas_fijas(self):
+        grupos = OrdenamientoService.ordenar_mixto()
+        with self.assertNumQueries(2):
+            total = sum(len(list(grupo['objetos'])) for grupo in grupos)
+        self.assertEqual(total, 7)
+
+
+class ExportacionTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        tipo = TipoObjeto.objects.create(nombre='Herramienta')
+        self.cajon = Cajon.objects.create(nombre='Cajón "A", arriba', capacidad_maxima=10)
+        otro = Cajon.objects.create(nombre='B', capacidad_maxima=10)
+        CajonService.agregar_objetos_en_lote([
+            (0, {'cajon': self.cajon.id, 'nombre_objeto': 'Martillo', 'tipo_objeto': tipo.id, 'tamanio': 'GR'}),
+            (1, {'cajon': self.cajon.id, 'nombre_objeto': 'Llave', 'tipo_objeto': tipo.id, 'tamanio': 'PE'}),
+            (2, {'cajon': otro.id, 'nombre_objeto': 'Tornillo', 'tipo_objeto': tipo.id, 'tamanio': 'PE'}),
+        ])
+
+    def test_objetos_ndjson(self):
+        response = self.client.get('/api/exportar/objetos/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        filas = [json.loads(linea) for linea in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([fila['nombre_objeto'] for fila in filas], ['Martillo', 'Llave', 'Tornillo'])
+        self.assertEqual(filas[0]['cajon_nombre'], 'Cajón "A", arriba')
+        self.assertEqual(filas[0]['tipo_objeto_nombre'], 'Herramienta')
+
+    def test_historial_csv_filtrado(self):
+        response = self.client.get('/api/exportar/historial/', {'formato': 'csv', 'cajon_id': self.cajon.id})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('historial.csv', response['Content-Disposition'])
+        filas = list(csv.reader(io.StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual(filas[0], ['id', 'cajon', 'cajon_nombre', 'fecha', 'accion', 'descripcion'])
+        self.assertEqual(len(filas), 3)
+        self.assertEqual(filas[1][2], 'Cajón "A", arriba')
+
+    def test_acepta_el_formato_que_pide_el_cliente(self):
+        for formato, accept in [('csv', 'text/csv'), ('ndjson', 'application/x-ndjson')]:
+            response = self.client.get('/api/exportar/objetos/', {'formato': formato}, HTTP_ACCEPT=accept)
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response['Content-Type'].startswith(accept))
+        response = self.client.get('/api/exportar/objetos/', {'formato': 'xml'}, HTTP_ACCEPT='text/csv')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('error', response.json())
+
+    def test_una_consulta_en_fragmentos(self):
+        from .exportacion import respuesta_exportacion
+        response = respuesta_exportacion(
+            CajonObjeto.objects.order_by('id'), ExportacionObjetosView.campos, 'ndjson', 'objetos',
+            filas_por_fragmento=2
+        )
+        with self.assertNumQueries(1):
+            fragmentos = list(response.streaming_content)
+        self.assertEqual([fragmento.count(b'\n') for fragmento in fragmentos], [2, 1])
+
+    def test_formato_invalido(self):
+        self.assertEqual(self.client.get('/api/exportar/objetos/', {'formato': 'xml'}).status_code, 400)
+
+
+class SerializacionRapidaTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.tipo = TipoObjeto.objects.create(nombre='Herramienta')
+        self.cajon = Cajon.objects.create(nombre='A', capacidad_maxima=10)
+        CajonService.agregar_objetos_en_lote([
+            (i, {'cajon': self.cajon.id, 'nombre_objeto': f'Objeto {i}', 'tipo_objeto': self.tipo.id, 'tamanio': 'ME'})
+            for i in range(3)
+        ])
+
+    def test_mismos_campos_que_model_serializer(self):
+        from .serializers import (
+            CajonHistorialFilasSerializer, CajonHistorialSerializer, CajonObjetoFilasSerializer, CajonObjetoSerializer
+        )
+        objetos = CajonObjeto.objects.order_by('id')
+        rapidos = CajonObjetoFilasSerializer(CajonObjetoFilasSerializer.preparar(objetos), many=True).data
+        for rapido, completo in zip(rapidos, CajonObjetoSerializer(objetos, many=True).data):
+            self.assertEqual(rapido['tipo_objeto'], {'id': completo['tipo_objeto'], 'nombre': 'Herramienta'})
+            self.assertEqual({**rapido, 'tipo_objeto': completo['tipo_objeto']}, dict(completo))
+
+        historial = CajonHistorial.objects.order_by('id')
+        rapidos = CajonHistorialFilasSerializer(CajonHistorialFilasSerializer.preparar(historial), many=True).data
+        self.assertEqual(rapidos, [dict(fila) for fila in CajonHistorialSerializer(historial, many=True).data])
+
+    def test_listados_en_una_consulta(self):
+        # La página más la lectura de versiones para el ETag
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/objetos/', {'page_size': 2})
+        self.assertEqual(response.data['results'][0]['tipo_objeto'], {'id': self.tipo.id, 'nombre': 'Herramienta'})
+        response = self.client.get(response.data['next'])
+        self.assertEqual([fila['nombre_objeto'] for fila in response.data['results']], ['Objeto 2'])
+
+        response = self.client.get(f'/api/cajones/{self.cajon.id}/historial/', {'page_size': 2})
+        self.assertEqual(len(response.data['results']), 2)
+        response = self.client.get(response.data['next'])
+        self.assertEqual(len(response.data['results']), 1)
+
+    def test_objetos_ordenados_incluyen_tipo(self):
+        response = self.client.get(f'/api/cajones/{self.cajon.id}/objetos-ordenados/', {'ordenamiento': 'tamanio'})
+        self.assertEqual(response.data['total_objetos'], 3)
+        self.assertEqual(response.data['objetos'][0]['tipo_objeto']['nombre'], 'Herramienta')
+
+
+class ListadoOcupacionTests(TestCase):
+    def test_ocupacion_en_una_consulta(self):
+        tipo = TipoObjeto.objects.create(nombre='Herramienta')
+        lleno = Cajon.objects.create(nombre='A', capacidad_maxima=4)
+        Cajon.objects.create(nombre='B', capacidad_maxima=0)
+        CajonService.agregar_objetos_en_lote([
+            (i, {'cajon': lleno.id, 'nombre_objeto': f'Objeto {i}', 'tipo_objeto': tipo.id, 'tamanio': 'PE'})
+            for i in range(3)
+        ])
+        client = APIClient()
+        # El listado más la lectura de versiones para el ETag
+        with self.assertNumQueries(2):
+            response = client.get('/api/cajones/', {'ocupacion': '1'})
+        a, b = sorted(response.data, key=lambda cajon: cajon['id'])
+        self.assertEqual(
+            (a['objetos_actuales'], a['capacidad_disponible'], a['porcentaje_ocupacion']), (3, 1, 75.0)
+        )
+        self.assertEqual(b['porcentaje_ocupacion'], 0.0)
+        capacidad = client.get(f"/api/cajones/{a['id']}/capacidad/").data
+        for campo in ('objetos_actuales', 'capacidad_disponible', 'porcentaje_ocupacion'):
+            self.assertEqual(a[campo], capacidad[campo])
+
+        self.assertNotIn('objetos_actuales', client.get('/api/cajones/').data[0])
+
+
+class GetCondicionalTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.tipo = TipoObjeto.objects.create(nombre='Herramienta')
+        self.cajon = Cajon.objects.create(nombre='A', capacidad_maxima=10)
+
+    def test_304_sin_consulta_principal(self):
+        response = self.client.get('/api/cajones/')
+        etag = response['ETag']
+        self.assertTrue(response.has_header('Last-Modified'))
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/cajones/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_escrituras_cambian_el_etag(self):
+        url_objetos = f'/api/cajones/{self.cajon.id}/objetos/'
+        url_historial = f'/api/cajones/{self.cajon.id}/historial/'
+        etags = {url: self.client.get(url)['ETag'] for url in (url_objetos, url_historial, '/api/tipos-objeto/')}
+
+        CajonService.agregar_objeto_a_cajon(self.cajon.id, 'Martillo', self.tipo.id, 'PE')
+        for url in (url_objetos, url_historial):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etags[url])
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.data['results']), 1)
+        response = self.client.get('/api/tipos-objeto/', HTTP_IF_NONE_MATCH=etags['/api/tipos-objeto/'])
+        self.assertEqual(response.status_code, 304)
+
+        # Las escrituras en bloque también actualizan la versión del historial
+        etag = self.client.get(url_historial)['ETag']
+        CajonService.agregar_objetos_en_lote([
+            (0, {'cajon': self.cajon.id, 'nombre_objeto': 'Llave', 'tipo_objeto': self.tipo.id, 'tamanio': 'PE'})
+        ])
+        self.assertEqual(self.client.get(url_historial, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_errores_no_llevan_etag(self):
+        response = self.client.get('/api/cajones/999/capacidad/')
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(response.has_header('ETag'))
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', 'Los planes de consulta se verifican con SQLite')
+class PlanesDeConsultaTests(TestCase):
+    """Las consultas frecuentes deben usar índices y no recorrer tablas completas"""
+
+    @classmethod
+    def setUpTestData(cls):
+        tipos = TipoObjeto.objects.bulk_create(TipoObjeto(nombre=f'Tipo {i}') for i in range(20))
+        cajones = Cajon.objects.bulk_create(Cajon(nombre=f'Cajón {i}', capacidad_maxima=500) for i in range(50))
+        tamanios = CajonObjeto.CajonTamanio.values
+        CajonObjeto.objects.bulk_create(
+            CajonObjeto(
+                cajon=cajones[i % 50], nombre_objeto=f'Objeto {i}',
+                tipo_objeto=tipos[i % 20], tamanio=tamanios[i % 3]
+            )
+            for i in range(5000)
+        )
+        CajonHistorial.objects.bulk_create(
+            CajonHistorial(cajon=cajones[i % 50], accion='objeto_agregado') for i in range(5000)
+        )
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        cls.cajon = cajones[7]
+        cls.tipo = tipos[3]
+
+    def plan(self, queryset):
+        sql, params = queryset.query.get_compiler(using=queryset.db).as_sql()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            return [fila[-1] for fila in cursor.fetchall()]
+
+    def assertUsaIndice(self, queryset, ordenado=False):
+        plan = self.plan(queryset)
+        for paso in plan:
+            self.assertIsNone(re.fullmatch(r'SCAN \S+', paso), f'Recorre la tabla completa: {plan}')
+            if ordenado:
+                self.assertNotIn('TEMP B-TREE', paso, f'Ordena sin índice: {plan}')
+        return plan
+
+    def test_historial_de_un_cajon(self):
+        historial = CajonHistorial.objects.filter(cajon=self.cajon).order_by('-fecha', '-id')
+        plan = self.assertUsaIndice(historial[:51], ordenado=True)
+        self.assertIn('historial_cajon_fecha_idx', ' '.join(plan))
+
+        ultimo = historial[50]
+        siguiente = historial.filter(HistorialPagination().filtro_siguiente([ultimo.fecha, ultimo.id]))
+        self.assertUsaIndice(siguiente[:51], ordenado=True)
+
+    def test_historial_general(self):
+        self.assertUsaIndice(CajonHistorial.objects.order_by('-fecha', '-id')[:51], ordenado=True)
+
+    def test_objetos_por_cajon(self):
+        self.assertUsaIndice(CajonObjeto.objects.filter(cajon=self.cajon).order_by('id')[:51], ordenado=True)
+        self.assertUsaIndice(CajonObjeto.objects.filter(cajon=self.cajon, tamanio='ME'))
+
+    def test_objetos_por_tipo_y_tamanio(self):
+        plan = self.assertUsaIndice(CajonObjeto.objects.filter(tipo_objeto=self.tipo, tamanio='GR'))
+        self.assertIn('objeto_tipo_tamanio_idx', ' '.join(plan))
+
+    def test_busqueda_de_duplicados(self):
+        duplicados = CajonObjeto.objects.filter(nombre_objeto='Objeto 42', tipo_objeto=self.tipo, tamanio='PE')
+        plan = self.assertUsaIndice(duplicados)
+        self.assertIn('objeto_nombre_tipo_tamanio_idx', ' '.join(plan))
+
+    def test_estadisticas_de_un_cajon(self):
+        estadisticas = (
+            CajonObjeto.objects.filter(cajon_id__in=[self.cajon.id])
+            .values_list('cajon_id', 'tamanio', 'tipo_objeto__nombre')
+            .annotate(total=Count('id'))
+        )
+        self.assertUsaIndice(estadisticas)
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', 'El índice de texto completo usa SQLite FTS5')
+class BusquedaTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.herramienta = TipoObjeto.objects.create(nombre='Herramienta', descripcion='Para reparaciones')
+        self.cocina = TipoObjeto.objects.create(nombre='Cocina', descripcion='Utensilios')
+        self.taller = Cajon.objects.create(nombre='Taller', capacidad_maxima=10)
+        self.alacena = Cajon.objects.create(nombre='Alacena', capacidad_maxima=10)
+        self.martillo = CajonService.agregar_objeto_a_cajon(self.taller.id, 'Martillo de carpintero', self.herramienta.id, 'ME')
+        CajonService.agregar_objetos_en_lote([
+            (0, {'cajon': self.alacena.id, 'nombre_objeto': 'Cuchara de madera', 'tipo_objeto': self.cocina.id, 'tamanio': 'PE'}),
+            (1, {'cajon': self.taller.id, 'nombre_objeto': 'Llave inglesa', 'tipo_objeto': self.herramienta.id, 'tamanio': 'PE'}),
+        ])
+
+    def buscar(self, q, **params):
+        response = self.client.get('/api/buscar/', {'q': q, **params})
+        self.assertEqual(response.status_code, 200)
+        return [resultado['nombre_objeto'] for resultado in response.data['resultados']]
+
+    def test_prefijo_y_datos_del_cajon(self):
+        response = self.client.get('/api/buscar/', {'q': 'mart'})
+        resultado, = response.data['resultados']
+        self.assertEqual(resultado['cajon'], {'id': self.taller.id, 'nombre': 'Taller'})
+        self.assertEqual(resultado['tipo_objeto'], {'id': self.herramienta.id, 'nombre': 'Herramienta'})
+
+    def test_relevancia_y_campos_del_tipo(self):
+        # "herramienta" coincide por tipo en dos objetos; "reparación" solo por descripción
+        self.assertEqual(set(self.buscar('herramienta')), {'Martillo de carpintero', 'Llave inglesa'})
+        self.assertEqual(len(self.buscar('reparacion')), 2)
+        # Un objeto cuyo nombre coincide va antes que uno que solo coincide por tipo
+        CajonService.agregar_objeto_a_cajon(self.alacena.id, 'Cocina portátil', self.herramienta.id, 'GR')
+        self.assertEqual(self.buscar('cocina')[0], 'Cocina portátil')
+        self.assertEqual(self.buscar('cuchara madera'), ['Cuchara de madera'])
+
+    def test_dentro_de_un_cajon(self):
+        CajonService.agregar_objeto_a_cajon(self.alacena.id, 'Cocina portátil', self.herramienta.id, 'GR')
+        CajonService.agregar_objeto_a_cajon(self.alacena.id, 'Sartén', self.cocina.id, 'ME')
+        CajonService.agregar_objeto_a_cajon(self.taller.id, 'Manual de cocina', self.herramienta.id, 'PE')
+        # Mismo orden que sin cajón: primero el nombre que coincide, sin importar acentos
+        resultados = self.buscar('cocina', cajon_id=self.alacena.id)
+        self.assertEqual(resultados[0], 'Cocina portátil')
+        self.assertEqual(set(resultados), {'Cocina portátil', 'Cuchara de madera', 'Sartén'})
+        self.assertEqual(self.buscar('sarten', cajon_id=self.alacena.id), ['Sartén'])
+        self.assertEqual(self.buscar('portatil', cajon_id=self.alacena.id), ['Cocina portátil'])
+        self.assertEqual(self.buscar('coc', cajon_id=self.taller.id), ['Manual de cocina'])
+        self.assertEqual(self.buscar('llave', cajon_id=self.alacena.id), [])
+
+    def test_se_mantiene_sincronizado(self):
+        self.client.put(f'/api/objetos/{self.martillo.id}/', {
+            'nombre_objeto': 'Serrucho', 'tipo_objeto': self.herramienta.id, 'tamanio': 'ME', 'cajon': self.taller.id
+        }, format='json')
+        self.assertEqual(self.buscar('martillo'), [])
+        self.assertEqual(self.buscar('serrucho'), ['Serrucho'])
+
+        TipoObjeto.objects.filter(pk=self.cocina.pk).update(nombre='Vajilla')
+        self.assertEqual(self.buscar('vajilla'), ['Cuchara de madera'])
+
+        self.client.delete(f'/api/objetos/{self.martillo.id}/')
+        self.assertEqual(self.buscar('serrucho'), [])
+        self.client.delete(f'/api/tipos-objeto/{self.cocina.id}/')
+        self.assertEqual(self.buscar('cuchara'), [])
+
+    def test_consulta_vacia(self):
+        self.assertEqual(self.client.get('/api/buscar/', {'q': ' "* '}).status_code, 400)
+
+
+class DuplicadosTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        herramienta = TipoObjeto.objects.create(nombre='Herramienta')
+        self.cocina = TipoObjeto.objects.create(nombre='Cocina')
+        self.a = Cajon.objects.create(nombre='A', capacidad_maxima=10)
+        self.b = Cajon.objects.create(nombre='B', capacidad_maxima=10)
+        datos = [
+            (self.a, 'Martillo', herramienta, 'ME'),
+            (self.a, '  martillo ', herramienta, 'ME'),
+            (self.b, 'MARTILLO', herramienta, 'ME'),
+            (self.b, 'Martillo', herramienta, 'GR'),    # otro tamaño
+            (self.a, 'Martillo', self.cocina, 'ME'),    # otro tipo
+            (self.a, 'Cucharón', self.cocina, 'PE'),
+            (self.b, 'cucharon', self.cocina, 'PE'),
+        ]
+        CajonService.agregar_objetos_en_lote([
+            (i, {'cajon': cajon.id, 'nombre_objeto': nombre, 'tipo_objeto': tipo.id, 'tamanio': tamanio})
+            for i, (cajon, nombre, tipo, tamanio) in enumerate(datos)
+        ])
+        self.ids = list(CajonObjeto.objects.order_by('id').values_list('id', flat=True))
+
+    def test_reporte(self):
+        response = self.client.get('/api/objetos/duplicados/')
+        self.assertEqual(response.data['total_grupos'], 2)
+        self.assertEqual(response.data['total_sobrantes'], 3)
+        martillos, cucharones = response.data['grupos']
+        self.assertEqual(martillos['conservar'], self.ids[0])
+        self.assertEqual([objeto['id'] for objeto in martillos['objetos']], self.ids[:3])
+        self.assertEqual(cucharones['tipo_objeto'], {'id': self.cocina.id, 'nombre': 'Cocina'})
+
+        response = self.client.get('/api/objetos/duplicados/', {'mismo_cajon': 'true'})
+        self.assertEqual(response.data['total_sobrantes'], 1)
+
+    def test_eliminar_en_bloque(self):
+        with self.assertNumQueries(9):
+            response = self.client.post('/api/objetos/duplicados/', {}, format='json')
+        self.assertEqual(response.data, {'grupos': 2, 'eliminados': 3})
+        self.assertEqual(
+            list(CajonObjeto.objects.order_by('id').values_list('id', flat=True)),
+            [self.ids[0], self.ids[3], self.ids[4], self.ids[5]]
+        )
+        self.a.refresh_from_db()
+        self.b.refresh_from_db()
+        self.assertEqual((self.a.objetos_count, self.b.objetos_count), (3, 1))
+        self.assertEqual(CajonHistorial.objects.filter(descripcion__contains='duplicado').count(), 3)
+        self.assertEqual(self.client.post('/api/objetos/duplicados/', {}, format='json').data['eliminados'], 0)
+
+
+@override_settings(HISTORIAL_DIFERIDO=True, HISTORIAL_INTERVALO=60)
+class HistorialDiferidoTests(TransactionTestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.cajon = Cajon.objects.create(nombre='Taller', capacidad_maxima=10)
+        self.tipo = TipoObjeto.objects.create(nombre='Herramienta')
+
+    def tearDown(self):
+        bitacora.vaciar()
+
+    def test_se_guarda_en_lote_con_la_fecha_del_cambio(self):
+        for i in range(3):
+            response = self.client.post('/api/objetos/', {
+                'cajon': self.cajon.id, 'nombre_objeto': f'Llave {i}', 'tipo_objeto': self.tipo.id, 'tamanio': 'PE'
+            }, format='json')
+            self.assertEqual(response.status_code, 201)
+        self.assertEqual(CajonHistorial.objects.count(), 0)
+        antes = timezone.now()
+        version = versiones.obtener(CajonHistorial)[CajonHistorial]
+
+        self.assertEqual(bitacora.vaciar(), 3)
+        entradas = list(CajonHistorial.objects.order_by('id'))
+        self.assertEqual([entrada.descripcion for entrada in entradas], [
+            f'Objeto "Llave {i}" agregado al cajón' for i in range(3)
+        ])
+        self.assertTrue(all(entrada.fecha < antes for entrada in entradas))
+        self.assertGreater(versiones.obtener(CajonHistorial)[CajonHistorial], version)
+
+    def test_rollback_descarta_las_entradas(self):
+        with self.assertRaises(ValidationError):
+            with transaction.atomic():
+                bitacora.registrar(cajon=self.cajon, accion='modificado', descripcion='revertido')
+                raise ValidationError('error')
+        self.assertEqual(bitacora.vaciar(), 0)
+
+    def test_cajon_eliminado_antes_de_guardar(self):
+        otro = Cajon.objects.create(nombre='Temporal', capacidad_maxima=1)
+        bitacora.registrar(cajon=self.cajon, accion='modificado', descripcion='queda')
+        bitacora.registrar(cajon=otro, accion='eliminado', descripcion='se descarta')
+        otro.delete()
+        self.assertEqual(bitacora.vaciar(), 1)
+        self.assertEqual(list(CajonHistorial.objects.values_list('descripcion', flat=True)), ['queda'])
+
+    @override_settings(HISTORIAL_LOTE=3)
+    def test_lote_completo_se_guarda_en_segundo_plano(self):
+        for i in range(3):
+            bitacora.registrar(cajon=self.cajon, accion='modificado', descripcion=f'cambio {i}')
+        # Se espera al hilo sin consultar la tabla: la base en memoria de las
+        # pruebas no espera los locks y la lectura fallaría durante el INSERT
+        for _ in range(200):
+            with bitacora._lock:
+                if not bitacora._pendientes:
+                    break
+            time.sleep(0.01)
+        with bitacora._lock_vaciado:
+            pass
+        self.assertEqual(CajonHistorial.objects.count(), 3)
+
+
+class RetencionHistorialTests(TestCase):
+    def setUp(self):
+        self.directorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directorio)
+        self.a = Cajon.objects.create(nombre='A', capacidad_maxima=10)
+        self.b = Cajon.objects.create(nombre='B', capacidad_maxima=10)
+        self.ahora = timezone.now()
+
+    def crear(self, cajon, accion, dias_atras, cantidad=1):
+        entradas = CajonHistorial.objects.bulk_create(
+            CajonHistorial(cajon=cajon, accion=accion, descripcion=f'{accion} {i}') for i in range(cantidad)
+        )
+        CajonHistorial.objects.filter(id__in=[entrada.id for entrada in entradas]).update(
+            fecha=self.ahora - timedelta(days=dias_atras)
+        )
+        return entradas
+
+    def archivar(self):
+        salida = io.StringIO()
+        call_command('archivar_historial', dias=30, directorio=self.directorio, lote=2, stdout=salida)
+        return salida.getvalue()
+
+    def resumen(self):
+        return {
+            (resumen.cajon_id, (self.ahora.date() - resumen.dia).days, resumen.accion): resumen.cantidad
+            for resumen in HistorialResumen.objects.all()
+        }
+
+    def test_archiva_resume_y_elimina_lo_antiguo(self):
+        antiguas = self.crear(self.a, 'modificado', 40, cantidad=3) + self.crear(self.b, 'creado', 31)
+        recientes = self.crear(self.a, 'modificado', 5)
+
+        self.assertIn('4 entradas archivadas', self.archivar())
+        self.assertEqual(list(CajonHistorial.objects.values_list('id', flat=True)), [recientes[0].id])
+        self.assertEqual(self.resumen(), {(self.a.id, 40, 'modificado'): 3, (self.b.id, 31, 'creado'): 1})
+
+        archivos = os.listdir(self.directorio)
+        self.assertEqual(len(archivos), 1)
+        with gzip.open(os.path.join(self.directorio, archivos[0]), 'rt', encoding='utf-8') as archivo:
+            lineas = [json.loads(linea) for linea in archivo]
+        self.assertEqual([linea['id'] for linea in lineas], [entrada.id for entrada in antiguas])
+        self.assertEqual(lineas[0]['cajon_nombre'], 'A')
+        self.assertEqual(lineas[3]['accion'], 'creado')
+
+    def test_ejecuciones_sucesivas_acumulan_el_resumen(self):
+        self.crear(self.a, 'modificado', 40, cantidad=2)
+        self.archivar()
+        self.crear(self.a, 'modificado', 40)
+        self.archivar()
+        self.assertEqual(self.resumen(), {(self.a.id, 40, 'modificado'): 3})
+        self.assertIn('No hay entradas', self.archivar())
+        self.assertEqual(len(os.listdir(self.directorio)), 2)
+
+
+@override_settings(RECOMENDACIONES_MODELO='local')
+class VistasAsincronasTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.cajon = CajonService.crear_cajon('Taller', 10)
+        tipo = TipoObjeto.objects.create(nombre='Herramienta')
+        for nombre in ['Martillo', 'Llave', 'Pinza']:
+            CajonService.agregar_objeto_a_cajon(self.cajon.id, nombre, tipo.id, 'PE')
+        caches[RecomendacionService.cache_alias].clear()
+
+    def comparar(self, vista_async, ruta, params=None, **kwargs):
+        """La variante asíncrona responde lo mismo que la síncrona"""
+        esperada = self.client.get(ruta, params or {})
+        request = AsyncRequestFactory().get(ruta, params or {})
+        response = async_to_sync(vista_async.as_view())(request, **kwargs)
+        self.assertEqual(response.status_code, esperada.status_code)
+        self.assertEqual(json.loads(response.content), esperada.json())
+        self.assertEqual(response.get('ETag'), esperada.get('ETag'))
+        return response
+
+    def test_misma_respuesta_que_las_vistas_sincronas(self):
+        cajon_id = self.cajon.id
+        self.comparar(CajonCapacidadAsyncView, f'/api/cajones/{cajon_id}/capacidad/', cajon_id=cajon_id)
+        self.comparar(CajonCapacidadAsyncView, '/api/cajones/999/capacidad/', cajon_id=999)
+        self.comparar(
+            CajonObjetosAsyncView, f'/api/cajones/{cajon_id}/objetos/', {'page_size': 2}, cajon_id=cajon_id
+        )
+        self.comparar(
+            CajonObjetosAsyncView, f'/api/cajones/{cajon_id}/objetos/', {'cursor': 'x'}, cajon_id=cajon_id
+        )
+        self.comparar(CajonHistorialAsyncView, f'/api/cajones/{cajon_id}/historial/', cajon_id=cajon_id)
+        self.comparar(CajonEstadisticasAsyncView, f'/api/cajones/{cajon_id}/estadisticas/', cajon_id=cajon_id)
+        self.comparar(CajonEstadisticasAsyncView, '/api/cajones/999/estadisticas/', cajon_id=999)
+        self.comparar(EstadisticasAsyncView, '/api/estadisticas/')
+        self.comparar(BusquedaAsyncView, '/api/buscar/', {'q': 'martillo'})
+        self.comparar(BusquedaAsyncView, '/api/buscar/', {'q': 'martillo', 'limite': '0'})
+        self.comparar(RecomendacionAsyncView, '/api/recomendacion/', {'tipo_ordenamiento': 'tamanio'})
+        self.comparar(RecomendacionAsyncView, '/api/recomendacion/', {'tipo_ordenamiento': 'tipo', 'modo': 'local'})
+
+    def test_get_condicional(self):
+        ruta = f'/api/cajones/{self.cajon.id}/capacidad/'
+        vista = CajonCapacidadAsyncView.as_view()
+        etag = async_to_sync(vista)(AsyncRequestFactory().get(ruta), cajon_id=self.cajon.id)['ETag']
+        request = AsyncRequestFactory().get(ruta, headers={'If-None-Match': etag})
+        self.assertEqual(async_to_sync(vista)(request, cajon_id=self.cajon.id).status_code, 304)
+
+    async def test_recomendaciones_concurrentes_no_se_esperan_entre_si(self):
+        llamadas = []
+        sin_esperar_a_las_demas = []
+        todas_adentro = asyncio.Event()
+
+        async def modelo_lento(modelo, prompt):
+            # Ninguna llamada termina hasta que las cinco están en curso: si las
+            # vistas se ejecutaran de a una, la primera nunca vería a las demás
+            llamadas.append(prompt)
+            if len(llamadas) == 5:
+                todas_adentro.set()
+            try:
+                await asyncio.wait_for(todas_adentro.wait(), timeout=5)
+            except asyncio.TimeoutError:
+                sin_esperar_a_las_demas.append(prompt)
+            return ModeloLocal.generate_content(modelo, prompt)
+
+        vista = RecomendacionAsyncView.as_view()
+        with mock.patch.object(ModeloLocal, 'generate_content_async', modelo_lento):
+            respuestas = await asyncio.gather(*[
+                vista(AsyncRequestFactory().get('/api/recomendacion/')) for _ in range(5)
+            ])
+        self.assertEqual(len(llamadas), 5)
+        self.assertEqual(sin_esperar_a_las_demas, [])
+        self.assertTrue(all(response.status_code == 200 for response in respuestas))
+
+
+@override_settings(HISTORIAL_EVENTOS_INTERVALO=0.01, HISTORIAL_EVENTOS_KEEPALIVE=0.05)
+class EventosHistorialTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.taller = CajonService.crear_cajon('Taller', 10)
+        self.cocina = CajonService.crear_cajon('Cocina', 10)
+        self.tipo = TipoObjeto.objects.create(nombre='Herramienta')
+
+    @staticmethod
+    def ids(bloque):
+        return [int(linea[4:]) for linea in bloque.split('\n') if linea.startswith('id: ')]
+
+    def test_envia_solo_las_entradas_nuevas(self):
+        response = self.client.get('/api/historial/eventos/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertEqual(response['Cache-Control'], 'no-cache')
+        flujo = iter(response.streaming_content)
+        self.assertTrue(next(flujo).decode().startswith('retry: '))
+        CajonService.agregar_objeto_a_cajon(self.taller.id, 'Martillo', self.tipo.id, 'PE')
+        bloque = next(flujo).decode()
+        entrada = CajonHistorial.objects.latest('id')
+        self.assertEqual(self.ids(bloque), [entrada.id])
+        self.assertIn('event: historial', bloque)
+        datos = json.loads(bloque.split('data: ', 1)[1].split('\n', 1)[0])
+        self.assertEqual(datos['cajon'], self.taller.id)
+        self.assertEqual(datos['descripcion'], entrada.descripcion)
+        # Sin cambios solo se envía el comentario para mantener la conexión
+        self.assertEqual(next(flujo).decode(), ': ping\n\n')
+
+    def test_reanuda_desde_last_event_id_y_filtra_por_cajon(self):
+        CajonService.agregar_objeto_a_cajon(self.taller.id, 'Martillo', self.tipo.id, 'PE')
+        CajonService.agregar_objeto_a_cajon(self.cocina.id, 'Cuchara', self.tipo.id, 'PE')
+        CajonService.agregar_objeto_a_cajon(self.taller.id, 'Llave', self.tipo.id, 'PE')
+        primera = CajonHistorial.objects.order_by('id').first()
+        del_taller = list(
+            CajonHistorial.objects.filter(cajon=self.taller, id__gt=primera.id).values_list('id', flat=True)
+        )
+        response = self.client.get(
+            '/api/historial/eventos/', {'cajon_id': self.taller.id},
+            headers={'Last-Event-ID': str(primera.id)}
+        )
+        flujo = iter(response.streaming_content)
+        next(flujo)
+        self.assertEqual(self.ids(next(flujo).decode()), del_taller)
+
+    def test_entrada_confirmada_fuera_de_orden(self):
+        for nombre in ('Martillo', 'Llave', 'Pinza'):
+            CajonService.agregar_objeto_a_cajon(self.taller.id, nombre, self.tipo.id, 'PE')
+        primera, tardia, ultima = CajonHistorial.objects.filter(cajon=self.taller).order_by('-id')[:3][::-1]
+        CajonHistorial.objects.filter(pk=tardia.pk).delete()
+        response = self.client.get('/api/historial/eventos/', {'desde': primera.id - 1})
+        flujo = iter(response.streaming_content)
+        next(flujo)
+        self.assertEqual(self.ids(next(flujo).decode()), [primera.id, ultima.id])
+
+        # Una transacción que tomó un id menor se confirma después
+        with transaction.atomic():
+            tardia.save(force_insert=True)
+            versiones.incrementar(CajonHistorial)
+        bloque = next(flujo).decode()
+        # Se envía una vez, sin retroceder el id de reconexión
+        self.assertEqual(self.ids(bloque), [ultima.id])
+        self.assertEqual(json.loads(bloque.split('data: ', 1)[1].split('\n', 1)[0])['id'], tardia.id)
+        self.assertEqual(next(flujo).decode(), ': ping\n\n')
+
+    def test_parametros_invalidos(self):
+        for params, headers in [
+            ({'desde': 'x'}, {}), ({'desde': '-1'}, {}), ({'cajon_id': '0'}, {}), ({}, {'Last-Event-ID': 'abc'})
+        ]:
+            response = self.client.get('/api/historial/eventos/', params, headers=headers)
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('error', response.json())
+        response = self.client.get('/api/historial/eventos/', {'cajon_id': 999})
+        self.assertEqual(response.status_code, 404)
+
+    async def test_vista_asincrona(self):
+        await sync_to_async(CajonService.agregar_objeto_a_cajon)(self.taller.id, 'Martillo', self.tipo.id, 'PE')
+        vista = HistorialEventosAsyncView.as_view()
+        request = AsyncRequestFactory().get('/api/historial/eventos/', {'desde': 0, 'cajon_id': self.taller.id})
+        response = await vista(request)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        flujo = aiter(response.streaming_content)
+        self.assertTrue((await anext(flujo)).decode().startswith('retry: '))
+        anteriores = [entrada.id async for entrada in CajonHistorial.objects.filter(cajon=self.taller).order_by('id')]
+        self.assertEqual(self.ids((await anext(flujo)).decode()), anteriores)
+        # Una entrada nueva llega por el aviso del vigía, sin esperar al keepalive
+        await sync_to_async(CajonService.agregar_objeto_a_cajon)(self.taller.id, 'Llave', self.tipo.id, 'PE')
+        bloque = (await asyncio.wait_for(anext(flujo), timeout=1)).decode()
+        ultima = await CajonHistorial.objects.alatest('id')
+        if bloque.startswith(': ping'):
+            bloque = (await asyncio.wait_for(anext(flujo), timeout=1)).decode()
+        self.assertEqual(self.ids(bloque), [ultima.id])
+        await flujo.aclose()
+
+        request = AsyncRequestFactory().get('/api/historial/eventos/', {'cajon_id': 'x'})
+        self.assertEqual((await vista(request)).status_code, 400)
+
+
+class InstrumentacionTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        tipos = [TipoObjeto.objects.create(nombre=f'Tipo {i}') for i in range(3)]
+        self.cajones = [CajonService.crear_cajon(f'Cajón {i}', 30) for i in range(3)]
+        for cajon in self.cajones:
+            for i in range(12):
+                CajonService.agregar_objeto_a_cajon(cajon.id, f'Objeto {i}', tipos[i % 3].id, 'PE')
+
+    @staticmethod
+    def metricas(response):
+        return {
+            metrica.split(';')[0]: metrica
+            for metrica in response['Server-Timing'].split(', ')
+        }
+
+    def test_server_timing(self):
+        response = self.client.get('/api/estadisticas/')
+        metricas = self.metricas(response)
+        self.assertIn('desc="3 consultas"', metricas['db'])
+        self.assertRegex(metricas['serializacion'], r'^serializacion;dur=\d+\.\d$')
+        self.assertIn('total', metricas)
+
+    def test_server_timing_vistas_asincronas(self):
+        # Las consultas de sync_to_async se ejecutan en otro hilo y también se cuentan
+        middleware = instrumentacion.InstrumentacionMiddleware(EstadisticasAsyncView.as_view())
+        response = async_to_sync(middleware)(AsyncRequestFactory().get('/api/estadisticas/'))
+        self.assertIn('desc="3 consultas"', self.metricas(response)['db'])
+
+    @override_settings(INSTRUMENTACION_ESTRICTA=True, INSTRUMENTACION_MAX_CONSULTAS=4)
+    def test_lecturas_dentro_del_presupuesto(self):
+        cajon_id = self.cajones[0].id
+        for ruta in [
+            '/api/cajones/', f'/api/cajones/{cajon_id}/', '/api/objetos/', '/api/tipos-objeto/',
+            '/api/historial/', f'/api/cajones/{cajon_id}/objetos/', f'/api/cajones/{cajon_id}/historial/',
+            f'/api/cajones/{cajon_id}/capacidad/', f'/api/cajones/{cajon_id}/estadisticas/',
+            '/api/estadisticas/', '/api/buscar/?q=objeto', f'/api/cajones/{cajon_id}/objetos-ordenados/',
+            '/api/recomendacion/?modo=local', '/api/objetos/duplicados/',
+        ]:
+            with self.subTest(ruta=ruta):
+                self.assertEqual(self.client.get(ruta).status_code, 200)
+
+    def test_detecta_consultas_repetidas(self):
+        def vista_n_mas_1(request):
+            objetos = list(CajonObjeto.objects.all())
+            return JsonResponse({'tipos': [objeto.tipo_objeto.nombre for objeto in objetos]})
+
+        middleware = instrumentacion.InstrumentacionMiddleware(vista_n_mas_1)
+        request = RequestFactory().get('/api/objetos/')
+        with override_settings(INSTRUMENTACION_ESTRICTA=False), \
+                self.assertLogs('cajones_app.instrumentacion', 'WARNING') as logs:
+            response = middleware(request)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('consulta repetida 36 veces (posible N+1)', logs.output[0])
+        self.assertIn('37 consultas, el presupuesto es 20', logs.output[0])
+        with override_settings(INSTRUMENTACION_ESTRICTA=True):
+            with self.assertRaises(instrumentacion.ConsultasExcedidas):
+                middleware(request)
+
+    @override_settings(INSTRUMENTACION_ESTRICTA=True, INSTRUMENTACION_PRESUPUESTOS={'estadisticas': 2})
+    def test_presupuesto_por_ruta(self):
+        with self.assertRaisesMessage(instrumentacion.ConsultasExcedidas, '3 consultas, el presupuesto es 2'):
+            self.client.get('/api/estadisticas/')
+        self.assertEqual(self.client.get('/api/cajones/').status_code, 200)
+
+
+class DatosSinteticosTests(TestCase):
+    def test_sembrar(self):
+        call_command('sembrar_datos', cajones=8, tipos=5, objetos=300, lote=50, stdout=io.StringIO())
+        self.assertEqual(Cajon.objects.count(), 8)
+        self.assertEqual(TipoObjeto.objects.count(), 5)
+        self.assertEqual(CajonObjeto.objects.count(), 300)
+        self.assertEqual(CajonHistorial.objects.count(), 308)
+        cajones = Cajon.objects.annotate(total=Count('objetos'))
+        for cajon in cajones:
+            self.assertEqual(cajon.objetos_count, cajon.total)
+            self.assertLessEqual(cajon.objetos_count, cajon.capacidad_maxima)
+        # Los objetos se concentran en pocos cajones
+        ocupacion = sorted((cajon.total for cajon in cajones), reverse=True)
+        self.assertGreater(ocupacion[0], 3 * ocupacion[-1])
+        tamanios = Counter(CajonObjeto.objects.values_list('tamanio', flat=True))
+        self.assertGreater(tamanios['PE'], tamanios['ME'])
+        self.assertGreater(tamanios['ME'], tamanios['GR'])
+        # La búsqueda encuentra los objetos creados en lote
+        response = APIClient().get('/api/buscar/', {'q': CajonObjeto.objects.first().nombre_objeto})
+        self.assertTrue(response.json()['resultados'])
+
+    def test_misma_semilla_mismos_datos(self):
+        datos_sinteticos.sembrar(3, 2, 20, semilla=7)
+        primeros = list(CajonObjeto.objects.order_by('id').values_list('nombre_objeto', 'tamanio'))
+        datos_sinteticos.limpiar()
+        self.assertFalse(CajonObjeto.objects.exists())
+        datos_sinteticos.sembrar(3, 2, 20, semilla=7)
+        self.assertEqual(list(CajonObjeto.objects.order_by('id').values_list('nombre_objeto', 'tamanio')), primeros)
+
+
+class BenchmarkApiTests(TestCase):
+    def setUp(self):
+        datos_sinteticos.sembrar(4, 3, 60)
+        self.directorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directorio)
+
+    def benchmark(self, *args):
+        salida = os.path.join(self.directorio, 'resultado.json')
+        call_command('benchmark_api', '--repeticiones', '3', '--calentamiento', '0', '--salida', salida,
+                     *args, stderr=io.StringIO())
+        with open(salida, encoding='utf-8') as archivo:
+            return json.load(archivo)
+
+    def test_mide_todas_las_rutas_get(self):
+        resultado = self.benchmark()
+        self.assertEqual(resultado['datos'], {'cajones': 4, 'tipos': 3, 'objetos': 60, 'historial': 64})
+        self.assertEqual(resultado['omitidas']['historial-eventos'], 'flujo sin fin (server-sent events)')
+        self.assertEqual(resultado['omitidas']['objetos-lote'], 'no acepta GET')
+        self.assertIn('recomendacion-trabajo-detail', resultado['omitidas'])
+        cajon = Cajon.objects.order_by('-objetos_count').first()
+        self.assertEqual(resultado['rutas']['cajon-capacidad']['ruta'], f'/api/cajones/{cajon.id}/capacidad/')
+        for nombre, medicion in resultado['rutas'].items():
+            with self.subTest(ruta=nombre):
+                self.assertEqual(medicion['estado'], 200)
+                self.assertLessEqual(medicion['p50_ms'], medicion['p95_ms'])
+                self.assertLessEqual(medicion['p95_ms'], medicion['p99_ms'])
+                self.assertGreater(medicion['consultas'], 0)
+
+    def test_compara_con_la_base(self):
+        resultado = self.benchmark('--rutas', 'estadisticas', 'cajones-list')
+        base = os.path.join(self.directorio, 'base.json')
+        with open(base, 'w', encoding='utf-8') as archivo:
+            json.dump(resultado, archivo)
+        self.benchmark('--rutas', 'estadisticas', 'cajones-list', '--base', base, '--umbral-ms', '1000')
+
+        resultado['rutas']['estadisticas']['consultas'] -= 1
+        resultado['rutas']['cajones-list']['p95_ms'] = 0
+        with open(base, 'w', encoding='utf-8') as archivo:
+            json.dump(resultado, archivo)
+        with self.assertRaisesMessage(CommandError, '2 rutas empeoraron'):
+            self.benchmark('--rutas', 'estadisticas', 'cajones-list', '--base', base, '--umbral-ms', '0')
+
+
+class PerfilBaseDatosTests(TestCase):
+    def test_pragmas_de_cada_conexion_sqlite(self):
+        directorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directorio)
+        conexion = type(transaction.get_connection())(
+            {**connection.settings_dict, 'NAME': os.path.join(directorio, 'perfil.sqlite3')}, alias='perfil'
+        )
+        conexion.ensure_connection()
+        self.addCleanup(conexion.close)
+
+        def pragma(nombre):
+            return conexion.connection.execute(f'PRAGMA {nombre}').fetchone()[0]
+        self.assertEqual(pragma('journal_mode'), 'wal')
+        self.assertEqual(pragma('synchronous'), 1)
+        self.assertEqual(pragma('busy_timeout'), 5000)
+        self.assertEqual(pragma('cache_size'), -20000)
+        self.assertEqual(conexion.transaction_mode, 'IMMEDIATE')
+
+
+@override_settings(DB_REPLICA='replica')
+class ReplicaLecturaTests(TransactionTestCase):
+    """Primaria y réplica en dos bases SQLite, la réplica en un archivo"""
+    @classmethod
+    def setUpClass(cls):
+        # La réplica se agrega aquí y no en `databases`: el runner no la conoce
+        cls.databases = {'default', 'replica'}
+        directorio = tempfile.mkdtemp()
+        cls.addClassCleanup(shutil.rmtree, directorio)
+        connections.settings['replica'] = {
+            **connections.settings['default'], 'NAME': os.path.join(directorio, 'replica.sqlite3')
+        }
+        cls.addClassCleanup(connections.settings.pop, 'replica')
+        cls.addClassCleanup(connections.__delitem__, 'replica')
+        cls.addClassCleanup(lambda: connections['replica'].close())
+        super().setUpClass()
+
+    def setUp(self):
+        self.tipo = TipoObjeto.objects.create(nombre='Herramienta')
+        replica.sincronizar()
+
+    @staticmethod
+    def nombres(response):
+        return [cajon['nombre'] for cajon in response.json()]
+
+    def test_lecturas_en_la_replica_y_lectura_de_lo_propio(self):
+        escritor, lector = APIClient(), APIClient()
+        response = escritor.post('/api/cajones/', {'nombre': 'Taller', 'capacidad_maxima': 5}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertIn(replica.COOKIE, response.cookies)
+        cajon_id = response.json()['id']
+
+        # Hasta que se replica, solo quien escribió ve el cajón
+        self.assertEqual(self.nombres(lector.get('/api/cajones/')), [])
+        self.assertEqual(self.nombres(escritor.get('/api/cajones/')), ['Taller'])
+        # Un request que escribe lee de la primaria aunque la réplica esté atrasada
+        response = lector.post('/api/objetos/', {
+            'cajon': cajon_id, 'nombre_objeto': 'Martillo', 'tipo_objeto': self.tipo.id, 'tamanio': 'PE'
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        otro = APIClient()
+        self.assertEqual(otro.get('/api/buscar/', {'q': 'martillo'}).json()['resultados'], [])
+
+        replica.sincronizar()
+        self.assertEqual(self.nombres(otro.get('/api/cajones/')), ['Taller'])
+        self.assertEqual(len(otro.get('/api/buscar/', {'q': 'martillo'}).json()['resultados']), 1)
+
+        # Vencida la cookie, quien escribió vuelve a leer de la réplica
+        CajonService.crear_cajon('Cocina', 5)
+        escritor.cookies[replica.COOKIE] = '0'
+        self.assertEqual(self.nombres(escritor.get('/api/cajones/')), ['Taller'])
+
+    def test_get_condicional_despues_de_sincronizar(self):
+        escritor, lector = APIClient(), APIClient()
+        escritor.post('/api/cajones/', {'nombre': 'Taller', 'capacidad_maxima': 5}, format='json')
+        response = lector.get('/api/cajones/')
+        self.assertEqual(self.nombres(response), [])
+        etag = response['ETag']
+
+        # El ETag sale de la réplica, como los datos: al sincronizar cambia
+        replica.sincronizar()
+        response = lector.get('/api/cajones/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.nombres(response), ['Taller'])
+        self.assertNotEqual(response['ETag'], etag)
+        response = lector.get('/api/cajones/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_un_get_sin_escrituras_no_fija_la_primaria(self):
+        response = APIClient().get('/api/cajones/')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn(replica.COOKIE, response.cookies)
+
+    def test_vistas_asincronas(self):
+        cajon = CajonService.crear_cajon('Taller', 5)
+
+        async def capacidad(request):
+            return await CajonCapacidadAsyncView.as_view()(request, cajon_id=cajon.id)
+
+        vista = async_to_sync(replica.ReplicaMiddleware(capacidad))
+        request = AsyncRequestFactory().get(f'/api/cajones/{cajon.id}/capacidad/')
+        # La vista lee con el ORM asíncrono, en otro hilo, y aun así usa la réplica
+        self.assertEqual(vista(request).status_code, 404)
+        replica.sincronizar()
+        self.assertEqual(vista(request).status_code, 200)
@@ -0,0 +1,173 @@
+"""
+Ejecución en segundo plano de la generación de recomendaciones.
+
+Los trabajos se guardan en RecomendacionTrabajo y se procesan en un pool de
+hilos acotado (RECOMENDACIONES_TRABAJOS_WORKERS), de modo que las llamadas
+lentas a Gemini no ocupan los workers que atienden el resto de la API. Con
+RECOMENDACIONES_TRABAJOS_SINCRONOS=True se ejecutan en el mismo request,
+lo que resulta útil en las pruebas.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, connection, transaction
+from django.utils import timezone
+
+from .models import RecomendacionTrabajo
+from .services import RecomendacionService
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_lock = threading.Lock()
+_en_cola = 0
+
+
+class ColaLlenaError(Exception):
+    """No se aceptan más trabajos hasta que se liberen lugares en la cola"""
+
+
+class TrabajoNoDisponibleError(Exception):
+    """No se pudo crear el trabajo ni obtener el que está activo para el criterio"""
+
+
+def _obtener_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'RECOMENDACIONES_TRABAJOS_WORKERS', 2),
+                thread_name_prefix='recomendaciones'
+            )
+        return _executor
+
+
+def encolar(tipo_ordenamiento):
+    """
+    Crear un trabajo para el criterio indicado y enviarlo al pool. Si ya hay
+    uno pendiente para el mismo criterio, se devuelve ese en lugar de crear otro.
+    """
+    activo = _activo(tipo_ordenamiento)
+    if activo is not None:
+        return activo
+
+    sincrono = getattr(settings, 'RECOMENDACIONES_TRABAJOS_SINCRONOS', False)
+    if not sincrono and _en_cola >= _max_en_cola():
+        raise ColaLlenaError("Hay demasiados trabajos de recomendación en curso, intente más tarde")
+    try:
+        with transaction.atomic():
+            trabajo = RecomendacionTrabajo.objects.create(tipo_ordenamiento=tipo_ordenamiento)
+    except IntegrityError:
+        # Otro request creó el trabajo entre la consulta y el alta
+        activo = _activo(tipo_ordenamiento)
+        if activo is None:
+            raise TrabajoNoDisponibleError("No se pudo registrar el trabajo de recomendación, intente nuevamente")
+        return activo
+
+    if sincrono:
+        ejecutar(trabajo.id)
+        trabajo.refresh_from_db()
+        return trabajo
+    # El lugar en la cola se toma al confirmarse el trabajo: si la transacción
+    # se revierte no hay nada que liberar
+    transaction.on_commit(lambda: _enviar(trabajo.id))
+    return trabajo
+
+
+def _activo(tipo_ordenamiento):
+    """Trabajo pendiente o en proceso del criterio; los interrumpidos se marcan con error"""
+    activo = RecomendacionTrabajo.objects.filter(
+        tipo_ordenamiento=tipo_ordenamiento,
+        estado__in=[RecomendacionTrabajo.Estado.PENDIENTE, RecomendacionTrabajo.Estado.EN_PROCESO]
+    ).first()
+    if activo is not None and _expirado(activo):
+        RecomendacionTrabajo.objects.filter(pk=activo.pk, estado=activo.estado).update(
+            estado=RecomendacionTrabajo.Estado.ERROR,
+            error='El trabajo se interrumpió antes de terminar',
+            fecha_actualizacion=timezone.now()
+        )
+        return None
+    return activo
+
+
+def _max_en_cola():
+    return getattr(settings, 'RECOMENDACIONES_TRABAJOS_MAX_EN_COLA', 20)
+
+
+def _enviar(trabajo_id):
+    global _en_cola
+    with _lock:
+        lleno = _en_cola >= _max_en_cola()
+        if not lleno:
+            _en_cola += 1
+    if lleno:
+        # Otros requests llenaron la cola mientras este confirmaba su trabajo
+        RecomendacionTrabajo.objects.filter(pk=trabajo_id).update(
+            estado=RecomendacionTrabajo.Estado.ERROR,
+            error='Hay demasiados trabajos de recomendación en curso, intente más tarde',
+            fecha_actualizacion=timezone.now()
+        )
+        return
+    try:
+        _obtener_executor().submit(_ejecutar_en_hilo, trabajo_id)
+    except Exception:
+        _liberar_lugar()
+        raise
+
+
+def ejecutar(trabajo_id):
+    """Generar las recomendaciones de un trabajo y guardar el resultado"""
+    RecomendacionTrabajo.objects.filter(pk=trabajo_id).update(
+        estado=RecomendacionTrabajo.Estado.EN_PROCESO,
+        fecha_actualizacion=timezone.now()
+    )
+    trabajo = RecomendacionTrabajo.objects.get(pk=trabajo_id)
+    try:
+        recomendaciones = RecomendacionService.obtener_recomendaciones(trabajo.tipo_ordenamiento)
+    except Exception as e:
+        logger.exception("Error en el trabajo de recomendación %s", trabajo_id)
+        RecomendacionTrabajo.objects.filter(pk=trabajo_id).update(
+            estado=RecomendacionTrabajo.Estado.ERROR,
+            error=str(e),
+            fecha_actualizacion=timezone.now()
+        )
+    else:
+        RecomendacionTrabajo.objects.filter(pk=trabajo_id).update(
+            estado=RecomendacionTrabajo.Estado.COMPLETADO,
+            recomendaciones=recomendaciones,
+            fecha_actualizacion=timezone.now()
+        )
+
+
+def _ejecutar_en_hilo(trabajo_id):
+    close_old_connections()
+    try:
+        ejecutar(trabajo_id)
+    finally:
+        _liberar_lugar()
+        connection.close()
+
+
+def _liberar_lugar():
+    global _en_cola
+    with _lock:
+        _en_cola -= 1
+
+
+def _expirado(trabajo):
+    """Un trabajo sin avances por más del límite se considera interrumpido (p. ej. por un reinicio)"""
+    limite = getattr(settings, 'RECOMENDACIONES_TRABAJOS_TIMEOUT', 300)
+    return (timezone.now() - trabajo.fecha_actualizacion).total_seconds() > limite
+
+
+def consultar(trabajo_id):
+    """Obtener un trabajo, marcándolo como error si quedó interrumpido"""
+    trabajo = RecomendacionTrabajo.objects.get(pk=trabajo_id)
+    if trabajo.estado in (RecomendacionTrabajo.Estado.PENDIENTE, RecomendacionTrabajo.Estado.EN_PROCESO) \
+            and _expirado(trabajo):
+        trabajo.estado = RecomendacionTrabajo.Estado.ERROR
+        trabajo.error = "El trabajo se interrumpió antes de terminar"
+        trabajo.save(update_fields=['estado', 'error', 'fecha_actualizacion'])
+    return trabajo
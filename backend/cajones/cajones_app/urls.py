@@ -1,23 +1,40 @@
+from django.conf import settings
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .views import (
     CajonListView, CajonDetailView, CajonHistorialListView, CajonHistorialDetailView,
     TipoObjetoListView, TipoObjetoDetailView, CajonObjetoListView, CajonObjetoDetailView,
     CajonObjetosView, CajonHistorialView, CajonCapacidadView, RecomendacionSimpleView,
-    CajonObjetosOrdenadosView, OrdenamientoView
+    CajonObjetosOrdenadosView, OrdenamientoView, CajonObjetoLoteView,
+    CajonObjetoMoverView, CajonEstadisticasView, EstadisticasView,
+    RecomendacionTrabajoListView, RecomendacionTrabajoDetailView,
+    ExportacionObjetosView, ExportacionHistorialView, BusquedaView, CajonObjetoDuplicadosView,
+    HistorialEventosView
 )
+from .views_async import (
+    CajonObjetosAsyncView, CajonHistorialAsyncView, CajonCapacidadAsyncView, CajonEstadisticasAsyncView,
+    EstadisticasAsyncView, BusquedaAsyncView, RecomendacionAsyncView, HistorialEventosAsyncView
+)
+
+
+def segun_modo(vista, vista_async):
+    """Con API_ASYNC (activado por asgi.py) se usa la variante asíncrona de la vista"""
+    return (vista_async if getattr(settings, 'API_ASYNC', False) else vista).as_view()
+
 
 urlpatterns = [
     # Rutas de Cajones
     path('api/cajones/', CajonListView.as_view(), name='cajones-list'),
     path('api/cajones/<int:pk>/', CajonDetailView.as_view(), name='cajon-detail'),
-    path('api/cajones/<int:cajon_id>/objetos/', CajonObjetosView.as_view(), name='cajon-objetos'),
+    path('api/cajones/<int:cajon_id>/objetos/', segun_modo(CajonObjetosView, CajonObjetosAsyncView), name='cajon-objetos'),
     path('api/cajones/<int:cajon_id>/objetos-ordenados/', CajonObjetosOrdenadosView.as_view(), name='cajon-objetos-ordenados'),
-    path('api/cajones/<int:cajon_id>/historial/', CajonHistorialView.as_view(), name='cajon-historial'),
-    path('api/cajones/<int:cajon_id>/capacidad/', CajonCapacidadView.as_view(), name='cajon-capacidad'),
+    path('api/cajones/<int:cajon_id>/historial/', segun_modo(CajonHistorialView, CajonHistorialAsyncView), name='cajon-historial'),
+    path('api/cajones/<int:cajon_id>/capacidad/', segun_modo(CajonCapacidadView, CajonCapacidadAsyncView), name='cajon-capacidad'),
+    path('api/cajones/<int:cajon_id>/estadisticas/', segun_modo(CajonEstadisticasView, CajonEstadisticasAsyncView), name='cajon-estadisticas'),
     
     # Rutas de Historial
     path('api/historial/', CajonHistorialListView.as_view(), name='historial-list'),
+    path('api/historial/eventos/', segun_modo(HistorialEventosView, HistorialEventosAsyncView), name='historial-eventos'),
     path('api/historial/<int:pk>/', CajonHistorialDetailView.as_view(), name='historial-detail'),
     
     # Rutas de Tipos de Objeto
@@ -26,10 +43,25 @@ urlpatterns = [
     
     # Rutas de Objetos
     path('api/objetos/', CajonObjetoListView.as_view(), name='objetos-list'),
+    path('api/objetos/lote/', CajonObjetoLoteView.as_view(), name='objetos-lote'),
+    path('api/objetos/mover/', CajonObjetoMoverView.as_view(), name='objetos-mover'),
+    path('api/objetos/duplicados/', CajonObjetoDuplicadosView.as_view(), name='objetos-duplicados'),
     path('api/objetos/<int:pk>/', CajonObjetoDetailView.as_view(), name='objeto-detail'),
     
+    # Ruta de Búsqueda
+    path('api/buscar/', segun_modo(BusquedaView, BusquedaAsyncView), name='buscar'),
+    
     # Ruta de Recomendación
-    path('api/recomendacion/', RecomendacionSimpleView.as_view(), name='recomendacion-simple'),
+    path('api/recomendacion/', segun_modo(RecomendacionSimpleView, RecomendacionAsyncView), name='recomendacion-simple'),
+    path('api/recomendacion/trabajos/', RecomendacionTrabajoListView.as_view(), name='recomendacion-trabajos'),
+    path('api/recomendacion/trabajos/<int:pk>/', RecomendacionTrabajoDetailView.as_view(), name='recomendacion-trabajo-detail'),
+
+    # Ruta de Estadísticas
+    path('api/estadisticas/', segun_modo(EstadisticasView, EstadisticasAsyncView), name='estadisticas'),
+
+    # Rutas de Exportación
+    path('api/exportar/objetos/', ExportacionObjetosView.as_view(), name='exportar-objetos'),
+    path('api/exportar/historial/', ExportacionHistorialView.as_view(), name='exportar-historial'),
 
     # Ruta de Ordenamiento
     path('api/ordenamiento/', OrdenamientoView.as_view(), name='ordenamiento'),
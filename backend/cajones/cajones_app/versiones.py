@@ -0,0 +1,105 @@
+"""
+Versiones por recurso (tabla) para detectar cambios sin consultar los datos.
+
+Cada escritura incrementa, dentro de su misma transacción, el contador de los
+modelos que modificó. Así la versión y los datos se confirman (o revierten)
+juntos, y leer la versión de uno o varios recursos es una sola consulta por
+clave primaria.
+
+Las lecturas pasan por el enrutador (ver replica.py): la versión sale de la
+misma base que los datos, y un ETag nunca es más nuevo que lo que se devuelve.
+"""
+from django.db import router
+from django.db.models import F
+from django.utils import timezone
+
+from .models import VersionRecurso
+
+
+def _recurso(modelo):
+    return modelo._meta.label_lower
+
+
+def incrementar(*modelos, using='default'):
+    """Incrementar la versión de los modelos indicados"""
+    recursos = {_recurso(modelo) for modelo in modelos}
+    ahora = timezone.now()
+    actualizados = VersionRecurso.objects.using(using).filter(recurso__in=recursos).update(
+        version=F('version') + 1, fecha_modificacion=ahora
+    )
+    if actualizados < len(recursos):
+        # Primera escritura de un recurso: crear su contador
+        existentes = set(
+            VersionRecurso.objects.using(using).filter(recurso__in=recursos).values_list('recurso', flat=True)
+        )
+        for recurso in recursos - existentes:
+            _, creado = VersionRecurso.objects.using(using).get_or_create(
+                recurso=recurso, defaults={'version': 1, 'fecha_modificacion': ahora}
+            )
+            if not creado:
+                VersionRecurso.objects.using(using).filter(recurso=recurso).update(
+                    version=F('version') + 1, fecha_modificacion=ahora
+                )
+
+
+def _consulta(modelos, using):
+    recursos = {_recurso(modelo): modelo for modelo in modelos}
+    using = using or router.db_for_read(VersionRecurso)
+    consulta = (
+        VersionRecurso.objects.using(using)
+        .filter(recurso__in=recursos)
+        .values_list('recurso', 'version', 'fecha_modificacion')
+    )
+    return recursos, consulta
+
+
+def _por_modelo(recursos, filas):
+    filas = {recurso: (version, fecha) for recurso, version, fecha in filas}
+    return {modelo: filas.get(recurso, (0, None)) for recurso, modelo in recursos.items()}
+
+
+def _leer(modelos, using):
+    recursos, consulta = _consulta(modelos, using)
+    return _por_modelo(recursos, consulta)
+
+
+async def _aleer(modelos, using):
+    recursos, consulta = _consulta(modelos, using)
+    return _por_modelo(recursos, [fila async for fila in consulta])
+
+
+def _huella(modelos, filas):
+    return '-'.join(str(filas[modelo][0]) for modelo in modelos)
+
+
+def _estado(modelos, filas):
+    fechas = [fecha for _, fecha in filas.values() if fecha is not None]
+    return _huella(modelos, filas), max(fechas) if fechas else None
+
+
+def obtener(*modelos, using=None):
+    """Devolver {modelo: version} con una sola consulta"""
+    return {modelo: version for modelo, (version, _) in _leer(modelos, using).items()}
+
+
+def huella(*modelos, using=None):
+    """Representación compacta de las versiones, apta para claves de cache"""
+    return _huella(modelos, _leer(modelos, using))
+
+
+async def ahuella(*modelos, using=None):
+    """Variante asíncrona de huella()"""
+    return _huella(modelos, await _aleer(modelos, using))
+
+
+def estado(*modelos, using=None):
+    """
+    Devolver (huella, fecha de la última modificación) de los modelos con una
+    sola consulta. La fecha es None si ninguno se modificó todavía.
+    """
+    return _estado(modelos, _leer(modelos, using))
+
+
+async def aestado(*modelos, using=None):
+    """Variante asíncrona de estado()"""
+    return _estado(modelos, await _aleer(modelos, using))
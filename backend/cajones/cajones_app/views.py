@@ -3,14 +3,32 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from django.shortcuts import get_object_or_404
-from .models import Cajon, CajonObjeto, TipoObjeto, CajonHistorial
-from .serializers import CajonSerializer, CajonHistorialSerializer, TipoObjetoSerializer, CajonObjetoSerializer
-from .services import RecomendacionService, OrdenamientoService
-from .models import Cajon, CajonHistorial, TipoObjeto, CajonObjeto
-from rest_framework import status
+from .models import Cajon, CajonObjeto, TipoObjeto, CajonHistorial, RecomendacionTrabajo
+from .serializers import (
+    CajonSerializer, CajonOcupacionSerializer, CajonHistorialSerializer, TipoObjetoSerializer,
+    CajonObjetoSerializer, CajonObjetoLoteSerializer, MovimientoSerializer, RecomendacionTrabajoSerializer,
+    CajonObjetoFilasSerializer, CajonHistorialFilasSerializer
+)
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views import View
+from rest_framework.utils.encoders import JSONEncoder
+from .services import (
+    CajonService, RecomendacionService, OrdenamientoService, PlanificadorService, BusquedaService,
+    DuplicadosService
+)
+from .pagination import HistorialPagination, CajonObjetoPagination
+from .condicional import condicional
+from . import bitacora, eventos, exportacion, trabajos
 
 class CajonListView(APIView):
+    @condicional(Cajon)
     def get(self, request):
+        # ?ocupacion=1 agrega los datos de /capacidad/ de cada cajón sin consultas extra
+        if request.query_params.get('ocupacion') in ('1', 'true'):
+            serializer = CajonOcupacionSerializer(CajonService.cajones_con_ocupacion(), many=True)
+            return Response(serializer.data)
         cajones = Cajon.objects.all()
         serializer = CajonSerializer(cajones, many=True)
         return Response(serializer.data)
@@ -20,7 +38,7 @@ class CajonListView(APIView):
         if serializer.is_valid():
             cajon = serializer.save()
             # Crear entrada en el historial
-            CajonHistorial.objects.create(
+            bitacora.registrar(
                 cajon=cajon,
                 accion='creado',
                 descripcion=f'Cajón "{cajon.nombre}" creado con capacidad {cajon.capacidad_maxima}'
@@ -30,6 +48,7 @@ class CajonListView(APIView):
 
 
 class CajonDetailView(APIView):
+    @condicional(Cajon)
     def get(self, request, pk):
         cajon = get_object_or_404(Cajon, pk=pk)
         serializer = CajonSerializer(cajon)
@@ -41,7 +60,7 @@ class CajonDetailView(APIView):
         if serializer.is_valid():
             cajon = serializer.save()
             # Crear entrada en el historial
-            CajonHistorial.objects.create(
+            bitacora.registrar(
                 cajon=cajon,
                 accion='modificado',
                 descripcion=f'Cajón "{cajon.nombre}" actualizado'
@@ -52,7 +71,7 @@ class CajonDetailView(APIView):
     def delete(self, request, pk):
         cajon = get_object_or_404(Cajon, pk=pk)
         # Crear entrada en el historial antes de eliminar
-        CajonHistorial.objects.create(
+        bitacora.registrar(
             cajon=cajon,
             accion='eliminado',
             descripcion=f'Cajón "{cajon.nombre}" eliminado'
@@ -62,20 +81,45 @@ class CajonDetailView(APIView):
 
 
 class CajonHistorialListView(APIView):
+    @condicional(CajonHistorial)
     def get(self, request):
-        historial = CajonHistorial.objects.all().order_by('-fecha')
-        serializer = CajonHistorialSerializer(historial, many=True)
-        return Response(serializer.data)
+        historial = CajonHistorialFilasSerializer.preparar(CajonHistorial.objects.all())
+        paginator = HistorialPagination()
+        page = paginator.paginate_queryset(historial, request, view=self)
+        serializer = CajonHistorialFilasSerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
 
 
 class CajonHistorialDetailView(APIView):
+    @condicional(CajonHistorial)
     def get(self, request, pk):
         historial = get_object_or_404(CajonHistorial, pk=pk)
         serializer = CajonHistorialSerializer(historial)
         return Response(serializer.data)
 
 
+class HistorialEventosView(View):
+    """
+    Entradas nuevas del historial como server-sent events (ver eventos.py).
+    Es una vista de Django y no de DRF porque EventSource pide
+    text/event-stream, que la negociación de contenido de DRF rechazaría.
+    """
+    def get(self, request):
+        try:
+            desde, cajon_id = eventos.leer_parametros(request)
+        except ValueError:
+            return JsonResponse({
+                'error': 'desde, Last-Event-ID y cajon_id deben ser números enteros positivos'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        if cajon_id is not None and not Cajon.objects.filter(pk=cajon_id).exists():
+            return JsonResponse({'error': 'El cajón especificado no existe'}, status=status.HTTP_404_NOT_FOUND)
+        if desde is None:
+            desde = eventos.ultimo_id()
+        return eventos.respuesta(eventos.flujo(desde, cajon_id))
+
+
 class TipoObjetoListView(APIView):
+    @condicional(TipoObjeto)
     def get(self, request):
         tipos = TipoObjeto.objects.all()
         serializer = TipoObjetoSerializer(tipos, many=True)
@@ -90,6 +134,7 @@ class TipoObjetoListView(APIView):
 
 
 class TipoObjetoDetailView(APIView):
+    @condicional(TipoObjeto)
     def get(self, request, pk):
         tipo = get_object_or_404(TipoObjeto, pk=pk)
         serializer = TipoObjetoSerializer(tipo)
@@ -105,39 +150,40 @@ class TipoObjetoDetailView(APIView):
     
     def delete(self, request, pk):
         tipo = get_object_or_404(TipoObjeto, pk=pk)
-        tipo.delete()
+        with transaction.atomic():
+            # El borrado en cascada elimina objetos de varios cajones
+            cajon_ids = list(tipo.objetos.values_list('cajon_id', flat=True).distinct())
+            tipo.delete()
+            CajonService.recalcular_ocupacion(cajon_ids)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
 class CajonObjetoListView(APIView):
+    @condicional(CajonObjeto, TipoObjeto)
     def get(self, request):
-        objetos = CajonObjeto.objects.all()
-        serializer = CajonObjetoSerializer(objetos, many=True)
-        return Response(serializer.data)
+        objetos = CajonObjetoFilasSerializer.preparar(CajonObjeto.objects.all())
+        paginator = CajonObjetoPagination()
+        page = paginator.paginate_queryset(objetos, request, view=self)
+        serializer = CajonObjetoFilasSerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
     
     def post(self, request):
         serializer = CajonObjetoSerializer(data=request.data)
         if serializer.is_valid():
-            objeto = serializer.save()
-            # Crear entrada en el historial del cajón
-            CajonHistorial.objects.create(
-                cajon=objeto.cajon,
-                accion='objeto_agregado',
-                descripcion=f'Objeto "{objeto.nombre_objeto}" agregado al cajón'
-            )
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
+            datos = serializer.validated_data
+            try:
+                # El servicio verifica la capacidad y registra el historial
+                objeto = CajonService.agregar_objeto_a_cajon(
+                    datos['cajon'].id,
+                    datos['nombre_objeto'],
+                    datos['tipo_objeto'].id,
+                    datos.get('tamanio', CajonObjeto.CajonTamanio.PEQUENO)
+                )
+            except ValidationError as e:
+                return Response({'error': e.messages[0]}, status=status.HTTP_400_BAD_REQUEST)
+            return Response(CajonObjetoSerializer(objeto).data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
-    def del_duplicados(self, request):
-        nombre = request.data.get('nombre')
-        tipo = request.data.get('tipo')
-        tamanio = request.data.get('tamanio')
-        objeto = CajonObjeto.objects.filter(nombre_objeto=nombre, tipo_objeto=tipo, tamanio=tamanio).first()
-        if objeto:
-            objeto.delete()
-            return Response(status=status.HTTP_204_NO_CONTENT)
-        return Response(status=status.HTTP_404_NOT_FOUND)
-    
     def ord_CajonObjeto(self, request, type_ordenmiento):
         if type_ordenmiento == 'tipo':
             objetos = CajonObjeto.objects.all().order_by('tipo_objeto')
@@ -157,64 +203,165 @@ class CajonObjetoListView(APIView):
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
+class CajonObjetoLoteView(APIView):
+    """Vista para agregar muchos objetos (p. ej. un envío completo) en una sola operación"""
+    max_objetos = 10000
+    
+    def post(self, request):
+        items = request.data.get('objetos') if isinstance(request.data, dict) else request.data
+        if not isinstance(items, list) or not items:
+            return Response({
+                'error': 'Se espera una lista no vacía de objetos en "objetos"'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        if len(items) > self.max_objetos:
+            return Response({
+                'error': f'No se pueden cargar más de {self.max_objetos} objetos por solicitud'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        validos = []
+        errores = {}
+        for indice, item in enumerate(items):
+            serializer = CajonObjetoLoteSerializer(data=item)
+            if serializer.is_valid():
+                validos.append((indice, serializer.validated_data))
+            else:
+                errores[indice] = serializer.errors
+        
+        creados = []
+        if validos:
+            creados, errores_lote = CajonService.agregar_objetos_en_lote(validos)
+            for indice, mensaje in errores_lote.items():
+                errores[indice] = {'non_field_errors': [mensaje]}
+        
+        return Response({
+            'creados': len(creados),
+            'objetos': [{'indice': indice, 'id': objeto.id} for indice, objeto in creados],
+            'errores': [{'indice': indice, 'errores': errores[indice]} for indice in sorted(errores)]
+        }, status=status.HTTP_201_CREATED if creados else status.HTTP_400_BAD_REQUEST)
+
+
+class CajonObjetoMoverView(APIView):
+    """Vista para aplicar un plan de movimientos de objetos entre cajones de forma atómica"""
+    max_movimientos = 10000
+    
+    def post(self, request):
+        movimientos = request.data.get('movimientos') if isinstance(request.data, dict) else request.data
+        if not isinstance(movimientos, list) or not movimientos:
+            return Response({
+                'error': 'Se espera una lista no vacía de movimientos en "movimientos"'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        if len(movimientos) > self.max_movimientos:
+            return Response({
+                'error': f'No se pueden aplicar más de {self.max_movimientos} movimientos por solicitud'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        serializer = MovimientoSerializer(data=movimientos, many=True)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            movidos = CajonService.mover_objetos_en_lote(
+                [(paso['objeto'], paso['cajon']) for paso in serializer.validated_data]
+            )
+        except ValidationError as e:
+            return Response({'error': e.messages[0]}, status=status.HTTP_400_BAD_REQUEST)
+        
+        return Response({'movidos': movidos})
+
+
+class CajonObjetoDuplicadosView(APIView):
+    """
+    Vista para detectar (GET) y eliminar (POST) objetos duplicados: mismo
+    nombre, tipo y tamaño. Con mismo_cajon solo se consideran duplicados los
+    que están en el mismo cajón.
+    """
+    @staticmethod
+    def mismo_cajon(valor):
+        return str(valor).lower() in ('1', 'true')
+
+    @condicional(CajonObjeto, TipoObjeto)
+    def get(self, request):
+        grupos = DuplicadosService.buscar(self.mismo_cajon(request.query_params.get('mismo_cajon')))
+        return Response({
+            'grupos': grupos,
+            'total_grupos': len(grupos),
+            'total_sobrantes': sum(grupo['cantidad'] - 1 for grupo in grupos)
+        })
+
+    def post(self, request):
+        grupos, eliminados = DuplicadosService.eliminar(self.mismo_cajon(request.data.get('mismo_cajon')))
+        return Response({'grupos': grupos, 'eliminados': eliminados})
+
+
 class CajonObjetoDetailView(APIView):
+    @condicional(CajonObjeto)
     def get(self, request, pk):
         objeto = get_object_or_404(CajonObjeto, pk=pk)
         serializer = CajonObjetoSerializer(objeto)
         return Response(serializer.data)
     
     def put(self, request, pk):
-        objeto = get_object_or_404(CajonObjeto, pk=pk)
-        serializer = CajonObjetoSerializer(objeto, data=request.data)
-        if serializer.is_valid():
-            objeto = serializer.save()
-            # Crear entrada en el historial del cajón
-            CajonHistorial.objects.create(
-                cajon=objeto.cajon,
-                accion='objeto_modificado',
-                descripcion=f'Objeto "{objeto.nombre_objeto}" modificado'
-            )
-            return Response(serializer.data)
+        with transaction.atomic():
+            # El cajón actual se lee con el objeto bloqueado: dos PUT que lo
+            # mueven a la vez no liberan ni reservan lugar dos veces
+            objeto = get_object_or_404(CajonObjeto.objects.select_for_update(), pk=pk)
+            serializer = CajonObjetoSerializer(objeto, data=request.data)
+            if serializer.is_valid():
+                nuevo_cajon = serializer.validated_data.get('cajon', objeto.cajon)
+                # Si cambia de cajón, reservar lugar en el destino
+                if nuevo_cajon.id != objeto.cajon_id:
+                    if not CajonService.reservar_espacio(nuevo_cajon.id):
+                        return Response({
+                            'error': f"El cajón destino '{nuevo_cajon.nombre}' está lleno"
+                        }, status=status.HTTP_400_BAD_REQUEST)
+                    CajonService.liberar_espacio(objeto.cajon_id)
+                objeto = serializer.save()
+                # Crear entrada en el historial del cajón
+                bitacora.registrar(
+                    cajon=objeto.cajon,
+                    accion='objeto_modificado',
+                    descripcion=f'Objeto "{objeto.nombre_objeto}" modificado'
+                )
+                return Response(serializer.data)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
     def delete(self, request, pk):
-        objeto = get_object_or_404(CajonObjeto, pk=pk)
-        cajon = objeto.cajon
-        nombre_objeto = objeto.nombre_objeto
-        
-        # Crear entrada en el historial antes de eliminar
-        CajonHistorial.objects.create(
-            cajon=cajon,
-            accion='objeto_eliminado',
-            descripcion=f'Objeto "{nombre_objeto}" eliminado del cajón'
-        )
-        objeto.delete()
+        with transaction.atomic():
+            objeto = get_object_or_404(CajonObjeto.objects.select_for_update(), pk=pk)
+            CajonService.eliminar_objeto(objeto)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
 class CajonObjetosView(APIView):
     """Vista para obtener objetos de un cajón específico"""
+    @condicional(Cajon, CajonObjeto, TipoObjeto)
     def get(self, request, cajon_id):
         cajon = get_object_or_404(Cajon, pk=cajon_id)
-        objetos = cajon.objetos.all()
-        serializer = CajonObjetoSerializer(objetos, many=True)
-        return Response(serializer.data)
+        objetos = CajonObjetoFilasSerializer.preparar(cajon.objetos.all())
+        paginator = CajonObjetoPagination()
+        page = paginator.paginate_queryset(objetos, request, view=self)
+        serializer = CajonObjetoFilasSerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
 
 
 class CajonHistorialView(APIView):
     """Vista para obtener historial de un cajón específico"""
+    @condicional(Cajon, CajonHistorial)
     def get(self, request, cajon_id):
         cajon = get_object_or_404(Cajon, pk=cajon_id)
-        historial = cajon.historial_entries.all().order_by('-fecha')
-        serializer = CajonHistorialSerializer(historial, many=True)
-        return Response(serializer.data)
+        historial = CajonHistorialFilasSerializer.preparar(cajon.historial_entries.all())
+        paginator = HistorialPagination()
+        page = paginator.paginate_queryset(historial, request, view=self)
+        serializer = CajonHistorialFilasSerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
 
 
 class CajonCapacidadView(APIView):
     """Vista para obtener capacidad disponible de un cajón"""
+    @condicional(Cajon)
     def get(self, request, cajon_id):
         cajon = get_object_or_404(Cajon, pk=cajon_id)
-        objetos_count = cajon.objetos.count()
+        objetos_count = cajon.objetos_count
         capacidad_disponible = cajon.capacidad_maxima - objetos_count
         
         return Response({
@@ -227,50 +374,181 @@ class CajonCapacidadView(APIView):
         })
 
 
-class OrdenamientoView(APIView):
-    """Vista para obtener objetos ordenados por diferentes criterios"""
+class CajonEstadisticasView(APIView):
+    """Vista para obtener estadísticas por tamaño y tipo de un cajón"""
+    @condicional(Cajon, CajonObjeto, TipoObjeto)
+    def get(self, request, cajon_id):
+        try:
+            estadisticas = CajonService.obtener_estadisticas_cajon(cajon_id)
+        except ValidationError as e:
+            return Response({'error': e.messages[0]}, status=status.HTTP_404_NOT_FOUND)
+        return Response(estadisticas)
+
+
+class EstadisticasView(APIView):
+    """Vista para obtener estadísticas de todos los cajones en una sola solicitud"""
+    @condicional(Cajon, CajonObjeto, TipoObjeto)
+    def get(self, request):
+        return Response(CajonService.obtener_estadisticas_generales())
+
+
+class BusquedaView(APIView):
+    """Vista para buscar objetos por nombre, tipo o descripción del tipo"""
+    max_limite = 100
+
+    @classmethod
+    def leer_parametros(cls, params):
+        """Devolver (limite, cajon_id) o lanzar ValueError si no son válidos"""
+        limite = min(int(params.get('limite', 20)), cls.max_limite)
+        cajon_id = params.get('cajon_id')
+        cajon_id = int(cajon_id) if cajon_id else None
+        if limite <= 0:
+            raise ValueError
+        return limite, cajon_id
+
+    @condicional(Cajon, CajonObjeto, TipoObjeto)
     def get(self, request):
         try:
-            tipo_ordenamiento = request.query_params.get('tipo_ordenamiento', 'tipo')
-            cajon_id = request.query_params.get('cajon_id')
-            if cajon_id:
-                cajon_id = int(cajon_id)
-            ordenamiento_service = OrdenamientoService()
-            if tipo_ordenamiento == 'tipo':
-                resultado = ordenamiento_service.ordenar_por_tipo(cajon_id)
-            elif tipo_ordenamiento == 'tamanio':
-                resultado = ordenamiento_service.ordenar_por_tamanio(cajon_id)
-            elif tipo_ordenamiento == 'mixto':
-                resultado = ordenamiento_service.ordenar_mixto(cajon_id)
-            else:
-                return Response({
-                    'error': 'Tipo de ordenamiento no válido. Use: tipo, tamanio, mixto'
+            limite, cajon_id = self.leer_parametros(request.query_params)
+        except ValueError:
+            return Response({
+                'error': 'cajon_id y limite deben ser números enteros positivos'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            resultados = BusquedaService.buscar(request.query_params.get('q', ''), limite, cajon_id)
+        except ValidationError as e:
+            return Response({'error': e.messages[0]}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'resultados': resultados})
+
+
+class ExportacionView(View):
+    """
+    Base de las exportaciones para reportes: NDJSON (por defecto) o CSV con
+    ?formato=csv, enviados a medida que se leen las filas. Cada subclase
+    indica el `modelo` a exportar, sus `campos` y el `nombre` del archivo.
+    Es una vista de Django y no de DRF para que un cliente pueda pedir
+    text/csv o application/x-ndjson, que la negociación de contenido de DRF
+    rechazaría.
+    """
+    modelo = None
+    nombre = None
+    campos = ()
+
+    def get(self, request):
+        formato = request.GET.get('formato', 'ndjson')
+        if formato not in exportacion.FORMATOS:
+            return JsonResponse({
+                'error': 'Formato no válido. Use: ndjson, csv'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        queryset = self.modelo.objects.all()
+        cajon_id = request.GET.get('cajon_id')
+        if cajon_id:
+            try:
+                queryset = queryset.filter(cajon_id=int(cajon_id))
+            except ValueError:
+                return JsonResponse({
+                    'error': 'cajon_id debe ser un número entero'
                 }, status=status.HTTP_400_BAD_REQUEST)
+        return exportacion.respuesta_exportacion(queryset.order_by('id'), self.campos, formato, self.nombre)
+
+
+class ExportacionObjetosView(ExportacionView):
+    """Exportar el inventario completo con los nombres de cajón y tipo"""
+    modelo = CajonObjeto
+    nombre = 'objetos'
+    campos = (
+        ('id', 'id'),
+        ('nombre_objeto', 'nombre_objeto'),
+        ('tamanio', 'tamanio'),
+        ('cajon', 'cajon_id'),
+        ('cajon_nombre', 'cajon__nombre'),
+        ('tipo_objeto', 'tipo_objeto_id'),
+        ('tipo_objeto_nombre', 'tipo_objeto__nombre'),
+    )
+
+
+class ExportacionHistorialView(ExportacionView):
+    """Exportar el historial completo con el nombre de cada cajón"""
+    modelo = CajonHistorial
+    nombre = 'historial'
+    campos = (
+        ('id', 'id'),
+        ('cajon', 'cajon_id'),
+        ('cajon_nombre', 'cajon__nombre'),
+        ('fecha', 'fecha'),
+        ('accion', 'accion'),
+        ('descripcion', 'descripcion'),
+    )
 
-            # Serializar el resultado
-            if resultado and isinstance(resultado, list) and isinstance(resultado[0], dict) and 'objetos' in resultado[0]:
-                for grupo in resultado:
-                    grupo['objetos'] = CajonObjetoSerializer(grupo['objetos'], many=True).data
-            else:
-                resultado = CajonObjetoSerializer(resultado, many=True).data
 
+class OrdenamientoView(APIView):
+    """
+    Vista para obtener objetos ordenados por diferentes criterios.
+    La respuesta JSON se escribe a medida que se leen los objetos, sin armar
+    el inventario completo en memoria.
+    """
+    objetos_por_fragmento = 500
+
+    @condicional(CajonObjeto, TipoObjeto)
+    def get(self, request):
+        tipo_ordenamiento = request.query_params.get('tipo_ordenamiento', 'tipo')
+        ordenamientos = {
+            'tipo': OrdenamientoService.ordenar_por_tipo,
+            'tamanio': OrdenamientoService.ordenar_por_tamanio,
+            'mixto': OrdenamientoService.ordenar_mixto,
+        }
+        if tipo_ordenamiento not in ordenamientos:
             return Response({
-                'tipo_ordenamiento': tipo_ordenamiento,
-                'cajon_id': cajon_id,
-                'resultado': resultado
-            })
-        except Exception as e:
+                'error': 'Tipo de ordenamiento no válido. Use: tipo, tamanio, mixto'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            cajon_id = request.query_params.get('cajon_id')
+            cajon_id = int(cajon_id) if cajon_id else None
+            limite = request.query_params.get('limite')
+            limite = int(limite) if limite else None
+            if limite is not None and limite <= 0:
+                raise ValueError
+        except ValueError:
             return Response({
-                'error': f'Error al ordenar objetos: {str(e)}'
-            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+                'error': 'cajon_id y limite deben ser números enteros positivos'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        grupos = ordenamientos[tipo_ordenamiento](cajon_id, limite=limite)
+        return StreamingHttpResponse(
+            self.generar_json(tipo_ordenamiento, cajon_id, grupos),
+            content_type='application/json'
+        )
+
+    def generar_json(self, tipo_ordenamiento, cajon_id, grupos):
+        encoder = JSONEncoder(ensure_ascii=False)
+        inicio = encoder.encode({'tipo_ordenamiento': tipo_ordenamiento, 'cajon_id': cajon_id})
+        yield inicio[:-1] + ', "resultado": ['
+        for indice, grupo in enumerate(grupos):
+            objetos = grupo.pop('objetos')
+            cabecera = encoder.encode(grupo)
+            yield (', ' if indice else '') + cabecera[:-1] + ', "objetos": ['
+            fragmento = []
+            primero = True
+            for objeto in objetos:
+                fragmento.append(encoder.encode(objeto))
+                if len(fragmento) == self.objetos_por_fragmento:
+                    yield ('' if primero else ', ') + ', '.join(fragmento)
+                    fragmento = []
+                    primero = False
+            if fragmento:
+                yield ('' if primero else ', ') + ', '.join(fragmento)
+            yield ']}'
+        yield ']}'
 
 
 class RecomendacionSimpleView(APIView):    
     def get(self, request):
+        tipo_ordenamiento = request.query_params.get('tipo_ordenamiento', 'tipo')
+        if request.query_params.get('modo') == 'local':
+            return self.get_local(tipo_ordenamiento)
         try:
-            tipo_ordenamiento = request.query_params.get('tipo_ordenamiento', 'tipo')
-            recomendacion_service = RecomendacionService()
-            recomendaciones = recomendacion_service.generar_recomendaciones_organizacion(tipo_ordenamiento)
+            # Solo se llama a Gemini si el inventario cambió desde la última vez
+            recomendaciones = RecomendacionService.obtener_recomendaciones(tipo_ordenamiento)
             return Response({
                 'recomendaciones': recomendaciones,
                 'tipo_ordenamiento': tipo_ordenamiento
@@ -286,10 +564,51 @@ class RecomendacionSimpleView(APIView):
                 'tipo_ordenamiento': tipo_ordenamiento
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+    def get_local(self, tipo_ordenamiento):
+        """Modo sin conexión: plan de movimientos calculado localmente, sin Gemini"""
+        try:
+            plan = PlanificadorService.generar_plan(tipo_ordenamiento)
+        except ValidationError as e:
+            return Response({'error': e.messages[0]}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({
+            'recomendaciones': PlanificadorService.recomendaciones_desde_plan(plan),
+            'tipo_ordenamiento': tipo_ordenamiento,
+            'modo': 'local',
+            'plan': plan
+        })
+
+
+class RecomendacionTrabajoListView(APIView):
+    """Vista para solicitar recomendaciones que se generan en segundo plano"""
+    def post(self, request):
+        tipo_ordenamiento = request.data.get('tipo_ordenamiento', 'tipo')
+        if tipo_ordenamiento not in ('tipo', 'tamanio', 'mixto'):
+            return Response({
+                'error': 'Tipo de ordenamiento no válido. Use: tipo, tamanio, mixto'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            trabajo = trabajos.encolar(tipo_ordenamiento)
+        except (trabajos.ColaLlenaError, trabajos.TrabajoNoDisponibleError) as e:
+            return Response({'error': str(e)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        serializer = RecomendacionTrabajoSerializer(trabajo)
+        return Response(serializer.data, status=status.HTTP_202_ACCEPTED)
+
+
+class RecomendacionTrabajoDetailView(APIView):
+    """Vista para consultar el estado y el resultado de un trabajo de recomendación"""
+    def get(self, request, pk):
+        try:
+            trabajo = trabajos.consultar(pk)
+        except RecomendacionTrabajo.DoesNotExist:
+            return Response({'error': 'El trabajo especificado no existe'}, status=status.HTTP_404_NOT_FOUND)
+        serializer = RecomendacionTrabajoSerializer(trabajo)
+        return Response(serializer.data)
+
 
 class CajonObjetosOrdenadosView(APIView):
     """Vista para obtener objetos de un cajón ordenados según criterio"""
     
+    @condicional(Cajon, CajonObjeto, TipoObjeto)
     def get(self, request, cajon_id):
         try:
             cajon = get_object_or_404(Cajon, pk=cajon_id)
@@ -318,14 +637,15 @@ class CajonObjetosOrdenadosView(APIView):
                 # Ordenamiento por creación (por defecto)
                 objetos = objetos.order_by('id')
             
-            serializer = CajonObjetoSerializer(objetos, many=True)
+            serializer = CajonObjetoFilasSerializer(CajonObjetoFilasSerializer.preparar(objetos), many=True)
+            datos = serializer.data
             
             return Response({
                 'cajon_id': cajon.id,
                 'cajon_nombre': cajon.nombre,
                 'tipo_ordenamiento': tipo_ordenamiento,
-                'objetos': serializer.data,
-                'total_objetos': objetos.count()
+                'objetos': datos,
+                'total_objetos': len(datos)
             })
             
         except Exception as e:
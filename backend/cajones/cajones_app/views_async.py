@@ -0,0 +1,173 @@
+"""
+Variantes asíncronas de las vistas de lectura y de recomendaciones.
+
+Con ASGI las vistas síncronas se ejecutan de a una en el hilo compartido de
+Django, así que una llamada a Gemini de varios segundos también demora al
+resto de la API. Estas vistas esperan las consultas y a Gemini sin ocupar ese
+hilo: las consultas simples usan el ORM asíncrono y las que reúnen varias
+consultas (estadísticas, búsqueda, páginas) se ejecutan con sync_to_async.
+urls.py las usa en lugar de las de views.py cuando API_ASYNC es True, lo que
+asgi.py activa por defecto. Responden lo mismo que la versión síncrona, en
+JSON.
+"""
+from asgiref.sync import sync_to_async
+from django.core.exceptions import ValidationError
+from django.http import Http404, JsonResponse
+from django.shortcuts import aget_object_or_404
+from django.views import View
+from rest_framework.exceptions import APIException
+from rest_framework.request import Request
+from rest_framework.utils.encoders import JSONEncoder
+
+from . import eventos
+from .condicional import condicional
+from .instrumentacion import medir_serializacion
+from .models import Cajon, CajonHistorial, CajonObjeto, TipoObjeto
+from .pagination import CajonObjetoPagination, HistorialPagination
+from .serializers import CajonHistorialFilasSerializer, CajonObjetoFilasSerializer
+from .services import BusquedaService, CajonService, PlanificadorService, RecomendacionService
+from .views import BusquedaView
+
+
+def respuesta(datos, status=200):
+    """JSON con el mismo formato que el JSONRenderer de DRF"""
+    with medir_serializacion():
+        return JsonResponse(
+            datos, status=status, safe=False, encoder=JSONEncoder,
+            json_dumps_params={'ensure_ascii': False, 'separators': (',', ':')}
+        )
+
+
+def pagina(request, paginacion, serializer, queryset):
+    """Página de un listado, igual que en las vistas síncronas (se ejecuta con sync_to_async)"""
+    paginator = paginacion()
+    page = paginator.paginate_queryset(serializer.preparar(queryset), Request(request))
+    return paginator.get_paginated_response(serializer(page, many=True).data).data
+
+
+class VistaAsync(View):
+    """Base de las vistas asíncronas: los errores se responden como lo hace DRF"""
+    async def dispatch(self, request, *args, **kwargs):
+        try:
+            return await super().dispatch(request, *args, **kwargs)
+        except Http404 as e:
+            return respuesta({'detail': str(e)}, status=404)
+        except APIException as e:
+            return respuesta({'detail': e.detail}, status=e.status_code)
+
+
+class CajonObjetosAsyncView(VistaAsync):
+    @condicional(Cajon, CajonObjeto, TipoObjeto)
+    async def get(self, request, cajon_id):
+        cajon = await aget_object_or_404(Cajon, pk=cajon_id)
+        return respuesta(await sync_to_async(pagina)(
+            request, CajonObjetoPagination, CajonObjetoFilasSerializer, cajon.objetos.all()
+        ))
+
+
+class CajonHistorialAsyncView(VistaAsync):
+    @condicional(Cajon, CajonHistorial)
+    async def get(self, request, cajon_id):
+        cajon = await aget_object_or_404(Cajon, pk=cajon_id)
+        return respuesta(await sync_to_async(pagina)(
+            request, HistorialPagination, CajonHistorialFilasSerializer, cajon.historial_entries.all()
+        ))
+
+
+class HistorialEventosAsyncView(VistaAsync):
+    """Flujo de eventos del historial: las conexiones esperan sin ocupar hilos"""
+    async def get(self, request):
+        try:
+            desde, cajon_id = eventos.leer_parametros(request)
+        except ValueError:
+            return respuesta({
+                'error': 'desde, Last-Event-ID y cajon_id deben ser números enteros positivos'
+            }, status=400)
+        if cajon_id is not None and not await Cajon.objects.filter(pk=cajon_id).aexists():
+            return respuesta({'error': 'El cajón especificado no existe'}, status=404)
+        if desde is None:
+            desde = await sync_to_async(eventos.ultimo_id)()
+        return eventos.respuesta(eventos.aflujo(desde, cajon_id))
+
+
+class CajonCapacidadAsyncView(VistaAsync):
+    @condicional(Cajon)
+    async def get(self, request, cajon_id):
+        cajon = await aget_object_or_404(Cajon, pk=cajon_id)
+        objetos_count = cajon.objetos_count
+        return respuesta({
+            'cajon_id': cajon.id,
+            'cajon_nombre': cajon.nombre,
+            'capacidad_maxima': cajon.capacidad_maxima,
+            'objetos_actuales': objetos_count,
+            'capacidad_disponible': cajon.capacidad_maxima - objetos_count,
+            'porcentaje_ocupacion': (objetos_count / cajon.capacidad_maxima) * 100
+        })
+
+
+class CajonEstadisticasAsyncView(VistaAsync):
+    @condicional(Cajon, CajonObjeto, TipoObjeto)
+    async def get(self, request, cajon_id):
+        try:
+            estadisticas = await sync_to_async(CajonService.obtener_estadisticas_cajon)(cajon_id)
+        except ValidationError as e:
+            return respuesta({'error': e.messages[0]}, status=404)
+        return respuesta(estadisticas)
+
+
+class EstadisticasAsyncView(VistaAsync):
+    @condicional(Cajon, CajonObjeto, TipoObjeto)
+    async def get(self, request):
+        return respuesta(await sync_to_async(CajonService.obtener_estadisticas_generales)())
+
+
+class BusquedaAsyncView(VistaAsync):
+    @condicional(Cajon, CajonObjeto, TipoObjeto)
+    async def get(self, request):
+        try:
+            limite, cajon_id = BusquedaView.leer_parametros(request.GET)
+        except ValueError:
+            return respuesta({
+                'error': 'cajon_id y limite deben ser números enteros positivos'
+            }, status=400)
+        try:
+            resultados = await sync_to_async(BusquedaService.buscar)(request.GET.get('q', ''), limite, cajon_id)
+        except ValidationError as e:
+            return respuesta({'error': e.messages[0]}, status=400)
+        return respuesta({'resultados': resultados})
+
+
+class RecomendacionAsyncView(VistaAsync):
+    async def get(self, request):
+        tipo_ordenamiento = request.GET.get('tipo_ordenamiento', 'tipo')
+        if request.GET.get('modo') == 'local':
+            return await self.get_local(tipo_ordenamiento)
+        try:
+            # Mientras se espera a Gemini el worker sigue atendiendo otros requests
+            recomendaciones = await RecomendacionService.aobtener_recomendaciones(tipo_ordenamiento)
+            return respuesta({
+                'recomendaciones': recomendaciones,
+                'tipo_ordenamiento': tipo_ordenamiento
+            })
+        except Exception as e:
+            return respuesta({
+                'error': f'Error al generar recomendación: {str(e)}',
+                'recomendaciones': [
+                    "Error al generar recomendación 1",
+                    "Error al generar recomendación 2",
+                    "Error al generar recomendación 3"
+                ],
+                'tipo_ordenamiento': tipo_ordenamiento
+            }, status=500)
+
+    async def get_local(self, tipo_ordenamiento):
+        try:
+            plan = await sync_to_async(PlanificadorService.generar_plan)(tipo_ordenamiento)
+        except ValidationError as e:
+            return respuesta({'error': e.messages[0]}, status=400)
+        return respuesta({
+            'recomendaciones': PlanificadorService.recomendaciones_desde_plan(plan),
+            'tipo_ordenamiento': tipo_ordenamiento,
+            'modo': 'local',
+            'plan': plan
+        })
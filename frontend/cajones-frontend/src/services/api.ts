@@ -8,6 +8,11 @@ export interface Cajon {
   capacidad_maxima: number;
   historial: CajonHistorial[];
   objetos: CajonObjeto[];
+  objetos_count?: number;
+  // Solo presentes al pedir el listado con ocupación
+  objetos_actuales?: number;
+  capacidad_disponible?: number;
+  porcentaje_ocupacion?: number;
 }
 
 export interface CajonObjeto {
@@ -41,6 +46,21 @@ export interface CapacidadCajon {
   porcentaje_ocupacion: number;
 }
 
+// Respuesta de los listados paginados por cursor
+export interface Paginado<T> {
+  next: string | null;
+  page_size: number;
+  results: T[];
+}
+
+export interface ResultadoBusqueda {
+  id: number;
+  nombre_objeto: string;
+  tamanio: string;
+  cajon: { id: number; nombre: string };
+  tipo_objeto: { id: number; nombre: string };
+}
+
 export interface Recomendacion {
   recomendaciones: string[];
   tipo_ordenamiento: string;
@@ -62,6 +82,8 @@ class ApiService {
     const url = `${this.baseURL}${endpoint}`;
     
     const defaultOptions: RequestInit = {
+      // La cookie de lectura de lo propio (réplica) viaja con cada request
+      credentials: 'include',
       headers: {
         'Content-Type': 'application/json',
         ...options.headers,
@@ -77,11 +99,24 @@ class ApiService {
     return response.json();
   }
 
+  // Recorrer un listado paginado siguiendo el cursor `next`
+  private async requestAll<T>(endpoint: string): Promise<T[]> {
+    const resultados: T[] = [];
+    let pagina = await this.request<Paginado<T>>(endpoint);
+    resultados.push(...pagina.results);
+    while (pagina.next) {
+      const siguiente = new URL(pagina.next);
+      pagina = await this.request<Paginado<T>>(`${siguiente.pathname}${siguiente.search}`);
+      resultados.push(...pagina.results);
+    }
+    return resultados;
+  }
+
   // ===== CAJONES =====
   
   // Obtener todos los cajones
-  async getCajones(): Promise<Cajon[]> {
-    return this.request<Cajon[]>('/api/cajones/');
+  async getCajones(ocupacion: boolean = false): Promise<Cajon[]> {
+    return this.request<Cajon[]>(ocupacion ? '/api/cajones/?ocupacion=1' : '/api/cajones/');
   }
 
   // Obtener un cajón específico
@@ -121,12 +156,20 @@ class ApiService {
 
   // Obtener todos los objetos
   async getObjetos(): Promise<CajonObjeto[]> {
-    return this.request<CajonObjeto[]>('/api/objetos/');
+    return this.requestAll<CajonObjeto>('/api/objetos/');
   }
 
   // Obtener objetos de un cajón específico
   async getObjetosCajon(cajonId: number): Promise<CajonObjeto[]> {
-    return this.request<CajonObjeto[]>(`/api/cajones/${cajonId}/objetos/`);
+    return this.requestAll<CajonObjeto>(`/api/cajones/${cajonId}/objetos/`);
+  }
+
+  // Buscar objetos por nombre o tipo, con la información del cajón
+  async buscarObjetos(q: string, cajonId?: number): Promise<ResultadoBusqueda[]> {
+    const params = new URLSearchParams({ q });
+    if (cajonId) params.append('cajon_id', cajonId.toString());
+    const respuesta = await this.request<{ resultados: ResultadoBusqueda[] }>(`/api/buscar/?${params.toString()}`);
+    return respuesta.resultados;
   }
 
   // Obtener cajón sin objetos (para optimizar)
@@ -194,14 +237,16 @@ class ApiService {
 
   // ===== HISTORIAL =====
 
-  // Obtener todo el historial
+  // Obtener las entradas más recientes del historial
   async getHistorial(): Promise<CajonHistorial[]> {
-    return this.request<CajonHistorial[]>('/api/historial/');
+    const pagina = await this.request<Paginado<CajonHistorial>>('/api/historial/');
+    return pagina.results;
   }
 
-  // Obtener historial de un cajón específico
+  // Obtener las entradas más recientes del historial de un cajón específico
   async getHistorialCajon(cajonId: number): Promise<CajonHistorial[]> {
-    return this.request<CajonHistorial[]>(`/api/cajones/${cajonId}/historial/`);
+    const pagina = await this.request<Paginado<CajonHistorial>>(`/api/cajones/${cajonId}/historial/`);
+    return pagina.results;
   }
 
   // ===== ORDENAMIENTO =====